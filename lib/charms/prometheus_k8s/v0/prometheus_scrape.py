@@ -239,6 +239,27 @@ by `jobs()` as follows
             prometheus_scrape_config.append(job)
         ...
 
+Wildcard targets are by default expanded into one job per unit, using the
+unit addresses from the relation data, so a rescheduled pod is only scraped
+again once both charms have handled the resulting relation events. Prometheus
+charms running in the same Kubernetes cluster as their scrape targets may
+instead have Prometheus discover the pods of each related application itself:
+
+    self.metrics_consumer = MetricsEndpointConsumer(self, service_discovery="kubernetes")
+
+Wildcard targets are then rendered as `kubernetes_sd_configs` selecting the
+pods of the application, in the namespace of its model, with the same
+`juju_unit` and `instance` labels. This requires Prometheus to be allowed to
+list and watch pods in those namespaces (e.g. a trusted charm).
+
+Large applications yield as many jobs as they have units. With
+
+    self.metrics_consumer = MetricsEndpointConsumer(self, compact_jobs=True)
+
+the targets of all units are instead kept in a single job per scrape job of
+the related charm, with one static config (and `juju_unit` label) per unit.
+The `job` label of the metrics then no longer has a `-<unit number>` suffix.
+
 ## Alerting Rules
 
 This charm library also supports gathering alerting rules from all
@@ -322,11 +343,14 @@ of Metrics provider charms hold eponymous information.
 
 """  # noqa: W505
 
+import contextlib
 import copy
+import functools
 import hashlib
 import ipaddress
 import json
 import logging
+import lzma
 import os
 import platform
 import re
@@ -335,11 +359,11 @@ import subprocess
 import tempfile
 from collections import defaultdict
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, Union
+from typing import Any, Callable, Dict, List, Literal, MutableMapping, Optional, Tuple, Union
 from urllib.parse import urlparse
 
 import yaml
-from cosl import JujuTopology
+from cosl import JujuTopology, LZMABase64
 from cosl.rules import AlertRules, generic_alert_groups
 from ops.charm import CharmBase, RelationRole
 from ops.framework import (
@@ -350,6 +374,7 @@ from ops.framework import (
     ObjectEvents,
     StoredDict,
     StoredList,
+    StoredState,
 )
 from ops.model import Relation
 
@@ -361,13 +386,21 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 61
+LIBPATCH = 70
 
 # Version 0.0.53 needed for cosl.rules.generic_alert_groups
 PYDEPS = ["cosl>=0.0.53"]
 
 logger = logging.getLogger(__name__)
 
+try:
+    # Charms using `ops[tracing]` get a span for each cos-tool call.
+    from opentelemetry import trace
+
+    _tracer = trace.get_tracer(__name__)
+except ImportError:
+    _tracer = None
+
 
 ALLOWED_KEYS = {
     "job_name",
@@ -399,6 +432,20 @@ RELATION_INTERFACE_NAME = "prometheus_scrape"
 
 DEFAULT_ALERT_RULES_RELATIVE_PATH = "./src/prometheus_alert_rules"
 
+# Optional encoding of the (possibly large) "scrape_jobs" and "alert_rules" payloads.
+# Consumers advertise the encodings they can decode in their application databag, and
+# providers only encode the payloads for consumers that do.
+PAYLOAD_ENCODING = "lzma+base64"
+PAYLOAD_SCHEMA_VERSION = 1
+
+# How wildcard ("*") scrape targets are resolved: into the unit addresses from the relation
+# data ("static"), or by Prometheus itself through the Kubernetes API ("kubernetes").
+ServiceDiscovery = Literal["static", "kubernetes"]
+
+# The container present in every pod of a Juju sidecar charm, so that Kubernetes service
+# discovery yields exactly one target per unit.
+JUJU_CHARM_CONTAINER = "charm"
+
 FallbackScrapeProtocol = Literal[
     "PrometheusProto",
     "OpenMetricsText0.0.1",
@@ -427,6 +474,16 @@ class PrometheusConfig:
         "regex": "(.*)",
     }
 
+    # Same as above, but only for targets with a juju_unit label, i.e. when the joined
+    # labels do not end with the separator. Used after `topology_relabel_config` in jobs
+    # mixing targets with and without juju_unit.
+    topology_relabel_config_unit_only = {
+        "source_labels": ["juju_model", "juju_model_uuid", "juju_application", "juju_unit"],
+        "separator": "_",
+        "target_label": "instance",
+        "regex": "(.*[^_])",
+    }
+
     @staticmethod
     def sanitize_scrape_config(job: dict) -> dict:
         """Restrict permissible scrape configuration options.
@@ -583,11 +640,140 @@ class PrometheusConfig:
         new_job["static_configs"] = [new_static]
         return new_job
 
+    @staticmethod
+    def _build_per_unit_static_config(
+        job: dict,
+        static_config: dict,
+        targets: List[str],
+        unit_name: str,
+        unit_path: str,
+        topology: Optional[JujuTopology],
+    ) -> dict:
+        """Build the static config of a single unit, for a job shared by all units.
+
+        The compact counterpart of `_build_per_unit_job`: instead of a job per unit, each
+        unit gets a static config with its own labels. A unit path prefix (e.g. from
+        ingress) cannot be set on the shared job, so it is set on the static config with
+        the ``__metrics_path__`` label instead.
+
+        Args:
+            job: the original scrape job dict the static config belongs to.
+            static_config: the original static_config dict to copy labels from.
+            targets: the resolved target addresses for this unit.
+            unit_name: the Juju unit name (e.g. "alertmanager/0").
+            unit_path: path prefix to prepend to the metrics path (from external URL, may be "").
+            topology: optional topology for adding Juju labels.
+
+        Returns:
+            A new static config dict for this unit.
+        """
+        new_static = static_config.copy()
+        new_static["targets"] = targets
+        labels = {}
+        if topology:
+            labels = {**topology.label_matcher_dict, "juju_unit": unit_name}
+        labels.update(static_config.get("labels", {}))
+        if unit_path:
+            labels["__metrics_path__"] = unit_path + (job.get("metrics_path") or "/metrics")
+        if labels:
+            new_static["labels"] = labels
+        return new_static
+
+    @staticmethod
+    def _build_kubernetes_sd_job(
+        job: dict,
+        static_config: dict,
+        target: str,
+        topology: JujuTopology,
+        job_name_suffix: str = "",
+    ) -> dict:
+        """Build a scrape job discovering the pods of an application for a wildcard target.
+
+        The pods are selected by the ``app.kubernetes.io/name`` label Juju sets, in the
+        namespace named after the model. Only the charm container of each running and ready
+        pod is kept, so that there is exactly one target per unit, and its address is set to the pod IP and
+        the port of the wildcard target. The ``juju_unit`` label is derived from the pod name
+        (``<application>-<number>``), and the topology labels, the labels of the static
+        config and the ``instance`` label are the same as those of the per-unit jobs.
+
+        Args:
+            job: the original scrape job dict to base the new job on.
+            static_config: the original static_config dict to copy labels from.
+            target: the wildcard target, e.g. "*:9093".
+            topology: topology of the application whose pods are to be scraped.
+            job_name_suffix: an optional suffix telling apart the jobs of the same static config.
+
+        Returns:
+            A new scrape job dict with ``kubernetes_sd_configs`` instead of ``static_configs``.
+        """
+        port = target.partition(":")[2] or "80"
+        labels = {**topology.label_matcher_dict, **static_config.get("labels", {})}
+
+        new_job = {key: value for key, value in job.items() if key != "static_configs"}
+        new_job["job_name"] = new_job.get("job_name", "unnamed-job") + job_name_suffix
+        new_job["metrics_path"] = new_job.get("metrics_path") or "/metrics"
+        new_job["kubernetes_sd_configs"] = [
+            {
+                "role": "pod",
+                "namespaces": {"names": [topology.model]},
+                "selectors": [
+                    {"role": "pod", "label": f"app.kubernetes.io/name={topology.application}"}
+                ],
+            }
+        ]
+        new_job["relabel_configs"] = (
+            [
+                {
+                    "source_labels": ["__meta_kubernetes_pod_container_name"],
+                    "regex": JUJU_CHARM_CONTAINER,
+                    "action": "keep",
+                },
+                # Pending, failed and terminating (no longer ready) pods would only be targets
+                # that are down, e.g. on every rollout.
+                {
+                    "source_labels": ["__meta_kubernetes_pod_phase"],
+                    "regex": "Running",
+                    "action": "keep",
+                },
+                {
+                    "source_labels": ["__meta_kubernetes_pod_ready"],
+                    "regex": "true",
+                    "action": "keep",
+                },
+                # Wrap IPv6 pod addresses in brackets.
+                {
+                    "source_labels": ["__meta_kubernetes_pod_ip"],
+                    "regex": "(.*:.*)",
+                    "target_label": "__address__",
+                    "replacement": f"[$1]:{port}",
+                },
+                {
+                    "source_labels": ["__meta_kubernetes_pod_ip"],
+                    "regex": "([^:]+)",
+                    "target_label": "__address__",
+                    "replacement": f"$1:{port}",
+                },
+                {
+                    "source_labels": ["__meta_kubernetes_pod_name"],
+                    "regex": "(.*)-([0-9]+)",
+                    "target_label": "juju_unit",
+                    "replacement": "$1/$2",
+                },
+            ]
+            + [{"target_label": name, "replacement": value} for name, value in labels.items()]
+            + new_job.get("relabel_configs", [])
+            # Instance relabeling for topology should be last in order.
+            + [PrometheusConfig.topology_relabel_config_wildcard]
+        )
+        return new_job
+
     @staticmethod
     def expand_wildcard_targets_into_individual_jobs(
         scrape_jobs: List[dict],
         hosts: Dict[str, Tuple[str, str, str]],
         topology: Optional[JujuTopology] = None,
+        service_discovery: ServiceDiscovery = "static",
+        compact: bool = False,
     ) -> List[dict]:
         """Extract wildcard hosts from the given scrape_configs list into separate jobs.
 
@@ -613,12 +799,24 @@ class PrometheusConfig:
                 no ``juju_unit`` or topology labels are added. Non-wildcard target matching
                 is skipped entirely (all non-wildcard targets are kept in a single job),
                 since matching only serves the purpose of injecting ``juju_unit`` labels.
+            service_discovery: with "kubernetes", wildcard targets are rendered as one
+                job discovering the pods of the application instead of one job per unit.
+                This requires ``topology``, and is not possible when units are only
+                reachable through a path (e.g. ingress), in which case wildcard targets are
+                still expanded into per-unit jobs.
+            compact: when True, the targets of all units are kept in a single job, with one
+                static config per unit carrying its ``juju_unit`` label, instead of one job
+                per unit. The size of the configuration, and the number of scrape pools,
+                then scale with the number of jobs rather than the number of units.
         """
         # Build a reverse lookup: {address: unit_name, fqdn: unit_name, ...}
         # so that non-wildcard targets can be matched whether specified as IP or FQDN.
         # The set subtraction {addr, fqdn} - {""} drops empty strings (absent FQDN)
         # and deduplicates when addr == fqdn (non-IP bind address).
         host_to_unit = PrometheusConfig._build_host_to_unit(hosts, topology)
+        kubernetes_sd = service_discovery == "kubernetes" and not any(
+            unit_path for _, unit_path, _ in hosts.values()
+        )
 
         modified_scrape_jobs = []
         for job in scrape_jobs:
@@ -630,6 +828,8 @@ class PrometheusConfig:
             # These are kept in a single job with topology-only labels (no juju_unit):
             # fully-qualified targets that predate this feature are unaffected.
             unmatched_static_configs = []
+            # Accumulates the per-unit static configs of a compact job.
+            per_unit_static_configs = []
 
             for static_config in static_configs:
                 targets = static_config.get("targets")
@@ -665,25 +865,80 @@ class PrometheusConfig:
                     # Matched targets: one per-unit job with juju_unit label.
                     for unit_name, unit_targets_list in matched_by_unit.items():
                         _, unit_path, _ = hosts.get(unit_name, ("", "", ""))
+                        if compact:
+                            per_unit_static_configs.append(
+                                PrometheusConfig._build_per_unit_static_config(
+                                    job,
+                                    static_config,
+                                    unit_targets_list,
+                                    unit_name,
+                                    unit_path,
+                                    topology,
+                                )
+                            )
+                            continue
                         modified_scrape_jobs.append(
                             PrometheusConfig._build_per_unit_job(
                                 job, static_config, unit_targets_list, unit_name, unit_path, topology
                             )
                         )
 
-                # Wildcard targets: one per-unit job per host, replacing "*" with the unit address.
-                if wildcard_targets:
+                # Wildcard targets: either one job discovering the pods of the application
+                # per target, or one per-unit job per host, replacing "*" with the unit address.
+                if wildcard_targets and kubernetes_sd and topology:
+                    for target in wildcard_targets:
+                        suffix = "-" + (target.partition(":")[2] or "80")
+                        modified_scrape_jobs.append(
+                            PrometheusConfig._build_kubernetes_sd_job(
+                                job,
+                                static_config,
+                                target,
+                                topology,
+                                suffix if len(wildcard_targets) > 1 else "",
+                            )
+                        )
+                elif wildcard_targets:
                     for unit_name, (unit_hostname, unit_path, _unit_fqdn) in hosts.items():
                         resolved_targets = [
                             target.replace("*", unit_hostname) for target in wildcard_targets
                         ]
+                        if compact:
+                            per_unit_static_configs.append(
+                                PrometheusConfig._build_per_unit_static_config(
+                                    job,
+                                    static_config,
+                                    resolved_targets,
+                                    unit_name,
+                                    unit_path,
+                                    topology,
+                                )
+                            )
+                            continue
                         modified_scrape_jobs.append(
                             PrometheusConfig._build_per_unit_job(
                                 job, static_config, resolved_targets, unit_name, unit_path, topology
                             )
                         )
 
-            if unmatched_static_configs:
+            if per_unit_static_configs:
+                modified_job = job.copy()
+                modified_job["static_configs"] = per_unit_static_configs + unmatched_static_configs
+                modified_job["metrics_path"] = modified_job.get("metrics_path") or "/metrics"
+
+                if topology:
+                    # Instance relabeling for topology should be last in order.
+                    modified_job["relabel_configs"] = modified_job.get("relabel_configs", []) + (
+                        [
+                            PrometheusConfig.topology_relabel_config,
+                            PrometheusConfig.topology_relabel_config_unit_only,
+                        ]
+                        if unmatched_static_configs
+                        else [PrometheusConfig.topology_relabel_config_wildcard]
+                    )
+
+                modified_scrape_jobs.append(modified_job)
+
+            elif unmatched_static_configs:
                 modified_job = job.copy()
                 modified_job["static_configs"] = unmatched_static_configs
                 modified_job["metrics_path"] = modified_job.get("metrics_path") or "/metrics"
@@ -850,6 +1105,96 @@ def _type_convert_stored(obj):
     return obj
 
 
+def _encode_payload(payload: Any) -> str:
+    """Serialize a relation data payload into a versioned, compressed envelope.
+
+    The envelope carries a hash of the payload, so that consumers can tell it did not change
+    without decompressing it.
+    """
+    serialized = json.dumps(payload, sort_keys=True)
+    return json.dumps(
+        {
+            "schema_version": PAYLOAD_SCHEMA_VERSION,
+            "encoding": PAYLOAD_ENCODING,
+            "hash": hashlib.sha256(serialized.encode()).hexdigest(),
+            "payload": LZMABase64.compress(serialized),
+        },
+        sort_keys=True,
+    )
+
+
+def _is_encoded_payload(data: Optional[str]) -> bool:
+    """Whether a relation data payload is an envelope produced by `_encode_payload`."""
+    try:
+        envelope = json.loads(data or "null")
+    except json.JSONDecodeError:
+        return False
+    return isinstance(envelope, dict) and "encoding" in envelope
+
+
+def _decode_payload(data: str, cache: Optional[Dict[str, Any]] = None) -> Any:
+    """Deserialize a relation data payload, either plain JSON or an encoded envelope.
+
+    Args:
+        data: the relation data value.
+        cache: an optional mapping from envelope hash to decoded payload, so that unchanged
+            payloads are only decompressed once.
+
+    Raises:
+        ValueError, if the payload is not valid or its schema version or encoding is not
+        supported.
+    """
+    envelope = json.loads(data)
+    if not isinstance(envelope, dict) or "encoding" not in envelope:
+        return envelope
+
+    if (
+        envelope.get("schema_version") != PAYLOAD_SCHEMA_VERSION
+        or envelope["encoding"] != PAYLOAD_ENCODING
+    ):
+        raise ValueError(
+            "Unsupported payload: schema version {}, encoding {}".format(
+                envelope.get("schema_version"), envelope["encoding"]
+            )
+        )
+
+    digest = envelope.get("hash")
+    if cache is not None and digest in cache:
+        return copy.deepcopy(cache[digest])
+
+    try:
+        payload = json.loads(LZMABase64.decompress(envelope["payload"]))
+    except (KeyError, lzma.LZMAError) as e:
+        raise ValueError(f"Invalid encoded payload: {e}") from e
+
+    if cache is not None:
+        cache[digest] = copy.deepcopy(payload)
+    return payload
+
+
+def _update_databag(databag: MutableMapping[str, Any], data: Dict[str, Any]) -> None:
+    """Write the fields of `data` to a relation databag, but only those that changed.
+
+    Each write is a hook tool call, and a real change fires relation-changed on the other
+    side, so unchanged fields are not rewritten. Juju does not store empty values, so an
+    empty value is unchanged if the field is unset.
+    """
+    for key, value in data.items():
+        if databag.get(key, "") != value:
+            databag[key] = value
+
+
+def _accepts_encoded_payloads(relation: Relation) -> bool:
+    """Whether the remote application of a relation advertises support for encoded payloads."""
+    if not relation.app:
+        return False
+    try:
+        accepted = json.loads(relation.data[relation.app].get("accepted_encodings", "[]"))
+    except json.JSONDecodeError:
+        return False
+    return isinstance(accepted, list) and PAYLOAD_ENCODING in accepted
+
+
 def _validate_relation_by_interface_and_direction(
     charm: CharmBase,
     relation_name: str,
@@ -946,12 +1291,15 @@ class MetricsEndpointConsumer(Object):
     """A Prometheus based Monitoring service."""
 
     on = MonitoringEvents()  # pyright: ignore
+    _stored = StoredState()
 
     def __init__(
         self,
         charm: CharmBase,
         relation_name: str = DEFAULT_RELATION_NAME,
         fallback_scrape_protocol: Optional[FallbackScrapeProtocol] = None,
+        service_discovery: ServiceDiscovery = "static",
+        compact_jobs: bool = False,
     ):
         """A Prometheus based Monitoring service.
 
@@ -974,6 +1322,17 @@ class MetricsEndpointConsumer(Object):
                 This parameter should only be used by MetricsEndpointConsumers that use Prometheus 3 and above, as setting
                 this key in the scrape configs of Prometheus 2 will result in the error:
                 "field fallback_scrape_protocol not found in type config.ScrapeConfig".
+            service_discovery: how wildcard scrape targets are resolved. With "static" (the
+                default), they are expanded into the unit addresses from the relation data.
+                With "kubernetes", Prometheus discovers the pods of the related applications
+                itself, so that rescheduled pods are scraped again without waiting for any
+                hook. This only works for applications in the same Kubernetes cluster, and
+                requires Prometheus to be allowed to list and watch their pods.
+            compact_jobs: whether to render the targets of all the units of a related
+                application in a single job, with a static config per unit, rather than
+                one job per unit. This keeps the size of the Prometheus configuration, its
+                reload time and the number of scrape pools independent of the number of
+                units, but drops the `-<unit number>` suffix of the job names.
 
         Raises:
             RelationNotFoundError: If there is no relation in the charm's metadata.yaml
@@ -993,8 +1352,18 @@ class MetricsEndpointConsumer(Object):
         self._charm = charm
         self._relation_name = relation_name
         self._fallback_scrape_protocol = fallback_scrape_protocol
+        self._service_discovery = service_discovery
+        self._compact_jobs = compact_jobs
         self._tool = CosTool(self._charm)
+        # Rendered and validated scrape jobs, per relation id, so that unchanged relations do
+        # not need to be re-processed on every hook.
+        self._stored.set_default(scrape_jobs_cache={})
+        # Processed and validated alert rules, per relation id, likewise.
+        self._stored.set_default(alert_rules_cache={})
+        # Decoded payloads, by hash, for the duration of the dispatch.
+        self._decoded_payloads: Dict[str, Any] = {}
         events = self._charm.on[relation_name]
+        self.framework.observe(events.relation_joined, self._set_accepted_encodings)
         self.framework.observe(events.relation_changed, self._on_metrics_provider_relation_changed)
         self.framework.observe(
             events.relation_departed, self._on_metrics_provider_relation_departed
@@ -1018,8 +1387,17 @@ class MetricsEndpointConsumer(Object):
         """
         rel_id = event.relation.id
 
+        self._set_accepted_encodings(event)
         self.on.targets_changed.emit(relation_id=rel_id)
 
+    def _set_accepted_encodings(self, event):
+        """Advertise the payload encodings this consumer can decode."""
+        if not self._charm.unit.is_leader():
+            return
+        accepted = json.dumps([PAYLOAD_ENCODING])
+        if event.relation.data[self._charm.app].get("accepted_encodings") != accepted:
+            event.relation.data[self._charm.app]["accepted_encodings"] = accepted
+
     def _on_metrics_provider_relation_departed(self, event):
         """Update job config when a metrics provider departs.
 
@@ -1038,33 +1416,102 @@ class MetricsEndpointConsumer(Object):
     def jobs(self) -> list:
         """Fetch the list of scrape jobs.
 
+        The rendered and validated jobs of each relation are cached, keyed by a hash of
+        the relation data they are derived from. Only relations whose data changed since
+        the last call are re-processed.
+
         Returns:
             A list consisting of all the static scrape configurations
             for each related `MetricsEndpointProvider` that has specified
             its scrape targets.
         """
         scrape_jobs = []
+        cache = self._stored.scrape_jobs_cache
+        relation_ids = set()
 
         for relation in self._charm.model.relations[self._relation_name]:
-            static_scrape_jobs = self._static_scrape_config(relation)
-            if static_scrape_jobs:
-                # Duplicate job names will cause validate_scrape_jobs to fail.
-                # Therefore we need to dedupe here and after all jobs are collected.
-                static_scrape_jobs = _dedupe_job_names(static_scrape_jobs)
-                try:
-                    self._tool.validate_scrape_jobs(static_scrape_jobs)
-                except subprocess.CalledProcessError as e:
-                    if self._charm.unit.is_leader():
-                        data = json.loads(relation.data[self._charm.app].get("event", "{}"))
-                        data["scrape_job_errors"] = str(e)
+            relation_id = str(relation.id)
+            relation_ids.add(relation_id)
+            digest = self._scrape_config_hash(relation)
+
+            cached = cache.get(relation_id)
+            if cached and cached["hash"] == digest:
+                static_scrape_jobs = json.loads(cached["jobs"])
+                errors = cached["errors"]
+            else:
+                static_scrape_jobs, errors = self._validated_scrape_config(relation)
+                cache[relation_id] = {
+                    "hash": digest,
+                    "jobs": json.dumps(static_scrape_jobs),
+                    "errors": errors,
+                }
+
+            if errors:
+                if self._charm.unit.is_leader():
+                    data = json.loads(relation.data[self._charm.app].get("event", "{}"))
+                    if data.get("scrape_job_errors") != errors:
+                        data["scrape_job_errors"] = errors
                         relation.data[self._charm.app]["event"] = json.dumps(data)
-                else:
-                    scrape_jobs.extend(static_scrape_jobs)
+            else:
+                scrape_jobs.extend(static_scrape_jobs)
+
+        for relation_id in set(cache.keys()) - relation_ids:
+            del cache[relation_id]
 
         scrape_jobs = _dedupe_job_names(scrape_jobs)
 
         return scrape_jobs
 
+    def _validated_scrape_config(self, relation: Relation) -> Tuple[list, str]:
+        """Render and validate the scrape jobs of a single relation.
+
+        Returns:
+            A 2-tuple of the (deduplicated) scrape jobs, and the validation errors, if any.
+        """
+        static_scrape_jobs = self._static_scrape_config(relation)
+        if not static_scrape_jobs:
+            return [], ""
+
+        # Duplicate job names will cause validate_scrape_jobs to fail.
+        # Therefore we need to dedupe here and after all jobs are collected.
+        static_scrape_jobs = _dedupe_job_names(static_scrape_jobs)
+        try:
+            self._tool.validate_scrape_jobs(static_scrape_jobs)
+        except subprocess.CalledProcessError as e:
+            return [], str(e)
+
+        return static_scrape_jobs, ""
+
+    def _scrape_config_hash(self, relation: Relation) -> str:
+        """Hash everything the rendered scrape jobs of a relation depend on.
+
+        That is the remote app databag, the address fields of the remote unit databags,
+        and the settings of this consumer.
+        """
+        unit_fields = (
+            "prometheus_scrape_unit_name",
+            "prometheus_scrape_unit_address",
+            "prometheus_scrape_host",
+            "prometheus_scrape_unit_path",
+            "prometheus_scrape_unit_fqdn",
+        )
+        units = {}
+        for unit in relation.units:
+            unit_databag = relation.data.get(unit) or {}
+            units[unit.name] = {field: unit_databag.get(field) for field in unit_fields}
+
+        app_databag = relation.data.get(relation.app) if relation.app else None
+        hashable = {
+            "libpatch": LIBPATCH,
+            "fallback_scrape_protocol": self._fallback_scrape_protocol,
+            "service_discovery": self._service_discovery,
+            "compact_jobs": self._compact_jobs,
+            "cos_tool": self._tool.fingerprint,
+            "app": dict(app_databag) if app_databag else {},
+            "units": units,
+        }
+        return hashlib.sha256(json.dumps(hashable, sort_keys=True).encode()).hexdigest()
+
     @property
     def alerts(self) -> dict:
         """Fetch alerts for all relations.
@@ -1103,62 +1550,123 @@ class MetricsEndpointConsumer(Object):
             container.push(path, rules, make_dirs=True)
         ```
 
+        The processed and validated rules of each relation are cached, keyed by a hash of
+        the relation data they are derived from and of the cos-tool binary. Only relations
+        whose data changed since the last call are re-processed.
+
         Returns:
             A dictionary mapping the Juju topology identifier of the source charm to
             its list of alert rule groups.
         """
         alerts = {}  # type: Dict[str, dict] # mapping b/w juju identifiers and alert rule files
+        cache = self._stored.alert_rules_cache
+        relation_ids = set()
+
         for relation in self._charm.model.relations[self._relation_name]:
             if not relation.units or not relation.app:
                 continue
 
-            alert_rules = json.loads(relation.data[relation.app].get("alert_rules", "{}"))
-            if not alert_rules:
+            relation_id = str(relation.id)
+            relation_ids.add(relation_id)
+            digest = self._alert_rules_hash(relation)
+
+            cached = cache.get(relation_id)
+            if cached and cached["hash"] == digest:
+                identifier = cached["identifier"]
+                alert_rules = json.loads(cached["rules"])
+                errors = cached["errors"]
+            else:
+                identifier, alert_rules, errors = self._validated_alert_rules(relation)
+                cache[relation_id] = {
+                    "hash": digest,
+                    "identifier": identifier,
+                    "rules": json.dumps(alert_rules),
+                    "errors": errors,
+                }
+
+            if not identifier:
                 continue
 
-            alert_rules = self._inject_alert_expr_labels(alert_rules)
+            if self._charm.unit.is_leader():
+                data = json.loads(relation.data[self._charm.app].get("event", "{}"))
+                if data.get("errors") != (errors or None):
+                    if errors:
+                        data["errors"] = errors
+                    else:
+                        data.pop("errors", None)
+                    relation.data[self._charm.app]["event"] = json.dumps(data)
+
+            if not errors:
+                alerts[identifier] = alert_rules
 
-            identifier, topology = self._get_identifier_by_alert_rules(alert_rules)
-            if not topology:
-                try:
-                    scrape_metadata = json.loads(relation.data[relation.app]["scrape_metadata"])
-                    identifier = JujuTopology.from_dict(scrape_metadata).identifier
+        for relation_id in set(cache.keys()) - relation_ids:
+            del cache[relation_id]
 
-                except KeyError as e:
-                    logger.debug(
-                        "Relation %s has no 'scrape_metadata': %s",
-                        relation.id,
-                        e,
-                    )
+        return alerts
 
-            if not identifier:
-                logger.error(
-                    "Alert rules were found but no usable group or identifier was present."
+    def _validated_alert_rules(self, relation: Relation) -> Tuple[Optional[str], dict, str]:
+        """Process and validate the alert rules of a single relation.
+
+        Returns:
+            A 3-tuple of the identifier of the rules file (None if there are no usable
+            rules), the rules with topology label matchers injected, and the validation
+            errors, if any.
+        """
+        try:
+            alert_rules = _decode_payload(
+                relation.data[relation.app].get("alert_rules", "{}"), self._decoded_payloads
+            )
+        except ValueError as e:
+            logger.error("Relation %s has invalid 'alert_rules': %s", relation.id, e)
+            return None, {}, ""
+        if not alert_rules:
+            return None, {}, ""
+
+        alert_rules = self._inject_alert_expr_labels(alert_rules)
+
+        identifier, topology = self._get_identifier_by_alert_rules(alert_rules)
+        if not topology:
+            try:
+                scrape_metadata = json.loads(relation.data[relation.app]["scrape_metadata"])
+                identifier = JujuTopology.from_dict(scrape_metadata).identifier
+
+            except KeyError as e:
+                logger.debug(
+                    "Relation %s has no 'scrape_metadata': %s",
+                    relation.id,
+                    e,
                 )
-                continue
 
-            # We need to append the relation info to the identifier. This is to allow for cases for there are two
-            # relations which eventually scrape the same application. Issue #551.
-            identifier = f"{identifier}_{relation.name}_{relation.id}"
+        if not identifier:
+            logger.error("Alert rules were found but no usable group or identifier was present.")
+            return None, {}, ""
 
-            alerts[identifier] = alert_rules
+        # We need to append the relation info to the identifier. This is to allow for cases for there are two
+        # relations which eventually scrape the same application. Issue #551.
+        identifier = f"{identifier}_{relation.name}_{relation.id}"
 
-            _, errmsg = self._tool.validate_alert_rules(alert_rules)
-            if errmsg:
-                logger.error(f"Invalid alert rule file: {errmsg}")
-                if alerts[identifier]:
-                    del alerts[identifier]
-                if self._charm.unit.is_leader():
-                    data = json.loads(relation.data[self._charm.app].get("event", "{}"))
-                    data["errors"] = errmsg
-                    relation.data[self._charm.app]["event"] = json.dumps(data)
-                continue
-            if self._charm.unit.is_leader():
-                data = json.loads(relation.data[self._charm.app].get("event", "{}"))
-                data.pop("errors", None)
-                relation.data[self._charm.app]["event"] = json.dumps(data)
+        _, errmsg = self._tool.validate_alert_rules(alert_rules)
+        if errmsg:
+            logger.error(f"Invalid alert rule file: {errmsg}")
+            return identifier, {}, errmsg
 
-        return alerts
+        return identifier, alert_rules, ""
+
+    def _alert_rules_hash(self, relation: Relation) -> str:
+        """Hash everything the processed alert rules of a relation depend on.
+
+        That is the raw alert rules and scrape metadata of the remote app databag, and
+        the cos-tool binary injecting the label matchers and validating the rules.
+        """
+        app_databag = relation.data.get(relation.app) if relation.app else None
+        app_databag = app_databag or {}
+        hashable = {
+            "libpatch": LIBPATCH,
+            "cos_tool": self._tool.fingerprint,
+            "alert_rules": app_databag.get("alert_rules"),
+            "scrape_metadata": app_databag.get("scrape_metadata"),
+        }
+        return hashlib.sha256(json.dumps(hashable, sort_keys=True).encode()).hexdigest()
 
     def _get_identifier_by_alert_rules(
         self, rules: dict
@@ -1271,7 +1779,13 @@ class MetricsEndpointConsumer(Object):
         if not relation.units:
             return []
 
-        scrape_configs = json.loads(relation.data[relation.app].get("scrape_jobs", "[]"))
+        try:
+            scrape_configs = _decode_payload(
+                relation.data[relation.app].get("scrape_jobs", "[]"), self._decoded_payloads
+            )
+        except ValueError as e:
+            logger.error("Relation %s has invalid 'scrape_jobs': %s", relation.id, e)
+            return []
 
         if not scrape_configs:
             return []
@@ -1290,7 +1804,7 @@ class MetricsEndpointConsumer(Object):
         hosts = self._relation_hosts(relation)
 
         scrape_configs = PrometheusConfig.expand_wildcard_targets_into_individual_jobs(
-            scrape_configs, hosts, topology
+            scrape_configs, hosts, topology, self._service_discovery, self._compact_jobs
         )
 
         # For https scrape targets we still do not render a `tls_config` section because certs
@@ -1364,14 +1878,10 @@ def _dedupe_job_names(jobs: List[dict]):
     Args:
         jobs: A list of prometheus scrape jobs
     """
-    jobs_copy = copy.deepcopy(jobs)
-
-    # Convert to a dict with job names as keys
-    # I think this line is O(n^2) but it should be okay given the list sizes
-    jobs_dict = {
-        job["job_name"]: list(filter(lambda x: x["job_name"] == job["job_name"], jobs_copy))
-        for job in jobs_copy
-    }
+    # Convert to a dict with job names as keys, preserving the order of first occurrence
+    jobs_dict = defaultdict(list)  # type: Dict[str, List[dict]]
+    for job in copy.deepcopy(jobs):
+        jobs_dict[job["job_name"]].append(job)
 
     # If multiple jobs have the same name, convert the name to "name_<hash-of-job>"
     for key in jobs_dict:
@@ -1385,15 +1895,14 @@ def _dedupe_job_names(jobs: List[dict]):
         new_jobs.extend(list(jobs_dict[key]))
 
     # Deduplicate jobs which are equal
-    # Again this in O(n^2) but it should be okay
     deduped_jobs = []
-    seen = []
+    seen = set()
     for job in new_jobs:
         job_json = json.dumps(job)
         hashed = hashlib.sha256(job_json.encode()).hexdigest()
         if hashed in seen:
             continue
-        seen.append(hashed)
+        seen.add(hashed)
         deduped_jobs.append(job)
 
     return deduped_jobs
@@ -1446,6 +1955,7 @@ class MetricsEndpointProvider(Object):
         lookaside_jobs_callable: Optional[Callable] = None,
         *,
         forward_alert_rules: bool = True,
+        compress_payloads: bool = False,
     ):
         """Construct a metrics provider for a Prometheus charm.
 
@@ -1558,6 +2068,9 @@ class MetricsEndpointProvider(Object):
                 should return a `List[Dict]` which is syntactically identical to the
                 `jobs` parameter, but can be updated out of step initialization of
                 this library without disrupting the 'global' job spec.
+            compress_payloads: a boolean flag to publish the scrape jobs and alert rules as
+                LZMA-compressed, versioned payloads, to the consumers that support them.
+                Consumers that do not are still sent plain JSON.
 
         Raises:
             RelationNotFoundError: If there is no relation in the charm's metadata.yaml
@@ -1588,6 +2101,7 @@ class MetricsEndpointProvider(Object):
         self._charm = charm
         self._alert_rules_path = alert_rules_path
         self._forward_alert_rules = forward_alert_rules
+        self._compress_payloads = compress_payloads
         self._relation_name = relation_name
         # sanitize job configurations to the supported subset of parameters
         jobs = [] if jobs is None else jobs
@@ -1599,6 +2113,8 @@ class MetricsEndpointProvider(Object):
             )
         self.external_url = external_url
         self._lookaside_jobs = lookaside_jobs_callable
+        # The unit address fields, and the external URL or bind address they were computed from.
+        self._unit_address_cache: Optional[Tuple[str, Dict[str, Any]]] = None
 
         events = self._charm.on[self._relation_name]
         self.framework.observe(events.relation_changed, self._on_relation_changed)
@@ -1647,6 +2163,12 @@ class MetricsEndpointProvider(Object):
         self._set_unit_ip()
 
         if self._charm.unit.is_leader():
+            # Re-publish the payloads if the consumer started (or stopped) supporting encoding.
+            if self._compress_payloads and _is_encoded_payload(
+                event.relation.data[self._charm.app].get("scrape_jobs")
+            ) != _accepts_encoded_payloads(event.relation):
+                self.set_scrape_job_spec()
+
             ev = json.loads(event.relation.data[event.app].get("event", "{}"))
 
             if ev:
@@ -1689,16 +2211,27 @@ class MetricsEndpointProvider(Object):
                 group_name_prefix=self.topology.identifier,
             )
         alert_rules_as_dict = alert_rules.as_dict()
+        scrape_metadata = json.dumps(self._scrape_metadata, sort_keys=True)
+        scrape_jobs = self._scrape_jobs
 
         for relation in self._charm.model.relations[self._relation_name]:
-            relation.data[self._charm.app]["scrape_metadata"] = json.dumps(self._scrape_metadata)
-            relation.data[self._charm.app]["scrape_jobs"] = json.dumps(self._scrape_jobs)
+            if self._compress_payloads and _accepts_encoded_payloads(relation):
+                encode = _encode_payload
+            else:
+                encode = functools.partial(json.dumps, sort_keys=True)
 
             # Update relation data with the string representation of the rule file.
-            # Juju topology is already included in the "scrape_metadata" field above.
+            # Juju topology is already included in the "scrape_metadata" field.
             # The consumer side of the relation uses this information to name the rules file
             # that is written to the filesystem.
-            relation.data[self._charm.app]["alert_rules"] = json.dumps(alert_rules_as_dict)
+            _update_databag(
+                relation.data[self._charm.app],
+                {
+                    "scrape_metadata": scrape_metadata,
+                    "scrape_jobs": encode(scrape_jobs),
+                    "alert_rules": encode(alert_rules_as_dict),
+                },
+            )
 
     def _set_unit_ip(self, _=None):
         """Set unit host address.
@@ -1710,31 +2243,52 @@ class MetricsEndpointProvider(Object):
         to be able to use this method as an event handler, although no access to the
         event is actually needed.
         """
-        for relation in self._charm.model.relations[self._relation_name]:
-            unit_ip = str(self._charm.model.get_binding(relation).network.bind_address)
-
-            # TODO store entire url in relation data, instead of only select url parts.
-
-            if self.external_url:
-                parsed = urlparse(self.external_url)
-                unit_address = parsed.hostname
-                path = parsed.path
-                unit_fqdn = ""
-            elif self._is_valid_unit_address(unit_ip):
-                unit_address = unit_ip
-                unit_fqdn = socket.getfqdn()
-                path = ""
-            else:
-                unit_address = socket.getfqdn()
-                unit_fqdn = unit_address
-                path = ""
+        relations = self._charm.model.relations[self._relation_name]
+        if not relations:
+            return
 
-            relation.data[self._charm.unit].update({
-                "prometheus_scrape_unit_address": unit_address,
-                "prometheus_scrape_unit_path": path,
-                "prometheus_scrape_unit_name": str(self._charm.model.unit.name),
-                "prometheus_scrape_unit_fqdn": unit_fqdn,
-            })
+        unit_address_data = self._unit_address_data()
+        for relation in relations:
+            _update_databag(relation.data[self._charm.unit], unit_address_data)
+
+    def _unit_address_data(self) -> Dict[str, Any]:
+        """Return the unit address fields for the unit relation data.
+
+        The fields are memoized for the external URL, or the bind address, they are derived
+        from, so that the FQDN is not resolved again for each relation of the endpoint.
+        """
+        if self.external_url:
+            address_key = self.external_url
+        else:
+            binding = self._charm.model.get_binding(self._relation_name)
+            address_key = str(binding.network.bind_address) if binding else ""
+        if self._unit_address_cache and self._unit_address_cache[0] == address_key:
+            return self._unit_address_cache[1]
+
+        # TODO store entire url in relation data, instead of only select url parts.
+
+        if self.external_url:
+            parsed = urlparse(self.external_url)
+            unit_address = parsed.hostname
+            path = parsed.path
+            unit_fqdn = ""
+        elif self._is_valid_unit_address(address_key):
+            unit_address = address_key
+            unit_fqdn = socket.getfqdn()
+            path = ""
+        else:
+            unit_address = socket.getfqdn()
+            unit_fqdn = unit_address
+            path = ""
+
+        unit_address_data = {
+            "prometheus_scrape_unit_address": unit_address,
+            "prometheus_scrape_unit_path": path,
+            "prometheus_scrape_unit_name": str(self._charm.model.unit.name),
+            "prometheus_scrape_unit_fqdn": unit_fqdn,
+        }
+        self._unit_address_cache = (address_key, unit_address_data)
+        return unit_address_data
 
     def _is_valid_unit_address(self, address: str) -> bool:
         """Validate a unit address.
@@ -1760,7 +2314,8 @@ class MetricsEndpointProvider(Object):
            A list of dictionaries, where each dictionary specifies a
            single scrape job for Prometheus.
         """
-        jobs = self._jobs or []
+        # Copy, so that the lookaside jobs do not accumulate in `self._jobs` across calls.
+        jobs = list(self._jobs or [])
         if callable(self._lookaside_jobs):
             jobs.extend(PrometheusConfig.sanitize_scrape_configs(self._lookaside_jobs()))
         return jobs or [DEFAULT_JOB]
@@ -1848,6 +2403,235 @@ class PrometheusRulesProvider(Object):
                 sort_keys=True,  # sort, to prevent unnecessary relation_changed events
             )
 
+
+# PromQL keywords that are followed by a parenthesized list of label names.
+_PROMQL_LABEL_LIST_KEYWORDS = {"by", "without", "on", "ignoring", "group_left", "group_right"}
+# PromQL keywords that are never part of a vector selector.
+_PROMQL_KEYWORDS = {"and", "or", "unless", "bool", "atan2", "offset", "inf", "nan"}
+_PROMQL_AGGREGATIONS = {
+    "sum",
+    "min",
+    "max",
+    "avg",
+    "group",
+    "stddev",
+    "stdvar",
+    "count",
+    "count_values",
+    "bottomk",
+    "topk",
+    "quantile",
+    "limitk",
+    "limit_ratio",
+}
+_PROMQL_TOKEN_RE = re.compile(
+    r"""
+    (?P<space>\s+|\#[^\n]*)
+    |(?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'|`[^`]*`)
+    |(?P<number>
+        0[xX][0-9a-fA-F]+
+        |(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?(?:(?:ms|[smhdwy])(?:\d+(?:ms|[smhdwy]))*)?
+    )
+    |(?P<ident>[a-zA-Z_][a-zA-Z0-9_:]*)
+    |(?P<op>==|!=|=~|!~|<=|>=|[-+*/%^<>=(){}\[\],:@])
+    """,
+    re.VERBOSE,
+)
+_PROMQL_ESCAPES = {
+    "a": "\a",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+    "v": "\v",
+    "\\": "\\",
+}
+_GO_ESCAPES = {v: "\\" + k for k, v in _PROMQL_ESCAPES.items()}
+_GO_ESCAPES['"'] = '\\"'
+
+
+class _UnsupportedExpressionError(Exception):
+    """The expression uses PromQL that the in-process injector does not handle."""
+
+
+def _tokenize_promql(expression: str) -> List[Tuple[str, str, int, int]]:
+    """Split an expression into (kind, text, start, end) tokens, dropping whitespace."""
+    tokens = []
+    pos = 0
+    while pos < len(expression):
+        match = _PROMQL_TOKEN_RE.match(expression, pos)
+        if not match:
+            raise _UnsupportedExpressionError(expression[pos:])
+        kind = match.lastgroup or ""
+        if kind != "space":
+            tokens.append((kind, match.group(), match.start(), match.end()))
+        pos = match.end()
+    return tokens
+
+
+def _unquote_promql(literal: str) -> str:
+    """Return the value of a PromQL string literal."""
+    if literal[0] == "`":
+        return literal[1:-1]
+    value = []
+    chars = iter(literal[1:-1])
+    for char in chars:
+        if char != "\\":
+            value.append(char)
+            continue
+        escaped = next(chars)
+        if escaped in _PROMQL_ESCAPES:
+            value.append(_PROMQL_ESCAPES[escaped])
+        elif escaped == literal[0]:
+            value.append(escaped)
+        else:
+            # Numeric escapes are rare enough in rules to leave them to cos-tool
+            raise _UnsupportedExpressionError(literal)
+    return "".join(value)
+
+
+def _quote_promql(value: str) -> str:
+    """Quote a label value the way the Prometheus expression printer (Go's strconv.Quote) does."""
+    if not value.isascii():
+        raise _UnsupportedExpressionError(value)
+    quoted = []
+    for char in value:
+        if char in _GO_ESCAPES:
+            quoted.append(_GO_ESCAPES[char])
+        elif char < " " or char == "\x7f":
+            quoted.append("\\x{:02x}".format(ord(char)))
+        else:
+            quoted.append(char)
+    return '"{}"'.format("".join(quoted))
+
+
+def _skip_label_list(tokens: List[Tuple[str, str, int, int]], i: int) -> int:
+    """Skip a parenthesized list of label names starting at `tokens[i]`; return the next index."""
+    if i >= len(tokens) or tokens[i][1] != "(":
+        return i
+    i += 1
+    while i < len(tokens) and tokens[i][1] != ")":
+        if tokens[i][0] != "ident" and tokens[i][1] != ",":
+            raise _UnsupportedExpressionError(tokens[i][1])
+        i += 1
+    if i == len(tokens):
+        raise _UnsupportedExpressionError("unterminated label list")
+    return i + 1
+
+
+def _parse_matchers(
+    tokens: List[Tuple[str, str, int, int]], i: int, topology: Dict[str, str]
+) -> Tuple[List[str], int]:
+    """Parse the label matchers of a selector, starting at its `{`.
+
+    Returns:
+        A 2-tuple of the matchers, rendered as cos-tool does, and the index of the token after
+        the closing `}`.
+    """
+    matchers = []
+    i += 1
+    while tokens[i][1] != "}":
+        name, op, value = tokens[i : i + 3]
+        if name[0] != "ident" or op[1] not in ("=", "!=", "=~", "!~") or value[0] != "string":
+            raise _UnsupportedExpressionError(name[1])
+        if name[1] in topology:
+            # Whether to keep, replace or reject the existing matcher is cos-tool's call
+            raise _UnsupportedExpressionError(name[1])
+        matchers.append("{}{}{}".format(name[1], op[1], _quote_promql(_unquote_promql(value[1]))))
+        i += 3
+        if tokens[i][1] == ",":
+            i += 1
+        elif tokens[i][1] != "}":
+            raise _UnsupportedExpressionError(tokens[i][1])
+    return matchers, i + 1
+
+
+def _render_matchers(matchers: List[str], topology: Dict[str, str]) -> str:
+    """Render label matchers, with the topology added, sorted as the Prometheus printer does."""
+    matchers = matchers + [
+        "{}={}".format(name, _quote_promql(value)) for name, value in topology.items()
+    ]
+    return "{{{}}}".format(",".join(sorted(matchers)))
+
+
+def _inject_label_matchers_inprocess(expression: str, topology: Dict[str, str]) -> Optional[str]:
+    """Add label matchers to all the vector selectors of a PromQL expression, without cos-tool.
+
+    The rest of the expression is left as is. The matchers of the modified selectors are
+    rendered the way cos-tool renders them (sorted, double-quoted, no spaces), e.g.
+
+    >>> _inject_label_matchers_inprocess(
+    ...     'rate(up{job="x"}[5m]) > 0', {"juju_model": "m"})
+    'rate(up{job="x",juju_model="m"}[5m]) > 0'
+
+    Returns:
+        The modified expression, or None if the expression uses PromQL that this function does
+        not handle (e.g. `@` modifiers, quoted label names, or a matcher on one of the topology
+        labels), in which case cos-tool should be used instead.
+    """
+    try:
+        tokens = _tokenize_promql(expression)
+        edits = []
+        depth = 0
+        i = 0
+        while i < len(tokens):
+            kind, text, start, end = tokens[i]
+            next_text = tokens[i + 1][1] if i + 1 < len(tokens) else None
+            if kind == "ident":
+                keyword = text.lower()
+                if keyword in _PROMQL_LABEL_LIST_KEYWORDS:
+                    i = _skip_label_list(tokens, i + 1)
+                    continue
+                if keyword in _PROMQL_KEYWORDS or next_text == "(":
+                    # An operator, a number, or the name of a function or aggregation
+                    i += 1
+                    continue
+                if keyword in _PROMQL_AGGREGATIONS:
+                    if next_text and next_text.lower() in ("by", "without"):
+                        i += 1
+                        continue
+                    raise _UnsupportedExpressionError(text)
+                if next_text == "{":
+                    matchers, i = _parse_matchers(tokens, i + 1, topology)
+                    end = tokens[i - 1][3]
+                else:
+                    matchers, i = [], i + 1
+                edits.append((start, end, text + _render_matchers(matchers, topology)))
+                continue
+            if text == "{":
+                matchers, i = _parse_matchers(tokens, i, topology)
+                edits.append((start, tokens[i - 1][3], _render_matchers(matchers, topology)))
+                continue
+            if text == "[":
+                # Ranges and subqueries: only durations (and a step) are allowed in there
+                i += 1
+                while i < len(tokens) and tokens[i][1] != "]":
+                    if tokens[i][0] != "number" and tokens[i][1] != ":":
+                        raise _UnsupportedExpressionError(tokens[i][1])
+                    i += 1
+                if i == len(tokens):
+                    raise _UnsupportedExpressionError("unterminated range")
+            elif text in ("@", "}", "]"):
+                raise _UnsupportedExpressionError(text)
+            elif text == "(":
+                depth += 1
+            elif text == ")":
+                depth -= 1
+                if depth < 0:
+                    raise _UnsupportedExpressionError(text)
+            i += 1
+        if depth:
+            raise _UnsupportedExpressionError("unbalanced parentheses")
+    except (_UnsupportedExpressionError, IndexError, StopIteration) as e:
+        logger.debug("Not injecting label matchers in-process into %r: %s", expression, e)
+        return None
+
+    for start, end, replacement in reversed(edits):
+        expression = expression[:start] + replacement + expression[end:]
+    return expression
+
+
 class CosTool:
     """Uses cos-tool to inject label matchers into alert rule expressions and validate rules."""
 
@@ -1869,6 +2653,14 @@ class CosTool:
                 self._disabled = True
         return self._path
 
+    @property
+    def fingerprint(self) -> str:
+        """Identify the cos-tool binary (path, size and mtime), without running it."""
+        if not self.path:
+            return ""
+        stat = Path(self.path).stat()
+        return f"{self.path}:{stat.st_size}:{stat.st_mtime_ns}"
+
     def apply_label_matchers(self, rules) -> dict:
         """Will apply label matchers to the expression of all alerts in all supplied groups."""
         if not self.path:
@@ -1940,6 +2732,10 @@ class CosTool:
         if not self.path:
             logger.debug("`cos-tool` unavailable. Leaving expression unchanged: %s", expression)
             return expression
+        # Most expressions can be handled without spawning cos-tool
+        injected = _inject_label_matchers_inprocess(expression, topology)
+        if injected is not None:
+            return injected
         args = [str(self.path), "transform"]
         args.extend(
             ["--label-matcher={}={}".format(key, value) for key, value in topology.items()]
@@ -1965,5 +2761,12 @@ class CosTool:
         return None
 
     def _exec(self, cmd) -> str:
-        result = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        span = _tracer.start_as_current_span("cos-tool") if _tracer else contextlib.nullcontext()
+        with span as current_span:
+            if current_span:
+                # The subcommand only: the arguments may be large (e.g. alert rules).
+                current_span.set_attribute("command", " ".join(str(arg) for arg in cmd[1:2]))
+            result = subprocess.run(
+                cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+            )
         return result.stdout.decode("utf-8").strip()
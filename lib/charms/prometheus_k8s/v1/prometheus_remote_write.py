@@ -13,9 +13,12 @@ the Prometheus remote_write API, that is, they can receive metrics data over rem
 should use the `PrometheusRemoteWriteProducer`.
 """
 
+import contextlib
 import copy
+import hashlib
 import json
 import logging
+import lzma
 import os
 import platform
 import re
@@ -26,7 +29,7 @@ from pathlib import Path
 from typing import Any, Callable, Dict, List, Mapping, Optional, Set, Tuple, Union
 
 import yaml
-from cosl import JujuTopology
+from cosl import JujuTopology, LZMABase64
 from cosl.rules import HOST_METRICS_MISSING_RULE_NAME, AlertRules, generic_alert_groups
 from ops.charm import (
     CharmBase,
@@ -36,7 +39,14 @@ from ops.charm import (
     RelationMeta,
     RelationRole,
 )
-from ops.framework import BoundEvent, EventBase, EventSource, Object, ObjectEvents
+from ops.framework import (
+    BoundEvent,
+    EventBase,
+    EventSource,
+    Object,
+    ObjectEvents,
+    StoredState,
+)
 from ops.model import Relation
 
 # The unique Charmhub library identifier, never change it
@@ -47,13 +57,21 @@ LIBAPI = 1
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 15
+LIBPATCH = 23
 
 PYDEPS = ["cosl"]
 
 
 logger = logging.getLogger(__name__)
 
+try:
+    # Charms using `ops[tracing]` get a span for each cos-tool call.
+    from opentelemetry import trace
+
+    _tracer = trace.get_tracer(__name__)
+except ImportError:
+    _tracer = None
+
 
 DEFAULT_RELATION_NAME = "receive-remote-write"
 DEFAULT_CONSUMER_NAME = "send-remote-write"
@@ -61,6 +79,40 @@ RELATION_INTERFACE_NAME = "prometheus_remote_write"
 
 DEFAULT_ALERT_RULES_RELATIVE_PATH = "./src/prometheus_alert_rules"
 
+# Protobuf messages of the remote-write protocol. Receivers advertise the messages they accept,
+# and senders pick the first one of their own preference that the receiver accepts. Receivers
+# not advertising any message only accept 1.0.
+# Ref: https://prometheus.io/docs/specs/prw/remote_write_spec_2_0/
+PROTOBUF_MESSAGE_V1 = "prometheus.WriteRequest"
+PROTOBUF_MESSAGE_V2 = "io.prometheus.write.v2.Request"
+REMOTE_WRITE_COMPRESSION = "snappy"
+
+# Fields of the `queue_config` and `metadata_config` sections of a Prometheus `remote_write`
+# block that receivers may recommend to senders.
+# Ref: https://prometheus.io/docs/prometheus/latest/configuration/configuration/#remote_write
+QUEUE_CONFIG_FIELDS = {
+    "capacity",
+    "max_shards",
+    "min_shards",
+    "max_samples_per_send",
+    "batch_send_deadline",
+    "min_backoff",
+    "max_backoff",
+    "retry_on_http_429",
+    "sample_age_limit",
+}
+METADATA_CONFIG_FIELDS = {"send", "send_interval", "max_samples_per_send"}
+
+# Optional encoding of the (possibly large) "alert_rules" payload. Providers advertise the
+# encodings they can decode in their application databag, and consumers only encode the
+# payload for providers that do.
+PAYLOAD_ENCODING = "lzma+base64"
+PAYLOAD_SCHEMA_VERSION = 1
+
+# Stand-in for the unit name in the expressions of rules duplicated per unit. It needs no
+# escaping in a PromQL string, so it can be swapped for each unit name in the rendered expression.
+_JUJU_UNIT_PLACEHOLDER = "__juju_unit_placeholder__"
+
 
 class RelationNotFoundError(Exception):
     """Raised if there is no relation with the given name."""
@@ -287,6 +339,95 @@ def _resolve_dir_against_charm_path(charm: CharmBase, *path_elements: str) -> st
     return str(alerts_dir_path)
 
 
+# Copy/pasted from prometheus_scrape.py
+def _encode_payload(payload: Any) -> str:
+    """Serialize a relation data payload into a versioned, compressed envelope.
+
+    The envelope carries a hash of the payload, so that providers can tell it did not change
+    without decompressing it.
+    """
+    serialized = json.dumps(payload, sort_keys=True)
+    return json.dumps(
+        {
+            "schema_version": PAYLOAD_SCHEMA_VERSION,
+            "encoding": PAYLOAD_ENCODING,
+            "hash": hashlib.sha256(serialized.encode()).hexdigest(),
+            "payload": LZMABase64.compress(serialized),
+        },
+        sort_keys=True,
+    )
+
+
+# Copy/pasted from prometheus_scrape.py
+def _is_encoded_payload(data: Optional[str]) -> bool:
+    """Whether a relation data payload is an envelope produced by `_encode_payload`."""
+    try:
+        envelope = json.loads(data or "null")
+    except json.JSONDecodeError:
+        return False
+    return isinstance(envelope, dict) and "encoding" in envelope
+
+
+# Copy/pasted from prometheus_scrape.py
+def _decode_payload(data: str, cache: Optional[Dict[str, Any]] = None) -> Any:
+    """Deserialize a relation data payload, either plain JSON or an encoded envelope.
+
+    Args:
+        data: the relation data value.
+        cache: an optional mapping from envelope hash to decoded payload, so that unchanged
+            payloads are only decompressed once.
+
+    Raises:
+        ValueError, if the payload is not valid or its schema version or encoding is not
+        supported.
+    """
+    envelope = json.loads(data)
+    if not isinstance(envelope, dict) or "encoding" not in envelope:
+        return envelope
+
+    if (
+        envelope.get("schema_version") != PAYLOAD_SCHEMA_VERSION
+        or envelope["encoding"] != PAYLOAD_ENCODING
+    ):
+        raise ValueError(
+            "Unsupported payload: schema version {}, encoding {}".format(
+                envelope.get("schema_version"), envelope["encoding"]
+            )
+        )
+
+    digest = envelope.get("hash")
+    if cache is not None and digest in cache:
+        return copy.deepcopy(cache[digest])
+
+    try:
+        payload = json.loads(LZMABase64.decompress(envelope["payload"]))
+    except (KeyError, lzma.LZMAError) as e:
+        raise ValueError(f"Invalid encoded payload: {e}") from e
+
+    if cache is not None:
+        cache[digest] = copy.deepcopy(payload)
+    return payload
+
+
+# Copy/pasted from prometheus_scrape.py
+def _accepts_encoded_payloads(relation: Relation) -> bool:
+    """Whether the remote application of a relation advertises support for encoded payloads."""
+    if not relation.app:
+        return False
+    try:
+        accepted = json.loads(relation.data[relation.app].get("accepted_encodings", "[]"))
+    except json.JSONDecodeError:
+        return False
+    return isinstance(accepted, list) and PAYLOAD_ENCODING in accepted
+
+
+def _filter_fields(config: Any, fields: Set[str]) -> Dict[str, Any]:
+    """Return the known fields of a remote_write config section sent over relation data."""
+    if not isinstance(config, dict):
+        return {}
+    return {key: value for key, value in config.items() if key in fields}
+
+
 class PrometheusRemoteWriteConsumerEvents(ObjectEvents):
     """Event descriptor for events raised by `PrometheusRemoteWriteConsumer`."""
 
@@ -407,6 +548,8 @@ class PrometheusRemoteWriteConsumer(Object):
         peer_relation_name: str,
         forward_alert_rules: bool = True,
         extra_alert_labels: Dict = {},
+        protobuf_messages: Optional[List[str]] = None,
+        compress_payloads: bool = False,
     ):
         """API to manage a required relation with the `prometheus_remote_write` interface.
 
@@ -423,6 +566,13 @@ class PrometheusRemoteWriteConsumer(Object):
             peer_relation_name: Name of the peer relation containing units of this charm.
             forward_alert_rules: Flag to toggle forwarding of charmed alert rules.
             extra_alert_labels: Dict of extra labels to inject alert rules with.
+            protobuf_messages: The remote-write protobuf messages the workload can send, in
+                order of preference, e.g. `[PROTOBUF_MESSAGE_V2, PROTOBUF_MESSAGE_V1]`. When
+                set, `endpoints` selects the first one accepted by each receiver. When unset,
+                only remote-write 1.0 is used.
+            compress_payloads: Flag to publish the alert rules as an LZMA-compressed, versioned
+                payload, to the providers that support it. Providers that do not are still
+                sent plain JSON.
 
         Raises:
             RelationNotFoundError: If there is no relation in the charm's metadata.yaml
@@ -454,6 +604,8 @@ class PrometheusRemoteWriteConsumer(Object):
         self._forward_alert_rules = forward_alert_rules
         self._extra_alert_labels = extra_alert_labels
         self._peer_relation_name = peer_relation_name
+        self._protobuf_messages = protobuf_messages or []
+        self._compress_payloads = compress_payloads
         self.topology = JujuTopology.from_charm(charm)
         self._tool = CosTool(self._charm)
         on_relation = self._charm.on[self._relation_name]
@@ -491,6 +643,12 @@ class PrometheusRemoteWriteConsumer(Object):
                 else:
                     self.on.alert_rule_status_changed.emit(valid=valid, errors=errors)
 
+            # Re-publish the alert rules if the provider started (or stopped) supporting encoding.
+            if self._compress_payloads and _is_encoded_payload(
+                event.relation.data[self._charm.app].get("alert_rules")
+            ) != _accepts_encoded_payloads(event.relation):
+                self._push_alerts_to_relation_databag(event.relation)
+
         self.on.endpoints_changed.emit(relation_id=event.relation.id)
 
     def _push_alerts_on_relation_joined(self, event: RelationEvent) -> None:
@@ -529,7 +687,12 @@ class PrometheusRemoteWriteConsumer(Object):
                     alert_rules_as_dict, self._extra_alert_labels
                 )
             )
-        relation.data[self._charm.app]["alert_rules"] = json.dumps(alert_rules_as_dict)
+        encode = (
+            _encode_payload
+            if self._compress_payloads and _accepts_encoded_payloads(relation)
+            else json.dumps
+        )
+        relation.data[self._charm.app]["alert_rules"] = encode(alert_rules_as_dict)
 
     def reload_alerts(self) -> None:
         """Reload alert rules from disk and push to relation data."""
@@ -545,7 +708,7 @@ class PrometheusRemoteWriteConsumer(Object):
         return result
 
     @property
-    def endpoints(self) -> List[Dict[str, str]]:
+    def endpoints(self) -> List[Dict[str, Any]]:
         """A config object ready to be dropped into a prometheus config file.
 
         The endpoints are deduplicated.
@@ -553,6 +716,11 @@ class PrometheusRemoteWriteConsumer(Object):
         The format of the dict is specified in the official prometheus docs:
         https://prometheus.io/docs/prometheus/latest/configuration/configuration/#remote_write
 
+        If the consumer was given `protobuf_messages`, endpoints accepting a more recent
+        protobuf message than remote-write 1.0 also carry the negotiated `protobuf_message`.
+        Endpoints also carry the `queue_config` and `metadata_config` recommended by the
+        receiver, if any.
+
         Returns:
             A list of dictionaries where each dictionary provides information about
             a single remote_write endpoint.
@@ -569,20 +737,31 @@ class PrometheusRemoteWriteConsumer(Object):
                     continue
 
                 deserialized_remote_write = json.loads(remote_write)
-                endpoints.append(
-                    {
-                        "url": deserialized_remote_write["url"],
-                    }
+                endpoint: Dict[str, Any] = {"url": deserialized_remote_write["url"]}
+                message = self._negotiate_protobuf_message(
+                    deserialized_remote_write.get("protobuf_messages", [PROTOBUF_MESSAGE_V1])
                 )
+                if message and message != PROTOBUF_MESSAGE_V1:
+                    endpoint["protobuf_message"] = message
+                for key, fields in (
+                    ("queue_config", QUEUE_CONFIG_FIELDS),
+                    ("metadata_config", METADATA_CONFIG_FIELDS),
+                ):
+                    if recommended := _filter_fields(deserialized_remote_write.get(key), fields):
+                        endpoint[key] = recommended
+                endpoints.append(endpoint)
 
         # When multiple units of the remote-write server are behind an ingress
         # (e.g. mimir), relation data would end up with the same ingress url
         # for all units.
-        # Deduplicate the endpoints by converting each dict to a tuple of
-        # dict.items(), throwing them into a set, and then converting them
-        # back to dictionaries
-        deduplicated_endpoints = [dict(t) for t in {tuple(d.items()) for d in endpoints}]
-        return deduplicated_endpoints
+        # Deduplicate the endpoints by their serialized form, as they may contain
+        # (unhashable) nested dicts.
+        deduplicated_endpoints = {json.dumps(d, sort_keys=True): d for d in endpoints}
+        return list(deduplicated_endpoints.values())
+
+    def _negotiate_protobuf_message(self, accepted: List[str]) -> Optional[str]:
+        """Return the preferred protobuf message of this consumer accepted by a receiver."""
+        return next((m for m in self._protobuf_messages if m in accepted), None)
 
     def _duplicate_rules_per_unit(
         self,
@@ -611,6 +790,14 @@ class PrometheusRemoteWriteConsumer(Object):
                 if rule.get("alert", "") not in rule_names_to_duplicate:
                     new_rules.append(rule)
                 else:
+                    # Inject the juju_unit label matcher once, with a placeholder value that is
+                    # then substituted for each unit, so that the cost (possibly a cos-tool
+                    # spawn) does not grow with the number of units.
+                    expr_template = self._tool.inject_label_matchers(
+                        re.sub(r"%%juju_unit%%,?", "", rule["expr"]),
+                        {"juju_unit": _JUJU_UNIT_PLACEHOLDER},
+                    )
+
                     # Sort unit names to guarantee a deterministic iteration order.
                     for name in sorted(peer_unit_names):
                         juju_unit = name
@@ -620,9 +807,8 @@ class PrometheusRemoteWriteConsumer(Object):
                         modified_rule["labels"]["juju_unit"] = juju_unit
 
                         # Inject juju_unit label matcher.
-                        modified_rule["expr"] = self._tool.inject_label_matchers(
-                            re.sub(r"%%juju_unit%%,?", "", modified_rule["expr"]),
-                            {"juju_unit": juju_unit},
+                        modified_rule["expr"] = expr_template.replace(
+                            _quote_promql(_JUJU_UNIT_PLACEHOLDER), _quote_promql(juju_unit)
                         )
 
                         # If the charm is a subordinate, the severity of the alerts need to be bumped to critical.
@@ -703,6 +889,7 @@ class PrometheusRemoteWriteProvider(Object):
     """
 
     on = PrometheusRemoteWriteProviderEvents()  # pyright: ignore
+    _stored = StoredState()
 
     def __init__(
         self,
@@ -711,6 +898,9 @@ class PrometheusRemoteWriteProvider(Object):
         *,
         server_url_func: Callable[[], str] = lambda: f"http://{socket.getfqdn()}:9090",
         endpoint_path: str = "/api/v1/write",
+        protobuf_messages: Optional[List[str]] = None,
+        queue_config_func: Optional[Callable[[], Dict[str, Any]]] = None,
+        metadata_config_func: Optional[Callable[[], Dict[str, Any]]] = None,
     ):
         """API to manage a provided relation with the `prometheus_remote_write` interface.
 
@@ -720,6 +910,15 @@ class PrometheusRemoteWriteProvider(Object):
                 defined in metadata.yaml.
             server_url_func: A callable returning the URL for your prometheus server.
             endpoint_path: The path of the server's remote_write endpoint.
+            protobuf_messages: The remote-write protobuf messages accepted by the server, e.g.
+                `[PROTOBUF_MESSAGE_V1, PROTOBUF_MESSAGE_V2]`. When set, they are advertised
+                over the relation, together with the compression, so that senders can
+                negotiate remote-write 2.0. When unset, nothing is advertised and senders
+                fall back to remote-write 1.0.
+            queue_config_func: An optional callable returning the `queue_config` recommended
+                to senders, e.g. sized after the server's resources.
+            metadata_config_func: An optional callable returning the `metadata_config`
+                recommended to senders.
 
         Raises:
             RelationNotFoundError: If there is no relation in the charm's metadata.yaml
@@ -741,6 +940,14 @@ class PrometheusRemoteWriteProvider(Object):
         self._relation_name = relation_name
         self._get_server_url = server_url_func
         self._endpoint_path = endpoint_path
+        self._protobuf_messages = protobuf_messages
+        self._get_queue_config = queue_config_func
+        self._get_metadata_config = metadata_config_func
+        # Decoded payloads, by hash, for the duration of the dispatch.
+        self._decoded_payloads: Dict[str, Any] = {}
+        # Processed and validated alert rules, per relation id, so that unchanged relations do
+        # not need to be re-processed on every hook.
+        self._stored.set_default(alert_rules_cache={})
 
         on_relation = self._charm.on[self._relation_name]
         self.framework.observe(
@@ -789,6 +996,15 @@ class PrometheusRemoteWriteProvider(Object):
 
         for relation in relations:
             self._set_endpoint_on_relation(relation)
+            self._set_accepted_encodings(relation)
+
+    def _set_accepted_encodings(self, relation: Relation) -> None:
+        """Advertise the payload encodings this provider can decode."""
+        if not self._charm.unit.is_leader():
+            return
+        accepted = json.dumps([PAYLOAD_ENCODING])
+        if relation.data[self._charm.app].get("accepted_encodings") != accepted:
+            relation.data[self._charm.app]["accepted_encodings"] = accepted
 
     def _set_endpoint_on_relation(self, relation: Relation) -> None:
         """Set the remote_write endpoint on relations.
@@ -796,11 +1012,17 @@ class PrometheusRemoteWriteProvider(Object):
         Args:
             relation: The relation whose data to update.
         """
-        relation.data[self._charm.unit]["remote_write"] = json.dumps(
-            {
-                "url": self._get_server_url().rstrip("/") + "/" + self._endpoint_path.strip("/"),
-            }
-        )
+        remote_write: Dict[str, Any] = {
+            "url": self._get_server_url().rstrip("/") + "/" + self._endpoint_path.strip("/"),
+        }
+        if self._protobuf_messages:
+            remote_write["protobuf_messages"] = self._protobuf_messages
+            remote_write["compression"] = REMOTE_WRITE_COMPRESSION
+        if self._get_queue_config and (queue_config := self._get_queue_config()):
+            remote_write["queue_config"] = queue_config
+        if self._get_metadata_config and (metadata_config := self._get_metadata_config()):
+            remote_write["metadata_config"] = metadata_config
+        relation.data[self._charm.unit]["remote_write"] = json.dumps(remote_write)
 
     @property
     def alerts(self) -> dict:
@@ -830,58 +1052,120 @@ class PrometheusRemoteWriteProvider(Object):
         The `PrometheusRemoteWriteProvider` accepts a list of rules and these
         rules are all placed into one group.
 
+        The processed and validated rules of each relation are cached, keyed by a hash of
+        the relation data they are derived from and of the cos-tool binary. Only relations
+        whose data changed since the last call are re-processed.
+
         Returns:
             a dictionary mapping the name of an alert rule group to the group.
         """
         alerts = {}  # type: Dict[str, dict] # mapping b/w juju identifiers and alert rule files
+        cache = self._stored.alert_rules_cache
+        relation_ids = set()
+
         for relation in self._charm.model.relations[self._relation_name]:
             if not relation.units or not relation.app:
                 continue
 
-            alert_rules = json.loads(relation.data[relation.app].get("alert_rules", "{}"))
-            if not alert_rules:
-                continue
-
-            alert_rules = self._inject_alert_expr_labels(alert_rules)
-
-            identifier, topology = self._get_identifier_by_alert_rules(alert_rules)
-            if not topology:
-                try:
-                    scrape_metadata = json.loads(relation.data[relation.app]["scrape_metadata"])
-                    identifier = JujuTopology.from_dict(scrape_metadata).identifier
-                    alerts[identifier] = self._tool.apply_label_matchers(alert_rules)
-
-                except KeyError as e:
-                    logger.debug(
-                        "Relation %s has no 'scrape_metadata': %s",
-                        relation.id,
-                        e,
-                    )
+            relation_id = str(relation.id)
+            relation_ids.add(relation_id)
+            digest = self._alert_rules_hash(relation)
+
+            cached = cache.get(relation_id)
+            if cached and cached["hash"] == digest:
+                identifier = cached["identifier"]
+                alert_rules = json.loads(cached["rules"])
+                errors = cached["errors"]
+            else:
+                identifier, alert_rules, errors = self._validated_alert_rules(relation)
+                cache[relation_id] = {
+                    "hash": digest,
+                    "identifier": identifier,
+                    "rules": json.dumps(alert_rules),
+                    "errors": errors,
+                }
 
             if not identifier:
-                logger.error(
-                    "Alert rules were found but no usable group or identifier was present."
-                )
                 continue
 
-            alerts[identifier] = alert_rules
-            _, errmsg = self._tool.validate_alert_rules(alert_rules)
-            if errmsg:
-                logger.error(f"Invalid alert rule file: {errmsg}")
-                if alerts[identifier]:
-                    del alerts[identifier]
-                if self._charm.unit.is_leader():
-                    data = json.loads(relation.data[self._charm.app].get("event", "{}"))
-                    data["errors"] = errmsg
-                    relation.data[self._charm.app]["event"] = json.dumps(data)
-                continue
             if self._charm.unit.is_leader():
                 data = json.loads(relation.data[self._charm.app].get("event", "{}"))
-                data.pop("errors", None)
-                relation.data[self._charm.app]["event"] = json.dumps(data)
+                if data.get("errors") != (errors or None):
+                    if errors:
+                        data["errors"] = errors
+                    else:
+                        data.pop("errors", None)
+                    relation.data[self._charm.app]["event"] = json.dumps(data)
+
+            if not errors:
+                alerts[identifier] = alert_rules
+
+        for relation_id in set(cache.keys()) - relation_ids:
+            del cache[relation_id]
 
         return alerts
 
+    def _validated_alert_rules(self, relation: Relation) -> Tuple[Optional[str], dict, str]:
+        """Process and validate the alert rules of a single relation.
+
+        Returns:
+            A 3-tuple of the identifier of the rules file (None if there are no usable
+            rules), the rules with topology label matchers injected, and the validation
+            errors, if any.
+        """
+        try:
+            alert_rules = _decode_payload(
+                relation.data[relation.app].get("alert_rules", "{}"), self._decoded_payloads
+            )
+        except ValueError as e:
+            logger.error("Relation %s has invalid 'alert_rules': %s", relation.id, e)
+            return None, {}, ""
+        if not alert_rules:
+            return None, {}, ""
+
+        alert_rules = self._inject_alert_expr_labels(alert_rules)
+
+        identifier, topology = self._get_identifier_by_alert_rules(alert_rules)
+        if not topology:
+            try:
+                scrape_metadata = json.loads(relation.data[relation.app]["scrape_metadata"])
+                identifier = JujuTopology.from_dict(scrape_metadata).identifier
+                alert_rules = self._tool.apply_label_matchers(alert_rules)
+
+            except KeyError as e:
+                logger.debug(
+                    "Relation %s has no 'scrape_metadata': %s",
+                    relation.id,
+                    e,
+                )
+
+        if not identifier:
+            logger.error("Alert rules were found but no usable group or identifier was present.")
+            return None, {}, ""
+
+        _, errmsg = self._tool.validate_alert_rules(alert_rules)
+        if errmsg:
+            logger.error(f"Invalid alert rule file: {errmsg}")
+            return identifier, {}, errmsg
+
+        return identifier, alert_rules, ""
+
+    def _alert_rules_hash(self, relation: Relation) -> str:
+        """Hash everything the processed alert rules of a relation depend on.
+
+        That is the raw alert rules and scrape metadata of the remote app databag, and
+        the cos-tool binary injecting the label matchers and validating the rules.
+        """
+        app_databag = relation.data.get(relation.app) if relation.app else None
+        app_databag = app_databag or {}
+        hashable = {
+            "libpatch": LIBPATCH,
+            "cos_tool": self._tool.fingerprint,
+            "alert_rules": app_databag.get("alert_rules"),
+            "scrape_metadata": app_databag.get("scrape_metadata"),
+        }
+        return hashlib.sha256(json.dumps(hashable, sort_keys=True).encode()).hexdigest()
+
     def _get_identifier_by_alert_rules(
         self, rules: Dict[str, Any]
     ) -> Tuple[Union[str, None], Union[JujuTopology, None]]:
@@ -975,6 +1259,235 @@ class PrometheusRemoteWriteProvider(Object):
         return rules
 
 
+# Copy/pasted from prometheus_scrape.py
+# PromQL keywords that are followed by a parenthesized list of label names.
+_PROMQL_LABEL_LIST_KEYWORDS = {"by", "without", "on", "ignoring", "group_left", "group_right"}
+# PromQL keywords that are never part of a vector selector.
+_PROMQL_KEYWORDS = {"and", "or", "unless", "bool", "atan2", "offset", "inf", "nan"}
+_PROMQL_AGGREGATIONS = {
+    "sum",
+    "min",
+    "max",
+    "avg",
+    "group",
+    "stddev",
+    "stdvar",
+    "count",
+    "count_values",
+    "bottomk",
+    "topk",
+    "quantile",
+    "limitk",
+    "limit_ratio",
+}
+_PROMQL_TOKEN_RE = re.compile(
+    r"""
+    (?P<space>\s+|\#[^\n]*)
+    |(?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'|`[^`]*`)
+    |(?P<number>
+        0[xX][0-9a-fA-F]+
+        |(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?(?:(?:ms|[smhdwy])(?:\d+(?:ms|[smhdwy]))*)?
+    )
+    |(?P<ident>[a-zA-Z_][a-zA-Z0-9_:]*)
+    |(?P<op>==|!=|=~|!~|<=|>=|[-+*/%^<>=(){}\[\],:@])
+    """,
+    re.VERBOSE,
+)
+_PROMQL_ESCAPES = {
+    "a": "\a",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+    "v": "\v",
+    "\\": "\\",
+}
+_GO_ESCAPES = {v: "\\" + k for k, v in _PROMQL_ESCAPES.items()}
+_GO_ESCAPES['"'] = '\\"'
+
+
+class _UnsupportedExpressionError(Exception):
+    """The expression uses PromQL that the in-process injector does not handle."""
+
+
+def _tokenize_promql(expression: str) -> List[Tuple[str, str, int, int]]:
+    """Split an expression into (kind, text, start, end) tokens, dropping whitespace."""
+    tokens = []
+    pos = 0
+    while pos < len(expression):
+        match = _PROMQL_TOKEN_RE.match(expression, pos)
+        if not match:
+            raise _UnsupportedExpressionError(expression[pos:])
+        kind = match.lastgroup or ""
+        if kind != "space":
+            tokens.append((kind, match.group(), match.start(), match.end()))
+        pos = match.end()
+    return tokens
+
+
+def _unquote_promql(literal: str) -> str:
+    """Return the value of a PromQL string literal."""
+    if literal[0] == "`":
+        return literal[1:-1]
+    value = []
+    chars = iter(literal[1:-1])
+    for char in chars:
+        if char != "\\":
+            value.append(char)
+            continue
+        escaped = next(chars)
+        if escaped in _PROMQL_ESCAPES:
+            value.append(_PROMQL_ESCAPES[escaped])
+        elif escaped == literal[0]:
+            value.append(escaped)
+        else:
+            # Numeric escapes are rare enough in rules to leave them to cos-tool
+            raise _UnsupportedExpressionError(literal)
+    return "".join(value)
+
+
+def _quote_promql(value: str) -> str:
+    """Quote a label value the way the Prometheus expression printer (Go's strconv.Quote) does."""
+    if not value.isascii():
+        raise _UnsupportedExpressionError(value)
+    quoted = []
+    for char in value:
+        if char in _GO_ESCAPES:
+            quoted.append(_GO_ESCAPES[char])
+        elif char < " " or char == "\x7f":
+            quoted.append("\\x{:02x}".format(ord(char)))
+        else:
+            quoted.append(char)
+    return '"{}"'.format("".join(quoted))
+
+
+def _skip_label_list(tokens: List[Tuple[str, str, int, int]], i: int) -> int:
+    """Skip a parenthesized list of label names starting at `tokens[i]`; return the next index."""
+    if i >= len(tokens) or tokens[i][1] != "(":
+        return i
+    i += 1
+    while i < len(tokens) and tokens[i][1] != ")":
+        if tokens[i][0] != "ident" and tokens[i][1] != ",":
+            raise _UnsupportedExpressionError(tokens[i][1])
+        i += 1
+    if i == len(tokens):
+        raise _UnsupportedExpressionError("unterminated label list")
+    return i + 1
+
+
+def _parse_matchers(
+    tokens: List[Tuple[str, str, int, int]], i: int, topology: Dict[str, str]
+) -> Tuple[List[str], int]:
+    """Parse the label matchers of a selector, starting at its `{`.
+
+    Returns:
+        A 2-tuple of the matchers, rendered as cos-tool does, and the index of the token after
+        the closing `}`.
+    """
+    matchers = []
+    i += 1
+    while tokens[i][1] != "}":
+        name, op, value = tokens[i : i + 3]
+        if name[0] != "ident" or op[1] not in ("=", "!=", "=~", "!~") or value[0] != "string":
+            raise _UnsupportedExpressionError(name[1])
+        if name[1] in topology:
+            # Whether to keep, replace or reject the existing matcher is cos-tool's call
+            raise _UnsupportedExpressionError(name[1])
+        matchers.append("{}{}{}".format(name[1], op[1], _quote_promql(_unquote_promql(value[1]))))
+        i += 3
+        if tokens[i][1] == ",":
+            i += 1
+        elif tokens[i][1] != "}":
+            raise _UnsupportedExpressionError(tokens[i][1])
+    return matchers, i + 1
+
+
+def _render_matchers(matchers: List[str], topology: Dict[str, str]) -> str:
+    """Render label matchers, with the topology added, sorted as the Prometheus printer does."""
+    matchers = matchers + [
+        "{}={}".format(name, _quote_promql(value)) for name, value in topology.items()
+    ]
+    return "{{{}}}".format(",".join(sorted(matchers)))
+
+
+def _inject_label_matchers_inprocess(expression: str, topology: Dict[str, str]) -> Optional[str]:
+    """Add label matchers to all the vector selectors of a PromQL expression, without cos-tool.
+
+    The rest of the expression is left as is. The matchers of the modified selectors are
+    rendered the way cos-tool renders them (sorted, double-quoted, no spaces), e.g.
+
+    >>> _inject_label_matchers_inprocess(
+    ...     'rate(up{job="x"}[5m]) > 0', {"juju_model": "m"})
+    'rate(up{job="x",juju_model="m"}[5m]) > 0'
+
+    Returns:
+        The modified expression, or None if the expression uses PromQL that this function does
+        not handle (e.g. `@` modifiers, quoted label names, or a matcher on one of the topology
+        labels), in which case cos-tool should be used instead.
+    """
+    try:
+        tokens = _tokenize_promql(expression)
+        edits = []
+        depth = 0
+        i = 0
+        while i < len(tokens):
+            kind, text, start, end = tokens[i]
+            next_text = tokens[i + 1][1] if i + 1 < len(tokens) else None
+            if kind == "ident":
+                keyword = text.lower()
+                if keyword in _PROMQL_LABEL_LIST_KEYWORDS:
+                    i = _skip_label_list(tokens, i + 1)
+                    continue
+                if keyword in _PROMQL_KEYWORDS or next_text == "(":
+                    # An operator, a number, or the name of a function or aggregation
+                    i += 1
+                    continue
+                if keyword in _PROMQL_AGGREGATIONS:
+                    if next_text and next_text.lower() in ("by", "without"):
+                        i += 1
+                        continue
+                    raise _UnsupportedExpressionError(text)
+                if next_text == "{":
+                    matchers, i = _parse_matchers(tokens, i + 1, topology)
+                    end = tokens[i - 1][3]
+                else:
+                    matchers, i = [], i + 1
+                edits.append((start, end, text + _render_matchers(matchers, topology)))
+                continue
+            if text == "{":
+                matchers, i = _parse_matchers(tokens, i, topology)
+                edits.append((start, tokens[i - 1][3], _render_matchers(matchers, topology)))
+                continue
+            if text == "[":
+                # Ranges and subqueries: only durations (and a step) are allowed in there
+                i += 1
+                while i < len(tokens) and tokens[i][1] != "]":
+                    if tokens[i][0] != "number" and tokens[i][1] != ":":
+                        raise _UnsupportedExpressionError(tokens[i][1])
+                    i += 1
+                if i == len(tokens):
+                    raise _UnsupportedExpressionError("unterminated range")
+            elif text in ("@", "}", "]"):
+                raise _UnsupportedExpressionError(text)
+            elif text == "(":
+                depth += 1
+            elif text == ")":
+                depth -= 1
+                if depth < 0:
+                    raise _UnsupportedExpressionError(text)
+            i += 1
+        if depth:
+            raise _UnsupportedExpressionError("unbalanced parentheses")
+    except (_UnsupportedExpressionError, IndexError, StopIteration) as e:
+        logger.debug("Not injecting label matchers in-process into %r: %s", expression, e)
+        return None
+
+    for start, end, replacement in reversed(edits):
+        expression = expression[:start] + replacement + expression[end:]
+    return expression
+
+
 # Copy/pasted from prometheus_scrape.py
 class CosTool:
     """Uses cos-tool to inject label matchers into alert rule expressions and validate rules."""
@@ -997,6 +1510,14 @@ class CosTool:
                 self._disabled = True
         return self._path
 
+    @property
+    def fingerprint(self) -> str:
+        """Identify the cos-tool binary (path, size and mtime), without running it."""
+        if not self.path:
+            return ""
+        stat = Path(self.path).stat()
+        return f"{self.path}:{stat.st_size}:{stat.st_mtime_ns}"
+
     def apply_label_matchers(self, rules) -> dict:
         """Will apply label matchers to the expression of all alerts in all supplied groups."""
         if not self.path:
@@ -1052,6 +1573,10 @@ class CosTool:
         if not self.path:
             logger.debug("`cos-tool` unavailable. Leaving expression unchanged: %s", expression)
             return expression
+        # Most expressions can be handled without spawning cos-tool
+        injected = _inject_label_matchers_inprocess(expression, topology)
+        if injected is not None:
+            return injected
         args = [str(self.path), "transform"]
         args.extend(
             ["--label-matcher={}={}".format(key, value) for key, value in topology.items()]
@@ -1077,5 +1602,12 @@ class CosTool:
         return None
 
     def _exec(self, cmd) -> str:
-        result = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        span = _tracer.start_as_current_span("cos-tool") if _tracer else contextlib.nullcontext()
+        with span as current_span:
+            if current_span:
+                # The subcommand only: the arguments may be large (e.g. alert rules).
+                current_span.set_attribute("command", " ".join(str(arg) for arg in cmd[1:2]))
+            result = subprocess.run(
+                cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+            )
         return result.stdout.decode("utf-8").strip()
@@ -8,12 +8,16 @@
 import hashlib
 import json
 import logging
+import math
+import os
 import re
 import socket
 import subprocess
-from dataclasses import dataclass
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, TypedDict, cast
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, TypedDict, cast
 from urllib.parse import urlparse
 
 import ops_tracing
@@ -47,6 +51,8 @@ from charms.prometheus_k8s.v1.prometheus_remote_write import (
     DEFAULT_RELATION_NAME as DEFAULT_REMOTE_WRITE_RELATION_NAME,
 )
 from charms.prometheus_k8s.v1.prometheus_remote_write import (
+    PROTOBUF_MESSAGE_V1,
+    PROTOBUF_MESSAGE_V2,
     PrometheusRemoteWriteProvider,
 )
 from charms.tempo_coordinator_k8s.v0.tracing import TracingEndpointRequirer
@@ -65,6 +71,8 @@ from cosl.time_validation import is_valid_timespec
 from lightkube.core.client import Client
 from lightkube.core.exceptions import ApiError as LightkubeApiError
 from lightkube.resources.core_v1 import PersistentVolumeClaim, Pod
+from lightkube.utils.quantity import parse_quantity
+from opentelemetry import trace
 from ops import CollectStatusEvent, StoredState
 from ops.charm import ActionEvent, CharmBase
 from ops.main import main
@@ -77,10 +85,15 @@ from ops.model import (
     StatusBase,
     WaitingStatus,
 )
+from ops.pebble import APIError, ExecError, FileType, Layer
 from ops.pebble import Error as PebbleError
-from ops.pebble import ExecError, Layer
 
+from charm_telemetry import CharmTelemetry, cos_tool_spawns
 from prometheus_client import Prometheus
+from remote_write_sizing import recommended_metadata_config, recommended_queue_config
+from retention_tuning import TsdbUsage, forecast, timespec_to_seconds
+from rule_groups import split_rule_groups
+from storage_profile import select_profile
 from utils import convert_k8s_quantity_to_legacy_binary_gigabytes
 
 PROMETHEUS_DIR = "/etc/prometheus"
@@ -89,6 +102,11 @@ PROMETHEUS_GLOBAL_SCRAPE_INTERVAL = "1m"
 RULES_DIR = f"{PROMETHEUS_DIR}/rules"
 CONFIG_HASH_PATH = f"{PROMETHEUS_DIR}/config.sha256"
 ALERTS_HASH_PATH = f"{PROMETHEUS_DIR}/alerts.sha256"
+TSDB_DIR = "/var/lib/prometheus"
+SNAPSHOTS_DIR = f"{TSDB_DIR}/snapshots"
+# Prometheus only loads the directories of the TSDB named after a block ULID, so blocks can be
+# staged there, on the same filesystem, before being moved in.
+BACKFILL_DIR = f"{TSDB_DIR}/backfill"
 
 # Paths for the private key and the signed server certificate.
 # These are used to present to clients and to authenticate other servers.
@@ -101,6 +119,23 @@ WEB_CONFIG_PATH = f"{PROMETHEUS_DIR}/prometheus-web-config.yml"
 # than 100k exemplars, we set the same floor in prometheus. If the user specifies
 # a lower but positive value, we configure Prometheus to store 100k exemplars.
 EXEMPLARS_FLOOR = 100000
+# Number of configuration reloads kept in the history reported by validate-configuration.
+RELOAD_HISTORY_SIZE = 20
+# Self-telemetry metric of the duration of the phases of `_configure`, by "phase" label.
+CONFIGURE_PHASE_METRIC = "charm_configure_phase_duration_seconds"
+# Retention size used in "auto" mode until the usage of the TSDB has been observed.
+AUTO_RETENTION_DEFAULT_RATIO = 0.8
+# In "auto" mode, the retention size is only changed (restarting Prometheus) if the
+# recommendation drifts further than this, relative to the size in effect.
+AUTO_RETENTION_TOLERANCE = 0.1
+# A warning is logged if the disk is forecast to be full within this many seconds.
+TIME_TO_FULL_WARNING = 2 * 86400
+# The disk usage is forecast at most this often (in seconds), on update-status.
+DISK_FORECAST_INTERVAL = 3600
+# Remote-write protobuf messages accepted by the receiver (1.0 and 2.0).
+REMOTE_WRITE_PROTOBUF_MESSAGES = [PROTOBUF_MESSAGE_V1, PROTOBUF_MESSAGE_V2]
+
+tracer = trace.get_tracer(__name__)
 
 # To keep a tidy debug-log, we suppress some DEBUG/INFO logs from some imported libs,
 # even when charm logging is set to a lower level.
@@ -132,6 +167,7 @@ class CompositeStatus(TypedDict):
     k8s_patch: Tuple[str, str]
     config: Tuple[str, str]
     alert_rules: Tuple[str, str]
+    storage_profile: Tuple[str, str]
 
 
 def to_tuple(status: StatusBase) -> Tuple[str, str]:
@@ -172,13 +208,31 @@ class PrometheusCharm(CharmBase):
                 k8s_patch=to_tuple(ActiveStatus()),
                 config=to_tuple(ActiveStatus()),
                 alert_rules=to_tuple(ActiveStatus()),
+                storage_profile=to_tuple(ActiveStatus()),
             )
         )
+        # Hash of the TLS material last installed by `_update_cert`, to skip redundant work.
+        self._stored.set_default(tls_hash=None)
+        # Debouncing of relation-driven reconciles: when the last relation change was seen, and
+        # since when a reconcile has been pending (None if there is nothing to reconcile).
+        self._stored.set_default(last_relation_change=None, reconcile_pending_since=None)
+        # The most recent configuration reloads, oldest first, to correlate their duration with
+        # the size of the configuration.
+        self._stored.set_default(reload_history=[])
+        # Totals of the counters of the charm self-telemetry, across dispatches.
+        self._stored.set_default(telemetry_counters={})
+        # Ratio of the PVC capacity used as retention size in "auto" mode (None until the usage
+        # of the TSDB has been observed).
+        self._stored.set_default(auto_retention_ratio=None)
+        # When the disk usage was last forecast, and the PVC capacity last fetched by
+        # `_generate_command`, so that update-status does not query the k8s API.
+        self._stored.set_default(last_disk_forecast=None, pvc_capacity=None)
 
         self._name = "prometheus"
         self._port = 9090
+        # Size of the rendered configuration, as of the last `_generate_prometheus_config`.
+        self._config_size = {"config-bytes": 0, "scrape-jobs": 0}
         self.container = self.unit.get_container(self._name)
-        self.set_ports()
 
         self.resources_patch = KubernetesComputeResourcesPatch(
             self,
@@ -199,7 +253,8 @@ class PrometheusCharm(CharmBase):
             certificate_requests=[self._csr_attributes],
         )
         self._cert_transfer = CertificateTransferRequires(self, "receive-ca-cert")
-        # Update certs here in init to avoid code ordering issues
+        # Update certs here in init to avoid code ordering issues. This is a no-op unless the
+        # certificates changed since they were last installed.
         self._update_cert()
 
         self.ingress = IngressPerUnitRequirer(
@@ -213,6 +268,17 @@ class PrometheusCharm(CharmBase):
 
         self._topology = JujuTopology.from_charm(self)
 
+        # Self-telemetry of this dispatch, pushed to the workload when the dispatch completes.
+        self._dispatch_started = time.monotonic()
+        # Counting the cos-tool spawns installs a process-wide audit hook: only do it if needed.
+        self._cos_tool_spawns: Optional[int] = (
+            cos_tool_spawns() if self.model.config.get("enable_charm_telemetry") else None
+        )
+        self._telemetry = CharmTelemetry(
+            {**self._topology.label_matcher_dict, "juju_unit": self.unit.name}
+        )
+        self.framework.observe(self.framework.on.pre_commit, self._push_telemetry)
+
         self.grafana_dashboard_provider = GrafanaDashboardProvider(charm=self)
         # Starting in Prometheus major version 3, Prometheus no longer defaults to PrometheusText0.0.4
         # when a scrape target's Content-Type header is missing or invalid, and instead fails the scrape.
@@ -220,7 +286,14 @@ class PrometheusCharm(CharmBase):
         # The `fallback_scrape_protocol` parameter should only be set for MetricsEndpointConsumers that use Prometheus 3+.
         # Setting it for Prometheus 2 will result in an error.
         self.metrics_consumer = MetricsEndpointConsumer(
-            self, fallback_scrape_protocol="PrometheusText0.0.4"
+            self,
+            fallback_scrape_protocol="PrometheusText0.0.4",
+            service_discovery=(
+                "kubernetes"
+                if self.config.get("scrape_service_discovery") == "kubernetes"
+                else "static"
+            ),
+            compact_jobs=cast(bool, self.config.get("compact_scrape_jobs", False)),
         )
         self.alertmanager_consumer = AlertmanagerConsumer(
             charm=self,
@@ -238,6 +311,7 @@ class PrometheusCharm(CharmBase):
                 self.on.update_status,
                 self._cert_requirer.on.certificate_available,
             ],
+            compress_payloads=True,
         )
         self._prometheus_client = Prometheus(self.internal_url)
 
@@ -246,6 +320,11 @@ class PrometheusCharm(CharmBase):
             relation_name=DEFAULT_REMOTE_WRITE_RELATION_NAME,
             server_url_func=lambda: PrometheusCharm.most_external_url.fget(self),  # type: ignore
             endpoint_path="/api/v1/write",
+            protobuf_messages=REMOTE_WRITE_PROTOBUF_MESSAGES,
+            queue_config_func=self._remote_write_queue_config,
+            metadata_config_func=lambda: recommended_metadata_config(
+                PROMETHEUS_GLOBAL_SCRAPE_INTERVAL
+            ),
         )
 
         self.grafana_source_provider = GrafanaSourceProvider(
@@ -281,6 +360,8 @@ class PrometheusCharm(CharmBase):
             requirer_endpoint=None,
         )
 
+        self.framework.observe(self.on.install, self._on_install_or_upgrade)
+        self.framework.observe(self.on.upgrade_charm, self._on_install_or_upgrade)
         self.framework.observe(self.on.prometheus_pebble_ready, self._on_pebble_ready)
         self.framework.observe(self.on.config_changed, self._configure)
         self.framework.observe(self.on.upgrade_charm, self._configure)
@@ -296,12 +377,22 @@ class PrometheusCharm(CharmBase):
         self.framework.observe(
             self._cert_transfer.on.certificates_removed, self._on_receive_ca_certs
         )
-        self.framework.observe(self.remote_write_provider.on.alert_rules_changed, self._configure)
-        self.framework.observe(self.remote_write_provider.on.consumers_changed, self._configure)
-        self.framework.observe(self.metrics_consumer.on.targets_changed, self._configure)
+        self.framework.observe(
+            self.remote_write_provider.on.alert_rules_changed, self._on_relations_changed
+        )
+        self.framework.observe(
+            self.remote_write_provider.on.consumers_changed, self._on_relations_changed
+        )
+        self.framework.observe(
+            self.metrics_consumer.on.targets_changed, self._on_relations_changed
+        )
         self.framework.observe(self.alertmanager_consumer.on.cluster_changed, self._configure)
         self.framework.observe(self.resources_patch.on.patch_failed, self._on_k8s_patch_failed)
         self.framework.observe(self.on.validate_configuration_action, self._on_validate_config)
+        self.framework.observe(self.on.snapshot_action, self._on_snapshot_action)
+        self.framework.observe(self.on.delete_series_action, self._on_delete_series_action)
+        self.framework.observe(self.on.clean_tombstones_action, self._on_clean_tombstones_action)
+        self.framework.observe(self.on.backfill_action, self._on_backfill_action)
         self.framework.observe(
             self.on.send_datasource_relation_joined, self._on_grafana_source_changed
         )
@@ -332,6 +423,11 @@ class PrometheusCharm(CharmBase):
             self._on_prometheus_api_relation_changed,
         )
 
+    def _on_install_or_upgrade(self, _):
+        # Ports may only change with a new charm revision, so there is no need to sync them on
+        # every hook.
+        self.set_ports()
+
     def _on_grafana_source_changed(self, _):
         self._update_datasource_exchange()
 
@@ -586,12 +682,29 @@ class PrometheusCharm(CharmBase):
     def _tls_available(self) -> bool:
         return bool(self._tls_config)
 
-    def _update_cert(self):
+    def _update_cert(self, force: bool = False):
+        """Install (or remove) the server certificate and CA, in both containers.
+
+        Args:
+            force: whether to reinstall the certificates even if they did not change, e.g.
+                because the workload container was restarted and lost its filesystem.
+        """
+        tls_config = self._tls_config
+        ca_cert_path = Path(self._ca_cert_path)
+        tls_hash = sha256(json.dumps(asdict(tls_config) if tls_config else None))
+        # The CA in the charm container is lost if the charm container restarts, while the stored
+        # state is not, so check it's still there.
+        if (
+            not force
+            and tls_hash == self._stored.tls_hash
+            and ca_cert_path.exists() == bool(tls_config)
+        ):
+            return
+
         if not self.container.can_connect():
             return
 
-        ca_cert_path = Path(self._ca_cert_path)
-        if tls_config := self._tls_config:
+        if tls_config:
             # Save the workload certificates
             self.container.push(
                 CERT_PATH,
@@ -624,6 +737,7 @@ class PrometheusCharm(CharmBase):
 
         self.container.exec(["update-ca-certificates", "--fresh"]).wait()
         subprocess.run(["update-ca-certificates", "--fresh"])
+        self._stored.tls_hash = tls_hash
 
     def _update_ca_certs(self):
         """Get CA certs from relation data and install them in the workload container's root store."""
@@ -644,6 +758,41 @@ class PrometheusCharm(CharmBase):
         self.container.exec(["update-ca-certificates", "--fresh"]).wait()
         self.container.restart("prometheus")
 
+    def _on_relations_changed(self, event):
+        """Reconfigure Prometheus after a change of scrape targets or alert rules.
+
+        When `reconcile_debounce_window` is set, bursts of relation changes (e.g. a large
+        related application scaling, or its pods being rescheduled) are coalesced: a change
+        arriving after the relations were quiet for the window is applied right away, the
+        following ones only mark a reconcile as pending. The pending reconcile then runs on the
+        first relation change after a quiet window, on the next update-status, or on any other
+        reconfiguration, whichever comes first; and on the first relation change once it has been
+        pending for `reconcile_max_staleness` seconds.
+
+        Juju has no timers, so nothing fires when the window closes: without further events,
+        pending changes wait for the next update-status.
+        """
+        window = cast(int, self.model.config.get("reconcile_debounce_window", 0))
+        if window <= 0:
+            self._configure(event)
+            return
+
+        max_staleness = cast(int, self.model.config.get("reconcile_max_staleness", 300))
+        now = time.time()
+        last_change = cast(Optional[float], self._stored.last_relation_change)
+        pending_since = cast(Optional[float], self._stored.reconcile_pending_since)
+        self._stored.last_relation_change = now
+
+        if last_change is None or now - last_change >= window:
+            # The relations were quiet: this is the start of a (possible) burst.
+            self._configure(event)
+        elif pending_since is not None and now - pending_since >= max_staleness:
+            logger.debug("Reconciling after %.0fs of relation changes", now - pending_since)
+            self._configure(event)
+        elif pending_since is None:
+            logger.debug("Relations changed within %ss; deferring the reconcile", window)
+            self._stored.reconcile_pending_since = now
+
     def _configure(self, _):
         """Reconfigure and either reload or restart Prometheus.
 
@@ -690,98 +839,178 @@ class PrometheusCharm(CharmBase):
             self._stored.status["config"] = to_tuple(MaintenanceStatus("Configuring Prometheus"))
             return
 
-        # We use the internal url for grafana source due to
-        # https://github.com/canonical/operator/issues/970
-        self.grafana_source_provider.update_unit_source(self.internal_url)
-        self.ingress.provide_ingress_requirements(
-            scheme=urlparse(self.internal_url).scheme, port=self._port
-        )
-        self.remote_write_provider.update_endpoint()
-        self.catalogue.update_item(item=self._catalogue_item)
-
-        self._update_prometheus_api()
+        with self._configure_phase("relations"):
+            # We use the internal url for grafana source due to
+            # https://github.com/canonical/operator/issues/970
+            self.grafana_source_provider.update_unit_source(self.internal_url)
+            self.ingress.provide_ingress_requirements(
+                scheme=urlparse(self.internal_url).scheme, port=self._port
+            )
+            self.remote_write_provider.update_endpoint()
+            self.catalogue.update_item(item=self._catalogue_item)
 
-        try:
-            # Need to reload if config or alerts changed.
-            # (Both functions need to run so cannot use the short-circuiting `or`.)
-            should_reload = any(
-                [
-                    self._generate_prometheus_config(),
-                    self._set_alerts(),
-                ]
+            self._update_prometheus_api()
+            trace.get_current_span().set_attribute(
+                "relations", sum(len(relations) for relations in self.model.relations.values())
             )
-        except ConfigError as e:
-            logger.error("Failed to generate configuration: %s", e)
-            self._stored.status["config"] = to_tuple(BlockedStatus(str(e)))
-            return
-        except PebbleError as e:
-            logger.error("Failed to push updated config/alert files: %s", e)
-            self._stored.status["config"] = to_tuple(early_return_statuses["push_fail"])
-            return
-        else:
-            self._stored.status["config"] = to_tuple(ActiveStatus())
 
-        try:
-            layer_changed = self._update_layer()
-        except (TypeError, PebbleError) as e:
-            logger.error("Failed to update prometheus service: %s", e)
-            self._stored.status["config"] = to_tuple(early_return_statuses["layer_fail"])
-            return
-        else:
-            self._stored.status["config"] = to_tuple(ActiveStatus())
+        with self._configure_phase("render"):
+            try:
+                # Need to reload if config or alerts changed.
+                # (Both functions need to run so cannot use the short-circuiting `or`.)
+                should_reload = any(
+                    [
+                        self._generate_prometheus_config(),
+                        self._set_alerts(),
+                    ]
+                )
+            except ConfigError as e:
+                logger.error("Failed to generate configuration: %s", e)
+                self._stored.status["config"] = to_tuple(BlockedStatus(str(e)))
+                return
+            except PebbleError as e:
+                logger.error("Failed to push updated config/alert files: %s", e)
+                self._stored.status["config"] = to_tuple(early_return_statuses["push_fail"])
+                return
+            else:
+                self._stored.status["config"] = to_tuple(ActiveStatus())
 
-        try:
-            output, err = self._promtool_check_config()
-            if err:
+        with self._configure_phase("layer"):
+            try:
+                layer_changed = self._update_layer()
+            except (TypeError, PebbleError) as e:
+                logger.error("Failed to update prometheus service: %s", e)
+                self._stored.status["config"] = to_tuple(early_return_statuses["layer_fail"])
+                return
+            else:
+                self._stored.status["config"] = to_tuple(ActiveStatus())
+
+        with self._configure_phase("promtool"):
+            try:
+                output, err = self._promtool_check_config()
+                if err:
+                    logger.error(
+                        "Invalid prometheus configuration. Stdout: %s Stderr: %s", output, err
+                    )
+                    self._stored.status["config"] = to_tuple(
+                        early_return_statuses["config_invalid"]
+                    )
+                    return
+            except PebbleError as e:
+                logger.error("Failed to validate prometheus config: %s", e)
+                self._stored.status["config"] = to_tuple(early_return_statuses["validation_fail"])
+                return
+            else:
+                self._stored.status["config"] = to_tuple(ActiveStatus())
+
+        with self._configure_phase("replan"):
+            try:
+                # If a config is invalid then prometheus would exit immediately.
+                # This would be caught by pebble (default timeout is 30 sec) and a ChangeError
+                # would be raised.
+                self.container.replan()
+                logger.info("Prometheus (re)started")
+            except PebbleError as e:
                 logger.error(
-                    "Invalid prometheus configuration. Stdout: %s Stderr: %s", output, err
+                    "Failed to replan; pebble layer: %s; %s",
+                    self._prometheus_layer.to_dict(),
+                    e,
                 )
-                self._stored.status["config"] = to_tuple(early_return_statuses["config_invalid"])
+                self._stored.status["config"] = to_tuple(early_return_statuses["restart_fail"])
                 return
-        except PebbleError as e:
-            logger.error("Failed to validate prometheus config: %s", e)
-            self._stored.status["config"] = to_tuple(early_return_statuses["validation_fail"])
-            return
-        else:
-            self._stored.status["config"] = to_tuple(ActiveStatus())
-
-        try:
-            # If a config is invalid then prometheus would exit immediately.
-            # This would be caught by pebble (default timeout is 30 sec) and a ChangeError
-            # would be raised.
-            self.container.replan()
-            logger.info("Prometheus (re)started")
-        except PebbleError as e:
-            logger.error(
-                "Failed to replan; pebble layer: %s; %s",
-                self._prometheus_layer.to_dict(),
-                e,
-            )
-            self._stored.status["config"] = to_tuple(early_return_statuses["restart_fail"])
-            return
-        else:
-            self._stored.status["config"] = to_tuple(ActiveStatus())
+            else:
+                self._stored.status["config"] = to_tuple(ActiveStatus())
+                if layer_changed:
+                    self._telemetry.inc("charm_workload_restarts_total")
 
         # We only need to reload if pebble didn't replan (if pebble replanned, then new config
         # would be picked up on startup anyway).
         if not layer_changed and should_reload:
-            reloaded = self._prometheus_client.reload_configuration()
+            started = time.monotonic()
+            with tracer.start_as_current_span("configure: reload") as span:
+                reloaded = self._prometheus_client.reload_configuration()
+                span.set_attribute("reloaded", str(reloaded))
+            duration = time.monotonic() - started
             if not reloaded:
                 logger.error("Prometheus failed to reload the configuration")
+                self._record_reload(duration, "failed")
                 self._stored.status["config"] = to_tuple(early_return_statuses["cfg_load_fail"])
                 return
             if reloaded == "read_timeout":
+                self._record_reload(duration, "timeout")
                 self._stored.status["config"] = to_tuple(early_return_statuses["cfg_load_timeout"])
                 return
+            # The reload endpoint may answer before the configuration is fully applied, so the
+            # outcome is confirmed with Prometheus. An unknown outcome is not held against it.
+            if self._prometheus_client.config_reload_successful() is False:
+                logger.error("Prometheus reports the last configuration reload as failed")
+                self._record_reload(duration, "failed")
+                self._stored.status["config"] = to_tuple(early_return_statuses["cfg_load_fail"])
+                return
 
-            logger.info("Prometheus configuration reloaded")
+            self._record_reload(duration, "success")
+            logger.info("Prometheus configuration reloaded in %.2fs", duration)
             self._stored.status["config"] = to_tuple(ActiveStatus())
 
+        # Whatever relation changes were pending have been applied. Otherwise (on any early
+        # return above) they are retried on the next update-status.
+        self._stored.reconcile_pending_since = None
+
+    @contextmanager
+    def _configure_phase(self, phase: str) -> Iterator[trace.Span]:
+        """Trace and time a phase of `_configure`."""
+        with (
+            tracer.start_as_current_span(f"configure: {phase}") as span,
+            self._telemetry.time(CONFIGURE_PHASE_METRIC, phase=phase),
+        ):
+            yield span
+
+    def _record_reload(self, duration: float, result: str):
+        """Add a configuration reload to the (bounded) reload history."""
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "duration-seconds": round(duration, 3),
+            "result": result,
+            **self._config_size,
+        }
+        history = [dict(e) for e in self._stored.reload_history] + [entry]
+        self._stored.reload_history = history[-RELOAD_HISTORY_SIZE:]
+        self._telemetry.set(CONFIGURE_PHASE_METRIC, duration, phase="reload")
+        self._telemetry.inc("charm_workload_reloads_total")
+
+    def _push_telemetry(self, _):
+        """Push the self-telemetry of this dispatch into the workload, over remote-write."""
+        if not self.model.config.get("enable_charm_telemetry"):
+            return
+        # "hooks/config-changed", "actions/validate-configuration", ...
+        event = os.path.basename(os.environ.get("JUJU_DISPATCH_PATH", "")) or "unknown"
+        self._telemetry.set(
+            "charm_dispatch_duration_seconds",
+            time.monotonic() - self._dispatch_started,
+            event=event,
+        )
+        if self._cos_tool_spawns is not None:
+            self._telemetry.inc(
+                "charm_cos_tool_spawns_total",
+                cos_tool_spawns() - self._cos_tool_spawns,
+            )
+        totals = dict(self._stored.telemetry_counters)
+        self._telemetry.add_counters(totals)
+        self._stored.telemetry_counters = totals
+
+        if not self.container.can_connect():
+            return
+        # The CA of the workload certificate, if any, is also saved in the charm container.
+        ca_path = self._ca_cert_path if Path(self._ca_cert_path).exists() else None
+        self._telemetry.push(f"{self._prometheus_client.base_url}/api/v1/write", ca_path)
+
     def _on_pebble_ready(self, event) -> None:
         """Pebble ready hook.
 
         This runs after the workload container starts.
         """
+        # A (re)started workload container does not have the certificates anymore.
+        self._update_cert(force=True)
         self._configure(event)
         if version := self._prometheus_version:
             self.unit.set_workload_version(version)
@@ -805,25 +1034,162 @@ class PrometheusCharm(CharmBase):
 
     def _update_status(self, event):
         """Fired intermittently by the Juju agent."""
+        retention_changed = self._tune_retention()
         # Unit could still be blocked if a reload failed (e.g. during WAL replay or ingress not
         # yet ready). Calling `_configure` to recover.
-        if self.unit.status != ActiveStatus():
+        # Likewise if relation changes were debounced and have not been reconciled yet.
+        if (
+            retention_changed
+            or self.unit.status != ActiveStatus()
+            or self._stored.reconcile_pending_since is not None
+        ):
             self._configure(event)
 
+    def _tsdb_usage(self) -> Optional[TsdbUsage]:
+        """Fetch the disk usage and ingestion rate of the TSDB from Prometheus itself.
+
+        Returns: None if Prometheus is not reachable, or has not reported them yet.
+        """
+        selector = f'{{job="prometheus",juju_unit="{self.unit.name}"}}'
+        query = self._prometheus_client.query
+        blocks_bytes = query(f"prometheus_tsdb_storage_blocks_bytes{selector}")
+        wal_bytes = query(f"prometheus_tsdb_wal_storage_size_bytes{selector}")
+        samples_per_second = query(
+            f"sum(rate(prometheus_tsdb_head_samples_appended_total{selector}[1h]))"
+        )
+        if blocks_bytes is None or wal_bytes is None or samples_per_second is None:
+            return None
+
+        # Only known once blocks have been compacted.
+        bytes_per_sample = query(
+            f"prometheus_tsdb_compaction_chunk_size_bytes_sum{selector}"
+            f" / prometheus_tsdb_compaction_chunk_samples_sum{selector}"
+        )
+        return TsdbUsage(
+            blocks_bytes=blocks_bytes,
+            wal_bytes=wal_bytes,
+            samples_per_second=samples_per_second,
+            **({"bytes_per_sample": bytes_per_sample} if bytes_per_sample else {}),
+        )
+
+    def _tune_retention(self) -> bool:
+        """Forecast the disk usage of the TSDB, and adapt the retention size in "auto" mode.
+
+        A warning is logged if the disk is still forecast to be full soon. This takes several
+        queries, so it is done at most once every `DISK_FORECAST_INTERVAL`.
+
+        Returns: A boolean indicating if the retention size changed.
+        """
+        config = self.model.config
+        if config.get("maximum_retention_size") != "auto":
+            return False
+        if not self.container.can_connect():
+            return False
+        now = time.time()
+        last_forecast = self._stored.last_disk_forecast
+        if last_forecast is not None and now - last_forecast < DISK_FORECAST_INTERVAL:
+            return False
+        self._stored.last_disk_forecast = now
+
+        if not (usage := self._tsdb_usage()):
+            return False
+        if not (pvc_capacity := self._stored.pvc_capacity):
+            try:
+                pvc_capacity = self._stored.pvc_capacity = self._get_pvc_capacity()
+            except (ValueError, LightkubeApiError) as e:
+                logger.debug("Not forecasting the disk usage: %s", e)
+                return False
+        if not (capacity := float(parse_quantity(pvc_capacity) or 0)):
+            return False
+
+        if self._stored.auto_retention_ratio is None:
+            # The ratio in effect until now, so that only a large enough drift restarts Prometheus.
+            self._stored.auto_retention_ratio = AUTO_RETENTION_DEFAULT_RATIO
+        retention_size = capacity * self._retention_ratio()
+        try:
+            profile = select_profile(
+                cast(str, config.get("storage_profile", "small")),
+                pvc_capacity=pvc_capacity,
+                memory_limit=cast(Optional[str], config.get("memory")),
+            )
+            max_block_duration = timespec_to_seconds(profile.max_block_duration or "")
+        except ValueError:
+            max_block_duration = None
+
+        def _forecast(retention_size_bytes: Optional[float]):
+            return forecast(
+                capacity,
+                usage,
+                retention_size_bytes=retention_size_bytes,
+                retention_time_seconds=timespec_to_seconds(
+                    cast(str, config.get("metrics_retention_time", ""))
+                ),
+                max_block_duration_seconds=max_block_duration,
+            )
+
+        result = _forecast(retention_size)
+        # Rounded down, so as not to exceed the safe size.
+        safe_ratio = math.floor(result.retention_size_bytes / capacity * 1000) / 1000
+        logger.debug(
+            "Disk usage forecast: %s (recommended retention size: %s)", result, safe_ratio
+        )
+
+        changed = False
+        if (
+            abs(safe_ratio - self._retention_ratio())
+            > self._retention_ratio() * AUTO_RETENTION_TOLERANCE
+        ):
+            logger.info("Retention size set to %.1f%% of the PVC capacity", safe_ratio * 100)
+            self._stored.auto_retention_ratio = safe_ratio
+            result = _forecast(capacity * safe_ratio)
+            changed = True
+
+        if result.time_to_full_seconds is not None and (
+            result.time_to_full_seconds < TIME_TO_FULL_WARNING
+        ):
+            logger.warning(
+                "Disk forecast to be full in %.0fh: reduce the ingestion rate or grow the PVC",
+                result.time_to_full_seconds / 3600,
+            )
+
+        return changed
+
     def _set_alerts(self) -> bool:
         """Create alert rule files for all Prometheus consumers.
 
         Returns: A boolean indicating if new or different alert rules were pushed.
         """
-        metrics_consumer_alerts = self.metrics_consumer.alerts
-        remote_write_alerts = self.remote_write_provider.alerts
+        with tracer.start_as_current_span("metrics_consumer.alerts") as span:
+            metrics_consumer_alerts = self.metrics_consumer.alerts
+            span.set_attribute("rule_files", len(metrics_consumer_alerts))
+        with tracer.start_as_current_span("remote_write_provider.alerts") as span:
+            remote_write_alerts = self.remote_write_provider.alerts
+            span.set_attribute("rule_files", len(remote_write_alerts))
         alerts_hash = sha256(str(metrics_consumer_alerts) + str(remote_write_alerts))
+        if max_rules := self._max_rules_per_group:
+            # The files need to be rewritten when the splitting changes, too
+            alerts_hash = sha256(alerts_hash + str(max_rules))
         alert_rules_changed = alerts_hash != self._pull(ALERTS_HASH_PATH)
+        alert_rules = sum(
+            len(group.get("rules", []))
+            for alerts in (metrics_consumer_alerts, remote_write_alerts)
+            for rules_file in alerts.values()
+            for group in rules_file.get("groups", [])
+        )
+        self._telemetry.set("charm_alert_rules", alert_rules)
+        trace.get_current_span().set_attribute("alert_rules", alert_rules)
 
         if alert_rules_changed:
-            self.container.remove_path(RULES_DIR, recursive=True)
-            self._push_alert_rules(metrics_consumer_alerts)
-            self._push_alert_rules(remote_write_alerts)
+            # New rule files are written before stale ones are removed, so that Prometheus never
+            # loads an empty rules directory, and the hash last, so that an interrupted update is
+            # retried on the next hook.
+            rules_files = {
+                **self._alert_rules_files(metrics_consumer_alerts),
+                **self._alert_rules_files(remote_write_alerts),
+            }
+            for path, contents in rules_files.items():
+                self._push(path, contents)
+            self._remove_stale_files(RULES_DIR, keep=rules_files)
             self._push(ALERTS_HASH_PATH, alerts_hash)
 
         if self._has_alert_rule_errors():
@@ -857,21 +1223,23 @@ class PrometheusCharm(CharmBase):
 
         return False
 
-    def _push_alert_rules(self, alerts):
-        """Pushes alert rules from a rules file to the prometheus container.
+    def _alert_rules_files(self, alerts) -> Dict[str, str]:
+        """Render the alert rules files to push to the prometheus container.
 
         Args:
             alerts: a dictionary of alert rule files, fetched from
                 either a metrics consumer or a remote write provider.
-        """
-        for topology_identifier, rules_file in alerts.items():
-            filename = f"juju_{topology_identifier}.rules"
-            path = f"{RULES_DIR}/{filename}"
 
-            rules = yaml.safe_dump(rules_file)
-
-            self._push(path, rules)
-            logger.debug("Updated alert rules file %s", filename)
+        Returns:
+            A mapping from the paths of the rules files to their contents.
+        """
+        max_rules = self._max_rules_per_group
+        return {
+            f"{RULES_DIR}/juju_{topology_identifier}.rules": yaml.safe_dump(
+                split_rule_groups(rules_file, max_rules)
+            )
+            for topology_identifier, rules_file in alerts.items()
+        }
 
     def _generate_command(self) -> str:
         """Construct command to launch Prometheus.
@@ -883,10 +1251,13 @@ class PrometheusCharm(CharmBase):
         config = self.model.config
         args = [
             f"--config.file={PROMETHEUS_CONFIG}",
-            "--storage.tsdb.path=/var/lib/prometheus",
+            f"--storage.tsdb.path={TSDB_DIR}",
             "--web.enable-lifecycle",
         ]
 
+        if config.get("enable_admin_api"):
+            args.append("--web.enable-admin-api")
+
         if self._web_config():
             args.append(f"--web.config.file={WEB_CONFIG_PATH}")
 
@@ -898,24 +1269,43 @@ class PrometheusCharm(CharmBase):
         args.append("--web.route-prefix=/")
 
         args.append("--web.enable-remote-write-receiver")
+        args.extend(
+            f"--web.remote-write-receiver.accepted-protobuf-messages={message}"
+            for message in REMOTE_WRITE_PROTOBUF_MESSAGES
+        )
 
         args.append(f"--log.level={self.log_level}")
 
-        if config.get("metrics_wal_compression"):
+        # The PVC capacity is needed both for the retention size and the storage profile, so
+        # only query the k8s API once.
+        pvc_capacity: Optional[str] = None
+        pvc_capacity_error: Optional[Exception] = None
+        try:
+            pvc_capacity = self._stored.pvc_capacity = self._get_pvc_capacity()
+        except (ValueError, LightkubeApiError) as e:
+            pvc_capacity_error = e
+
+        storage_args = self._storage_profile_args(pvc_capacity)
+        if config.get("metrics_wal_compression") and (
+            "--storage.tsdb.wal-compression" not in storage_args
+        ):
             args.append("--storage.tsdb.wal-compression")
+        args.extend(storage_args)
 
         if self._exemplars:
             args.append("--enable-feature=exemplar-storage")
 
+        if (max_concurrent_evals := self._max_concurrent_rule_evals) > 0:
+            args.append("--enable-feature=concurrent-rule-eval")
+            args.append(f"--rules.max-concurrent-evals={max_concurrent_evals}")
+
         if is_valid_timespec(
             retention_time := cast(str, config.get("metrics_retention_time", ""))
         ):
             args.append(f"--storage.tsdb.retention.time={retention_time}")
 
         try:
-            ratio = self._percent_string_to_ratio(
-                cast(str, config.get("maximum_retention_size", ""))
-            )
+            ratio = self._retention_ratio()
 
         except ValueError as e:
             logger.warning(e)
@@ -930,8 +1320,10 @@ class PrometheusCharm(CharmBase):
             # https://github.com/prometheus/prometheus/issues/10768
             # For simplicity, always communicate to prometheus in GiB
             try:
+                if pvc_capacity_error:
+                    raise pvc_capacity_error
                 capacity = convert_k8s_quantity_to_legacy_binary_gigabytes(
-                    self._get_pvc_capacity(), ratio
+                    cast(str, pvc_capacity), ratio
                 )
             except ValueError as e:
                 self._stored.status["retention_size"] = to_tuple(
@@ -953,17 +1345,54 @@ class PrometheusCharm(CharmBase):
 
         return " ".join(command)
 
+    def _remote_write_queue_config(self) -> Dict[str, Any]:
+        """Return the remote-write `queue_config` recommended to senders."""
+        try:
+            return recommended_queue_config(
+                cpu_limit=cast(Optional[str], self.model.config.get("cpu")),
+                memory_limit=cast(Optional[str], self.model.config.get("memory")),
+            )
+        except ValueError as e:
+            logger.warning("Not recommending a remote-write queue config to senders: %s", e)
+            return {}
+
+    def _storage_profile_args(self, pvc_capacity: Optional[str]) -> List[str]:
+        """Return the TSDB tuning arguments for the configured storage profile.
+
+        Args:
+            pvc_capacity: the PVC capacity in K8s notation; None if it could not be obtained.
+        """
+        profile_name = cast(str, self.model.config.get("storage_profile", "small"))
+        try:
+            profile = select_profile(
+                profile_name,
+                pvc_capacity=pvc_capacity,
+                memory_limit=cast(Optional[str], self.model.config.get("memory")),
+            )
+        except ValueError as e:
+            logger.warning(e)
+            self._stored.status["storage_profile"] = to_tuple(
+                BlockedStatus(f"{e}; using Prometheus defaults")
+            )
+            return []
+
+        logger.debug("Using the '%s' TSDB storage profile", profile.name)
+        self._stored.status["storage_profile"] = to_tuple(ActiveStatus())
+        return profile.to_args()
+
     def _promtool_check_config(self) -> tuple:
         """Check config validity. Runs `promtool check config` inside the workload.
 
         Returns:
             A 2-tuple, (stdout, stderr).
         """
-        proc = self.container.exec(["/usr/bin/promtool", "check", "config", PROMETHEUS_CONFIG])
-        try:
-            output, err = proc.wait_output()
-        except ExecError as e:
-            output, err = e.stdout, e.stderr
+        with tracer.start_as_current_span("promtool check config") as span:
+            proc = self.container.exec(["/usr/bin/promtool", "check", "config", PROMETHEUS_CONFIG])
+            try:
+                output, err = proc.wait_output()
+            except ExecError as e:
+                output, err = e.stdout, e.stderr
+            span.set_attribute("valid", not err)
 
         return output, err
 
@@ -974,8 +1403,192 @@ class PrometheusCharm(CharmBase):
 
         output, err = self._promtool_check_config()
         event.set_results(
-            {"result": output, "error-message": err, "valid": False if err else True}
+            {
+                "result": output,
+                "error-message": err,
+                "valid": False if err else True,
+                "reload-history": json.dumps([dict(e) for e in self._stored.reload_history]),
+            }
+        )
+
+    def _admin_api_available(self, event: ActionEvent) -> bool:
+        """Check that an action relying on the admin API can run, failing it otherwise."""
+        if not self.model.config.get("enable_admin_api"):
+            event.fail("The admin API is disabled; set enable_admin_api=true first")
+            return False
+        if not self.container.can_connect():
+            event.fail("Could not connect to the Prometheus workload!")
+            return False
+        return True
+
+    def _on_snapshot_action(self, event: ActionEvent) -> None:
+        if not self._admin_api_available(event):
+            return
+
+        name = self._prometheus_client.snapshot(skip_head=bool(event.params.get("skip-head")))
+        if not name:
+            event.fail("Failed to create the snapshot. See debug-log")
+            return
+        path = f"{SNAPSHOTS_DIR}/{name}"
+        removed = self._remove_old_snapshots(keep=int(event.params.get("keep", 3)))
+        event.set_results(
+            {
+                "name": name,
+                "path": path,
+                "size-bytes": self._tree_size(path),
+                "removed": json.dumps(removed),
+            }
+        )
+
+    def _on_delete_series_action(self, event: ActionEvent) -> None:
+        if not self._admin_api_available(event):
+            return
+        matches = cast(List[str], event.params.get("match", []))
+        if not matches:
+            event.fail("At least one series selector is required")
+            return
+        start = cast(Optional[str], event.params.get("start"))
+        end = cast(Optional[str], event.params.get("end"))
+
+        limit = int(event.params.get("limit", 10000))
+
+        count = self._prometheus_client.series_count(matches, start, end, limit)
+        if count is None:
+            event.fail("Failed to look up the matching series. See debug-log")
+            return
+        series, truncated = count
+        if event.params.get("dry-run", True):
+            event.set_results({"series": series, "truncated": truncated, "deleted": False})
+            return
+
+        if not self._prometheus_client.delete_series(matches, start, end):
+            event.fail("Failed to delete the series. See debug-log")
+            return
+        logger.info(
+            "Deleted %s%d series matching %s", "over " if truncated else "", series, matches
+        )
+        if event.params.get("clean-tombstones", True) and not self._clean_tombstones(event):
+            return
+        event.set_results({"series": series, "truncated": truncated, "deleted": True})
+
+    def _on_clean_tombstones_action(self, event: ActionEvent) -> None:
+        if self._admin_api_available(event):
+            self._clean_tombstones(event)
+
+    def _clean_tombstones(self, event: ActionEvent) -> bool:
+        event.log("Removing deleted data from disk")
+        if not self._prometheus_client.clean_tombstones():
+            event.fail("Failed to clean the tombstones. See debug-log")
+            return False
+        return True
+
+    def _on_backfill_action(self, event: ActionEvent) -> None:
+        if not self.container.can_connect():
+            event.fail("Could not connect to the Prometheus workload!")
+            return
+        path = cast(str, event.params["path"])
+        max_block_duration = cast(str, event.params.get("max-block-duration", "2h"))
+        if not is_valid_timespec(max_block_duration):
+            event.fail(f"Invalid max-block-duration: {max_block_duration}")
+            return
+
+        try:
+            if event.params.get("location", "workload") == "charm":
+                if not os.path.isfile(path):
+                    event.fail(f"No such file in the charm container: {path}")
+                    return
+                event.log(f"Copying {path} into the workload container")
+                source = f"{BACKFILL_DIR}/input.om"
+                with open(path, "rb") as f:
+                    self.container.push(source, f, make_dirs=True)
+            elif self.container.exists(path):
+                source = path
+            else:
+                event.fail(f"No such file in the workload container: {path}")
+                return
+
+            staging = f"{BACKFILL_DIR}/blocks"
+            if self.container.exists(staging):
+                self.container.remove_path(staging, recursive=True)
+            self.container.make_dir(staging, make_parents=True)
+
+            event.log("Creating blocks")
+            try:
+                self._create_blocks(source, staging, max_block_duration)
+            except ExecError as e:
+                logger.error("promtool failed to create blocks: %s", e.stderr)
+                event.fail(f"Failed to create blocks: {e.stderr}")
+                return
+
+            blocks = sorted(
+                entry.name
+                for entry in self.container.list_files(staging)
+                if entry.type == FileType.DIRECTORY
+            )
+            if blocks:
+                # Pebble cannot move files, but the blocks are on the same filesystem as the
+                # TSDB, so `mv` only renames them, and Prometheus never loads a partial block.
+                try:
+                    self.container.exec(
+                        ["mv", *(f"{staging}/{block}" for block in blocks), TSDB_DIR]
+                    ).wait_output()
+                except ExecError as e:
+                    logger.error("failed to move the backfilled blocks: %s", e.stderr)
+                    event.fail(f"Failed to move the blocks into the TSDB: {e.stderr}")
+                    return
+            logger.info("Backfilled %d blocks from %s", len(blocks), path)
+        finally:
+            if self.container.exists(BACKFILL_DIR):
+                self.container.remove_path(BACKFILL_DIR, recursive=True)
+
+        event.set_results({"blocks": json.dumps(blocks), "count": len(blocks)})
+
+    def _create_blocks(self, source: str, output: str, max_block_duration: str) -> None:
+        """Create TSDB blocks from an OpenMetrics file, with promtool inside the workload.
+
+        Raises:
+            ExecError: if promtool fails, e.g. on a malformed file.
+        """
+        with tracer.start_as_current_span("promtool tsdb create-blocks-from"):
+            self.container.exec(
+                [
+                    "/usr/bin/promtool",
+                    "tsdb",
+                    "create-blocks-from",
+                    "openmetrics",
+                    f"--max-block-duration={max_block_duration}",
+                    source,
+                    output,
+                ]
+            ).wait_output()
+
+    def _tree_size(self, path: str) -> int:
+        """Total (apparent) size of the files under a directory of the workload container."""
+        size = 0
+        for entry in self.container.list_files(path):
+            if entry.type == FileType.DIRECTORY:
+                size += self._tree_size(entry.path)
+            else:
+                size += entry.size or 0
+        return size
+
+    def _remove_old_snapshots(self, keep: int) -> List[str]:
+        """Remove the snapshots beyond the `keep` most recent ones.
+
+        Returns:
+            The names of the removed snapshots.
+        """
+        # Snapshot names start with their creation time, e.g. "20250101T000000Z-1a2b3c4d5e6f7a8b"
+        snapshots = sorted(
+            entry.name
+            for entry in self.container.list_files(SNAPSHOTS_DIR)
+            if entry.type == FileType.DIRECTORY
         )
+        removed = snapshots[: max(len(snapshots) - keep, 0)]
+        for name in removed:
+            self.container.remove_path(f"{SNAPSHOTS_DIR}/{name}", recursive=True)
+            logger.info("Removed TSDB snapshot %s", name)
+        return removed
 
     def _get_pvc_capacity(self) -> str:
         """Get PVC capacity from pod name.
@@ -1035,6 +1648,17 @@ class PrometheusCharm(CharmBase):
 
         return capacity
 
+    def _retention_ratio(self) -> float:
+        """Return the retention size, as a ratio of the PVC capacity.
+
+        Raises:
+            ValueError, if `maximum_retention_size` is invalid.
+        """
+        maximum_retention_size = cast(str, self.model.config.get("maximum_retention_size", ""))
+        if maximum_retention_size == "auto":
+            return self._stored.auto_retention_ratio or AUTO_RETENTION_DEFAULT_RATIO
+        return self._percent_string_to_ratio(maximum_retention_size)
+
     def _percent_string_to_ratio(self, percentage: str) -> float:
         """Convert a string representation of percentage of 0-100%, to a 0-1 ratio.
 
@@ -1130,7 +1754,12 @@ class PrometheusCharm(CharmBase):
 
         prometheus_config["scrape_configs"].append(self._default_config)  # type: ignore
         certs: Dict[str, str] = {}
-        scrape_jobs = self.metrics_consumer.jobs()
+        with tracer.start_as_current_span("metrics_consumer.jobs") as span:
+            scrape_jobs = self.metrics_consumer.jobs()
+            span.set_attribute(
+                "relations", len(self.model.relations[DEFAULT_METRICS_RELATION_NAME])
+            )
+            span.set_attribute("jobs", len(scrape_jobs))
         for job in scrape_jobs:
             job["honor_labels"] = True
 
@@ -1153,18 +1782,27 @@ class PrometheusCharm(CharmBase):
             )
         )
 
-        self._push(PROMETHEUS_CONFIG, yaml.safe_dump(prometheus_config))
-        for filename, contents in certs.items():
-            self._push(filename, contents)
+        with tracer.start_as_current_span("render prometheus.yml") as span:
+            config_yaml = yaml.safe_dump(prometheus_config)
+            span.set_attribute("bytes", len(config_yaml.encode()))
+        self._config_size = {
+            "config-bytes": len(config_yaml.encode()),
+            "scrape-jobs": len(prometheus_config["scrape_configs"]),  # type: ignore
+        }
+        self._telemetry.set("charm_config_bytes", self._config_size["config-bytes"])
+        self._telemetry.set("charm_scrape_jobs", self._config_size["scrape-jobs"])
+        if config_hash == self._pull(CONFIG_HASH_PATH):
+            return False
 
+        files = {PROMETHEUS_CONFIG: config_yaml, **certs}
         if web_config:
-            self._push(WEB_CONFIG_PATH, yaml.safe_dump(web_config))
-        else:
+            files[WEB_CONFIG_PATH] = yaml.safe_dump(web_config)
+        for path, contents in files.items():
+            self._push(path, contents)
+        if not web_config:
             self.container.remove_path(WEB_CONFIG_PATH, recursive=True)
 
-        if config_hash == self._pull(CONFIG_HASH_PATH):
-            return False
-
+        # The hash is written last, so that an interrupted write is retried on the next hook.
         self._push(CONFIG_HASH_PATH, config_hash)
         logger.info("Pushed new configuration")
         return True
@@ -1235,21 +1873,48 @@ class PrometheusCharm(CharmBase):
             return max(exemplars_from_config, EXEMPLARS_FLOOR)
         return 0
 
+    @property
+    def _max_rules_per_group(self) -> int:
+        return max(cast(int, self.model.config.get("max_rules_per_group", 0)), 0)
+
+    @property
+    def _max_concurrent_rule_evals(self) -> int:
+        return max(cast(int, self.model.config.get("max_concurrent_rule_evals", 0)), 0)
+
     def _pull(self, path) -> Optional[str]:
         """Pull file from container (without raising pebble errors).
 
         Returns:
             File contents if exists; None otherwise.
         """
-        try:
-            return cast(str, self.container.pull(path, encoding="utf-8").read())
-        except (FileNotFoundError, PebbleError):
-            # Drop FileNotFoundError https://github.com/canonical/operator/issues/896
-            return None
+        with tracer.start_as_current_span("pebble pull") as span:
+            span.set_attribute("path", path)
+            try:
+                contents = cast(str, self.container.pull(path, encoding="utf-8").read())
+            except (FileNotFoundError, PebbleError):
+                # Drop FileNotFoundError https://github.com/canonical/operator/issues/896
+                return None
+            span.set_attribute("bytes", len(contents.encode()))
+            return contents
 
     def _push(self, path, contents):
         """Push file to container, creating subdirs as necessary."""
-        self.container.push(path, contents, make_dirs=True, encoding="utf-8")
+        with tracer.start_as_current_span("pebble push") as span:
+            span.set_attribute("path", path)
+            span.set_attribute("bytes", len(contents.encode()))
+            self.container.push(path, contents, make_dirs=True, encoding="utf-8")
+        self._telemetry.inc("charm_pebble_pushes_total")
+
+    def _remove_stale_files(self, directory: str, keep: Iterable[str]):
+        """Remove the files of a directory of the container that are not in `keep` (paths)."""
+        keep = set(keep)
+        try:
+            entries = self.container.list_files(directory)
+        except (APIError, FileNotFoundError):
+            return
+        for entry in entries:
+            if entry.path not in keep:
+                self.container.remove_path(entry.path, recursive=True)
 
     def _update_datasource_exchange(self) -> None:
         """Update the grafana-datasource-exchange relations."""
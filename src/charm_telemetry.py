@@ -0,0 +1,208 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Self-telemetry of the charm, pushed into the local Prometheus over remote-write.
+
+The charm is not a long-running process that could be scraped: it runs for the duration of a
+single dispatch (hook or action). So at the end of each dispatch, if `enable_charm_telemetry` is
+set, it pushes samples about what it just did (how long it took, how large the rendered
+configuration is, ...) to the remote-write receiver of the Prometheus it manages, with the same
+Juju topology labels as its other metrics.
+
+Remote-write requests are snappy-compressed protobuf messages. The messages sent here are small
+and simple, so they are encoded by hand rather than by pulling in protobuf and snappy libraries:
+the protobuf wire format is written field by field, and the snappy block consists of literals
+only, which any snappy decoder accepts.
+Ref: https://prometheus.io/docs/specs/prw/remote_write_spec/
+"""
+
+import logging
+import os
+import struct
+import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, MutableMapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+REMOTE_WRITE_HEADERS = {
+    "Content-Encoding": "snappy",
+    "Content-Type": "application/x-protobuf",
+    "X-Prometheus-Remote-Write-Version": "0.1.0",
+}
+
+# Largest literal of a snappy block with a 2-byte length.
+SNAPPY_MAX_LITERAL = 1 << 16
+
+
+# Number of cos-tool processes spawned by this process, once `cos_tool_spawns` has been called.
+_cos_tool_spawns = 0
+_audit_hook_installed = False
+
+
+def _count_cos_tool_spawns(event: str, args: tuple):
+    global _cos_tool_spawns
+    if event != "subprocess.Popen":
+        return
+    try:
+        # The arguments of the event are: executable, args, cwd, env.
+        executable, argv = args[0], args[1]
+        program = executable or (argv if isinstance(argv, (str, bytes, os.PathLike)) else argv[0])
+        if os.path.basename(os.fsdecode(program)).startswith("cos-tool"):
+            _cos_tool_spawns += 1
+    except Exception:
+        # Audit hooks must not break the calls they observe.
+        pass
+
+
+def cos_tool_spawns() -> int:
+    """Number of cos-tool processes spawned so far by the charm libs of this process.
+
+    The processes are counted with an audit hook, installed on the first call, so that the
+    libs (which every related charm ships) need no knowledge of the charm telemetry.
+    """
+    global _audit_hook_installed
+    if not _audit_hook_installed:
+        sys.addaudithook(_count_cos_tool_spawns)
+        _audit_hook_installed = True
+    return _cos_tool_spawns
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _length_delimited(field: int, payload: bytes) -> bytes:
+    return _varint(field << 3 | 2) + _varint(len(payload)) + payload
+
+
+def _encode_series(labels: Dict[str, str], value: float, timestamp_ms: int) -> bytes:
+    """Encode a `prometheus.TimeSeries` with a single sample."""
+    encoded = b"".join(
+        _length_delimited(1, _length_delimited(1, k.encode()) + _length_delimited(2, v.encode()))
+        for k, v in sorted(labels.items())
+    )
+    # Sample: value is a double (fixed64), timestamp an int64 (varint).
+    sample = b"\x09" + struct.pack("<d", value) + b"\x10" + _varint(timestamp_ms)
+    return encoded + _length_delimited(2, sample)
+
+
+def snappy_compress(data: bytes) -> bytes:
+    r"""Frame `data` as a snappy block made of literals only.
+
+    >>> snappy_compress(b"abc")
+    b'\x03\x08abc'
+    """
+    out = bytearray(_varint(len(data)))
+    for start in range(0, len(data), SNAPPY_MAX_LITERAL):
+        chunk = data[start : start + SNAPPY_MAX_LITERAL]
+        if len(chunk) <= 60:
+            out.append((len(chunk) - 1) << 2)
+        else:
+            out.append(61 << 2)
+            out += (len(chunk) - 1).to_bytes(2, "little")
+        out += chunk
+    return bytes(out)
+
+
+class CharmTelemetry:
+    """Samples collected during a dispatch, to be pushed at its end."""
+
+    def __init__(self, labels: Dict[str, str]):
+        """Collect samples with the given labels (e.g. the Juju topology).
+
+        Args:
+            labels: labels added to all the samples.
+        """
+        self._labels = labels
+        # One sample per series: the last value recorded during the dispatch.
+        self._samples: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._counters: Dict[str, float] = {}
+
+    def set(self, name: str, value: float, **labels: str):
+        """Record the value of a gauge, replacing any previous value of the same series."""
+        self._samples[(name, tuple(sorted(labels.items())))] = float(value)
+
+    def inc(self, name: str, value: float = 1):
+        """Increment a counter."""
+        self._counters[name] = self._counters.get(name, 0) + value
+
+    @contextmanager
+    def time(self, name: str, **labels: str) -> Iterator[None]:
+        """Record the duration of the block, in seconds."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.set(name, time.monotonic() - start, **labels)
+
+    def add_counters(self, totals: MutableMapping[str, float]):
+        """Add the counters of this dispatch to the totals of the previous ones.
+
+        Counters must be monotonic across dispatches, so their totals are kept by the charm
+        (e.g. in stored state). The resulting totals are recorded as samples.
+        """
+        for name, value in self._counters.items():
+            totals[name] = totals.get(name, 0) + value
+        self._counters = {}
+        for name, value in totals.items():
+            self.set(name, value)
+
+    def write_request(self, timestamp_ms: int) -> bytes:
+        """Encode the samples as a snappy-compressed `prometheus.WriteRequest`."""
+        request = b"".join(
+            _length_delimited(
+                1,
+                _encode_series(
+                    {**self._labels, **dict(labels), "__name__": name}, value, timestamp_ms
+                ),
+            )
+            for (name, labels), value in self._samples.items()
+        )
+        return snappy_compress(request)
+
+    def push(self, url: str, ca_path: Optional[str] = None, timeout: float = 2.0) -> bool:
+        """Push the samples to a remote-write endpoint.
+
+        Args:
+            url: the remote-write endpoint.
+            ca_path: the CA bundle to verify the endpoint with, if it is not signed by a CA of
+                the system.
+            timeout: the timeout of the request, in seconds.
+
+        Returns:
+            True if the samples were accepted, False otherwise.
+        """
+        if not self._samples:
+            return True
+
+        import requests
+
+        body = self.write_request(int(time.time() * 1000))
+        try:
+            response = requests.post(
+                url,
+                data=body,
+                headers=REMOTE_WRITE_HEADERS,
+                timeout=timeout,
+                verify=ca_path or True,
+            )
+        except requests.exceptions.RequestException as e:
+            logger.debug("failed to push charm telemetry to %s: %s", url, e)
+            return False
+
+        if response.status_code >= 300:
+            logger.debug(
+                "charm telemetry rejected by %s: %s %s", url, response.status_code, response.text
+            )
+            return False
+        return True
@@ -4,10 +4,7 @@
 """Helper for interacting with Prometheus throughout the charm's lifecycle."""
 
 import logging
-from typing import Union
-
-import requests
-from requests.exceptions import ConnectionError, ConnectTimeout, ReadTimeout
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +37,11 @@ class Prometheus:
           "read_timeout" on a read timeout.
           False on error.
         """
+        # requests is slow to import and most hooks never talk to the workload, so it is only
+        # imported when needed.
+        import requests
+        from requests.exceptions import ConnectionError, ConnectTimeout, ReadTimeout
+
         url = f"{self.base_url}/-/reload"
         try:
             response = requests.post(url, timeout=self.api_timeout, verify=False)
@@ -54,6 +56,198 @@ class Prometheus:
 
         return False
 
+    def config_reload_successful(self) -> Optional[bool]:
+        """Check whether the last configuration reload was successful.
+
+        A reload request may return before the new configuration is fully applied, so the
+        outcome is confirmed with the runtime information, which reflects the
+        `prometheus_config_last_reload_successful` metric.
+
+        Returns:
+            True if the last reload succeeded; False if it failed;
+            None if Prometheus is not reachable.
+        """
+        import requests
+
+        url = f"{self.base_url}/api/v1/status/runtimeinfo"
+
+        try:
+            response = requests.get(url, timeout=self.api_timeout, verify=False)
+
+            if response.status_code == 200:
+                info = response.json()
+                if info and info["status"] == "success":
+                    return bool(info["data"]["reloadConfigSuccess"])
+        except Exception as e:
+            logger.debug("failed to fetch runtime info via %s: %s", url, str(e))
+
+        return None
+
+    def query(self, expression: str) -> Optional[float]:
+        """Evaluate an instant query that returns a single sample.
+
+        Args:
+            expression: the PromQL expression to evaluate.
+
+        Returns:
+            The value of the first sample of the result; None if the result is empty, or if
+            Prometheus is not reachable.
+        """
+        import requests
+
+        url = f"{self.base_url}/api/v1/query"
+
+        try:
+            response = requests.get(
+                url, params={"query": expression}, timeout=self.api_timeout, verify=False
+            )
+
+            if response.status_code == 200:
+                info = response.json()
+                if info and info["status"] == "success" and info["data"]["result"]:
+                    return float(info["data"]["result"][0]["value"][1])
+        except Exception as e:
+            logger.debug("failed to evaluate %s via %s: %s", expression, url, str(e))
+
+        return None
+
+    def snapshot(self, skip_head: bool = False, timeout: float = 60.0) -> Optional[str]:
+        """Create a snapshot of the TSDB through the admin API.
+
+        Args:
+            skip_head: whether to leave out the data of the head block.
+            timeout: Timeout (in seconds); persisting the head block may take a while.
+
+        Returns:
+            The name of the snapshot (a directory under `<tsdb path>/snapshots`); None on error,
+            e.g. if the admin API is disabled.
+        """
+        import requests
+
+        url = f"{self.base_url}/api/v1/admin/tsdb/snapshot"
+
+        try:
+            response = requests.post(
+                url,
+                params={"skip_head": str(skip_head).lower()},
+                timeout=timeout,
+                verify=False,
+            )
+
+            if response.status_code == 200:
+                return response.json()["data"]["name"]
+            logger.error("snapshot failed via %s: %s", url, response.text)
+        except Exception as e:
+            logger.error("snapshot failed via %s: %s", url, str(e))
+
+        return None
+
+    def series_count(
+        self,
+        matches: List[str],
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        limit: int = 10000,
+        timeout: float = 60.0,
+    ) -> Optional[Tuple[int, bool]]:
+        """Count the series matching any of the given selectors, over a time range.
+
+        These are the series `delete_series` would delete with the same arguments. As there
+        may be millions of them, at most `limit` series are listed.
+
+        Args:
+            matches: series selectors, e.g. `['up{job="x"}']`.
+            start: start of the time range (RFC 3339 or Unix timestamp); unbounded if None.
+            end: end of the time range (RFC 3339 or Unix timestamp); unbounded if None.
+            limit: maximum number of series to count.
+            timeout: Timeout (in seconds).
+
+        Returns:
+            The number of matching series (at most `limit`), and whether there are more;
+            None on error.
+        """
+        import requests
+
+        url = f"{self.base_url}/api/v1/series"
+        # One more than the limit, to tell whether there are more series.
+        params = {**self._series_params(matches, start, end), "limit": limit + 1}
+
+        try:
+            # POST, so that long selectors do not exceed the URL length limit.
+            response = requests.post(url, data=params, timeout=timeout, verify=False)
+
+            if response.status_code == 200:
+                count = len(response.json()["data"])
+                return min(count, limit), count > limit
+            logger.error("series lookup failed via %s: %s", url, response.text)
+        except Exception as e:
+            logger.error("series lookup failed via %s: %s", url, str(e))
+
+        return None
+
+    def delete_series(
+        self,
+        matches: List[str],
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        timeout: float = 300.0,
+    ) -> bool:
+        """Delete the series matching any of the given selectors, through the admin API.
+
+        The data is only marked as deleted (with tombstones) until the blocks are compacted,
+        or the tombstones are cleaned.
+
+        Args:
+            matches: series selectors, e.g. `['up{job="x"}']`.
+            start: start of the time range (RFC 3339 or Unix timestamp); unbounded if None.
+            end: end of the time range (RFC 3339 or Unix timestamp); unbounded if None.
+            timeout: Timeout (in seconds).
+
+        Returns:
+            True if the series were deleted; False on error.
+        """
+        return self._admin_request(
+            "tsdb/delete_series", self._series_params(matches, start, end), timeout
+        )
+
+    def clean_tombstones(self, timeout: float = 300.0) -> bool:
+        """Remove the deleted data from disk, through the admin API.
+
+        Args:
+            timeout: Timeout (in seconds); all the blocks with tombstones are rewritten.
+
+        Returns:
+            True if the tombstones were cleaned; False on error.
+        """
+        return self._admin_request("tsdb/clean_tombstones", {}, timeout)
+
+    @staticmethod
+    def _series_params(
+        matches: List[str], start: Optional[str], end: Optional[str]
+    ) -> Dict[str, Any]:
+        params: Dict[str, Any] = {"match[]": matches}
+        if start:
+            params["start"] = start
+        if end:
+            params["end"] = end
+        return params
+
+    def _admin_request(self, endpoint: str, params: Dict[str, Any], timeout: float) -> bool:
+        import requests
+
+        url = f"{self.base_url}/api/v1/admin/{endpoint}"
+
+        try:
+            response = requests.post(url, data=params, timeout=timeout, verify=False)
+
+            if response.status_code in (200, 204):
+                return True
+            logger.error("admin request failed via %s: %s", url, response.text)
+        except Exception as e:
+            logger.error("admin request failed via %s: %s", url, str(e))
+
+        return False
+
     def _build_info(self) -> dict:
         """Fetch build information from Prometheus.
 
@@ -63,6 +257,8 @@ class Prometheus:
             instance is not reachable then an empty dictionary is
             returned.
         """
+        import requests
+
         url = f"{self.base_url}/api/v1/status/buildinfo"
 
         try:
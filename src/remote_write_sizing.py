@@ -0,0 +1,99 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Recommended remote-write settings for the senders writing to this Prometheus.
+
+Senders use the Prometheus remote-write queue defaults unless told otherwise: up to 50
+concurrent requests (shards) of 2000 samples each. A receiver with a small CPU or memory
+limit is overwhelmed by a few such senders, while a large one could take bigger batches.
+
+The receiver publishes the settings below over the `receive-remote-write` relation, where
+senders can drop them into their `remote_write` configuration.
+Ref: https://prometheus.io/docs/practices/remote_write/
+"""
+
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+from lightkube.utils.quantity import parse_quantity
+
+# Prometheus defaults, recommended as is when the receiver has no resource limits.
+MAX_SHARDS = 50
+MAX_SAMPLES_PER_SEND = 2000
+# The queue capacity is recommended to be a few times the batch size.
+CAPACITY_PER_BATCH = 5
+
+# Concurrent write requests a receiver CPU core is expected to keep up with.
+SHARDS_PER_CPU = 10
+# Smallest batch worth a request.
+MIN_SAMPLES_PER_SEND = 100
+# Fraction of the memory limit budgeted for the samples of the in-flight requests of a sender,
+# and the estimated memory footprint of a sample being ingested (labels included).
+IN_FLIGHT_MEMORY_FRACTION = Decimal("0.1")
+BYTES_PER_IN_FLIGHT_SAMPLE = 1024
+
+
+def _parse(quantity: Optional[str]) -> Optional[Decimal]:
+    if not quantity:
+        return None
+    if (value := parse_quantity(quantity)) is None:
+        raise ValueError(f"Invalid quantity: {quantity}")
+    return value
+
+
+def recommended_queue_config(
+    cpu_limit: Optional[str] = None, memory_limit: Optional[str] = None
+) -> Dict[str, Any]:
+    """Return the `queue_config` recommended to a single sender.
+
+    The number of shards is bound by the CPU limit, and the batch size by the memory limit
+    and the number of shards.
+
+    >>> recommended_queue_config()["max_shards"]
+    50
+    >>> recommended_queue_config("500m", "1Gi")["max_shards"]
+    5
+
+    Args:
+        cpu_limit: the CPU limit in K8s notation, e.g. "500m"; None if unlimited.
+        memory_limit: the memory limit in K8s notation, e.g. "1Gi"; None if unlimited.
+
+    Raises:
+        ValueError, if any of the quantities are invalid.
+    """
+    max_shards = MAX_SHARDS
+    if (cpu := _parse(cpu_limit)) is not None:
+        max_shards = max(1, min(MAX_SHARDS, int(cpu * SHARDS_PER_CPU)))
+
+    max_samples_per_send = MAX_SAMPLES_PER_SEND
+    if (memory := _parse(memory_limit)) is not None:
+        in_flight_samples = memory * IN_FLIGHT_MEMORY_FRACTION / BYTES_PER_IN_FLIGHT_SAMPLE
+        max_samples_per_send = max(
+            MIN_SAMPLES_PER_SEND, min(MAX_SAMPLES_PER_SEND, int(in_flight_samples / max_shards))
+        )
+
+    return {
+        "capacity": max_samples_per_send * CAPACITY_PER_BATCH,
+        "min_shards": 1,
+        "max_shards": max_shards,
+        "max_samples_per_send": max_samples_per_send,
+        "batch_send_deadline": "5s",
+        "min_backoff": "30ms",
+        "max_backoff": "5s",
+    }
+
+
+def recommended_metadata_config(scrape_interval: str) -> Dict[str, Any]:
+    """Return the `metadata_config` recommended to senders.
+
+    Metric metadata rarely changes, so there is no point in sending it more often than the
+    receiver scrapes its own targets.
+
+    Args:
+        scrape_interval: the global scrape interval of the receiver, e.g. "1m".
+    """
+    return {
+        "send": True,
+        "send_interval": scrape_interval,
+        "max_samples_per_send": 500,
+    }
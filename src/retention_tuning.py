@@ -0,0 +1,143 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Retention settings derived from the observed disk usage and ingestion rate.
+
+A static `retention.size` (a percentage of the PVC capacity) does not account for the disk
+space Prometheus needs on top of the retained blocks: compaction writes a new block before
+deleting the blocks it replaces, and ingestion may grow. Prometheus then runs out of disk
+during compaction, even though the retained blocks are within their limit.
+
+Given the TSDB storage metrics of Prometheus itself, this module forecasts when the disk
+will be full, and the `retention.size` (and the matching `retention.time`) that keeps enough
+headroom for compaction at the current ingestion rate.
+Ref: https://prometheus.io/docs/prometheus/latest/storage/#operational-aspects
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+# Compressed size of a sample when Prometheus has not compacted any block yet.
+DEFAULT_BYTES_PER_SAMPLE = 2.0
+# Fraction of the capacity kept free for ingestion growth and WAL spikes.
+GROWTH_MARGIN = 0.05
+# The recommended retention size never goes below this fraction of the capacity.
+MIN_RETENTION_FRACTION = 0.1
+# Prometheus defaults: the largest block spans 10% of the retention time, up to 31 days.
+MAX_BLOCK_DURATION_FRACTION = 0.1
+MAX_BLOCK_DURATION_SECONDS = 31 * 86400
+
+TIMESPEC_UNITS = {
+    "y": 365 * 86400,
+    "w": 7 * 86400,
+    "d": 86400,
+    "h": 3600,
+    "m": 60,
+    "s": 1,
+    "ms": 0.001,
+}
+_TIMESPEC_RE = re.compile(r"(\d+)(ms|[ywdhms])")
+
+
+def timespec_to_seconds(timespec: str) -> Optional[float]:
+    """Return the duration of a Prometheus time spec, or None if it is not valid.
+
+    >>> timespec_to_seconds("1d12h")
+    129600
+    """
+    if not timespec or not (matches := _TIMESPEC_RE.findall(timespec)):
+        return None
+    if "".join(value + unit for value, unit in matches) != timespec:
+        return None
+    return sum(int(value) * TIMESPEC_UNITS[unit] for value, unit in matches)
+
+
+@dataclass(frozen=True)
+class TsdbUsage:
+    """Disk usage and ingestion rate of the TSDB, as reported by Prometheus."""
+
+    blocks_bytes: float
+    wal_bytes: float
+    samples_per_second: float
+    bytes_per_sample: float = DEFAULT_BYTES_PER_SAMPLE
+
+    @property
+    def used_bytes(self) -> float:
+        """Disk space used by the persisted blocks and the write-ahead log."""
+        return self.blocks_bytes + self.wal_bytes
+
+    @property
+    def ingestion_bytes_per_second(self) -> float:
+        """Rate at which the TSDB grows on disk, before retention kicks in."""
+        return self.samples_per_second * self.bytes_per_sample
+
+
+@dataclass(frozen=True)
+class RetentionForecast:
+    """Disk usage forecast and the retention settings recommended for it."""
+
+    retention_size_bytes: int
+    """The largest `retention.size` leaving enough headroom for compaction and growth."""
+    retention_time_seconds: Optional[float]
+    """How much data `retention_size_bytes` holds at the current ingestion rate."""
+    time_to_full_seconds: Optional[float]
+    """When the disk is expected to be full with the current settings; None if never."""
+
+
+def forecast(
+    capacity_bytes: float,
+    usage: TsdbUsage,
+    retention_size_bytes: Optional[float] = None,
+    retention_time_seconds: Optional[float] = None,
+    max_block_duration_seconds: Optional[float] = None,
+) -> RetentionForecast:
+    """Forecast the disk usage of the TSDB, and recommend a safe retention size.
+
+    Prometheus counts the WAL and the head chunks in `retention.size`, but not the new block
+    written by a compaction, which can span the maximum block duration. That much disk
+    space, plus a margin for ingestion growth, must stay free.
+
+    >>> usage = TsdbUsage(blocks_bytes=40e9, wal_bytes=2e9, samples_per_second=100_000)
+    >>> f = forecast(100e9, usage, retention_size_bytes=80e9)
+    >>> round(f.retention_size_bytes / 1e9, 2), round(f.time_to_full_seconds / 86400, 1)
+    (69.08, 1.6)
+
+    Args:
+        capacity_bytes: the capacity of the volume the TSDB is on.
+        usage: the current usage of the TSDB.
+        retention_size_bytes: the current `retention.size`; None if unset.
+        retention_time_seconds: the current `retention.time`; None if unset.
+        max_block_duration_seconds: the maximum block duration, if set explicitly; otherwise
+            derived from the retention time as Prometheus does.
+    """
+    rate = usage.ingestion_bytes_per_second
+
+    if max_block_duration_seconds is None:
+        max_block_duration_seconds = min(
+            MAX_BLOCK_DURATION_SECONDS,
+            (retention_time_seconds or 15 * 86400) * MAX_BLOCK_DURATION_FRACTION,
+        )
+    headroom = rate * max_block_duration_seconds + capacity_bytes * GROWTH_MARGIN
+
+    safe_size = max(capacity_bytes * MIN_RETENTION_FRACTION, capacity_bytes - headroom)
+    safe_time = safe_size / rate if rate > 0 else None
+
+    # The TSDB stops growing at whichever retention limit it reaches first.
+    limits = [capacity_bytes]
+    if retention_size_bytes:
+        limits.append(retention_size_bytes)
+    if retention_time_seconds and rate > 0:
+        limits.append(rate * retention_time_seconds + usage.wal_bytes)
+    steady_state = min(limits)
+
+    if steady_state + headroom <= capacity_bytes or rate <= 0:
+        time_to_full = None
+    else:
+        time_to_full = max(0.0, (capacity_bytes - headroom - usage.used_bytes) / rate)
+
+    return RetentionForecast(
+        retention_size_bytes=int(safe_size),
+        retention_time_seconds=safe_time,
+        time_to_full_seconds=time_to_full,
+    )
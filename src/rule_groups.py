@@ -0,0 +1,111 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Splitting of oversized alert rule groups.
+
+Prometheus evaluates the groups of a rules file concurrently, but the rules within a group
+sequentially, one after the other. Related charms often ship all their rules in a single group,
+whose evaluation can then take longer than the evaluation interval.
+
+Rules only need to share a group when one of them uses the output of another, i.e. a rule
+querying the metric recorded by a recording rule (or the `ALERTS` series of alerting rules).
+All the other rules can be moved into smaller groups, which are evaluated concurrently.
+"""
+
+import re
+from typing import Dict, List
+
+# Anything that may be a metric name in an expression. This over-matches (function names,
+# label names, ...), which at worst keeps independent rules together.
+IDENTIFIER_RE = re.compile(r"[a-zA-Z_:][a-zA-Z0-9_:]*")
+
+# Series that depend on every alerting rule of a group.
+ALERTS_SERIES = {"ALERTS", "ALERTS_FOR_STATE"}
+
+
+def _dependent_rule_sets(rules: List[dict]) -> List[List[dict]]:
+    """Partition the rules of a group into sets that must be evaluated together.
+
+    Rules end up in the same set when one uses the output of the other (directly or
+    transitively). The order of the rules is preserved, and sets are ordered by their first rule.
+    """
+    parents = list(range(len(rules)))
+
+    def find(i: int) -> int:
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    def union(i: int, j: int):
+        parents[find(j)] = find(i)
+
+    identifiers = [set(IDENTIFIER_RE.findall(str(rule.get("expr", "")))) for rule in rules]
+    # A metric may be recorded by several rules (e.g. with different labels).
+    recorded: Dict[str, List[int]] = {}
+    for i, rule in enumerate(rules):
+        if "record" in rule:
+            recorded.setdefault(rule["record"], []).append(i)
+    alerting = [i for i, rule in enumerate(rules) if "alert" in rule]
+
+    for i, names in enumerate(identifiers):
+        for name in names:
+            if name in recorded:
+                for j in recorded[name]:
+                    union(j, i)
+            elif name in ALERTS_SERIES:
+                for j in alerting:
+                    union(j, i)
+
+    sets: Dict[int, List[dict]] = {}
+    for i, rule in enumerate(rules):
+        sets.setdefault(find(i), []).append(rule)
+    return list(sets.values())
+
+
+def split_rule_groups(rules_file: dict, max_rules: int) -> dict:
+    """Split the groups of a rules file into groups of at most `max_rules` rules.
+
+    Rules that depend on each other are never split apart, so a group may still end up with
+    more than `max_rules` rules. The first part keeps the name of the original group (and thus
+    the state of its alerts); the other parts are suffixed with `_2`, `_3`, etc.
+
+    >>> rules = {"groups": [{"name": "g", "rules": [{"alert": "A"}, {"alert": "B"}, {"alert": "C"}]}]}
+    >>> [(g["name"], len(g["rules"])) for g in split_rule_groups(rules, 2)["groups"]]
+    [('g', 2), ('g_2', 1)]
+
+    Args:
+        rules_file: the contents of a rules file, i.e. a dict with a "groups" list.
+        max_rules: the maximum number of rules per group; non-positive values disable splitting.
+    """
+    if max_rules <= 0:
+        return rules_file
+
+    groups = rules_file.get("groups", [])
+    taken_names = {group.get("name") for group in groups}
+    split_groups = []
+
+    for group in groups:
+        rules = group.get("rules", [])
+        if len(rules) <= max_rules:
+            split_groups.append(group)
+            continue
+
+        # Greedily pack the sets of dependent rules into parts, in order.
+        parts: List[List[dict]] = [[]]
+        for rule_set in _dependent_rule_sets(rules):
+            if parts[-1] and len(parts[-1]) + len(rule_set) > max_rules:
+                parts.append([])
+            parts[-1].extend(rule_set)
+
+        for index, part in enumerate(parts, start=1):
+            name = group["name"]
+            if index > 1:
+                suffix = index
+                while f"{name}_{suffix}" in taken_names:
+                    suffix += 1
+                name = f"{name}_{suffix}"
+                taken_names.add(name)
+            split_groups.append({**group, "name": name, "rules": part})
+
+    return {**rules_file, "groups": split_groups}
@@ -0,0 +1,130 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""TSDB storage tuning profiles.
+
+Prometheus ships with TSDB defaults that are a good fit for small instances. Larger
+deployments (big PVC, plenty of memory) benefit from a different set of trade-offs, e.g.
+zstd WAL compression, bounded block durations and an asynchronous head chunks write queue.
+
+A profile is either picked explicitly by the administrator, or derived ("auto") from the
+PVC capacity and the memory limit of the workload container.
+"""
+
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from lightkube.utils.quantity import parse_quantity
+
+GiB = 2**30
+
+
+@dataclass(frozen=True)
+class StorageProfile:
+    """A set of TSDB tuning flags for the Prometheus workload."""
+
+    name: str
+    wal_compression_type: Optional[str] = None
+    min_block_duration: Optional[str] = None
+    max_block_duration: Optional[str] = None
+    head_chunks_write_queue_size: int = 0
+    delayed_compaction: bool = False
+
+    def to_args(self) -> List[str]:
+        """Render the profile as Prometheus command line arguments."""
+        args = []
+        if self.wal_compression_type:
+            args.append("--storage.tsdb.wal-compression")
+            args.append(f"--storage.tsdb.wal-compression-type={self.wal_compression_type}")
+        if self.min_block_duration:
+            args.append(f"--storage.tsdb.min-block-duration={self.min_block_duration}")
+        if self.max_block_duration:
+            args.append(f"--storage.tsdb.max-block-duration={self.max_block_duration}")
+        if self.head_chunks_write_queue_size:
+            args.append(
+                "--storage.tsdb.head-chunks-write-queue-size="
+                f"{self.head_chunks_write_queue_size}"
+            )
+        if self.delayed_compaction:
+            args.append("--enable-feature=delayed-compaction")
+        return args
+
+
+# The "small" profile intentionally renders no flags, so that small instances keep running
+# with the upstream defaults.
+PROFILES: Dict[str, StorageProfile] = {
+    "small": StorageProfile(name="small"),
+    "medium": StorageProfile(
+        name="medium",
+        wal_compression_type="zstd",
+        head_chunks_write_queue_size=10000,
+    ),
+    "large": StorageProfile(
+        name="large",
+        wal_compression_type="zstd",
+        min_block_duration="2h",
+        # Bounding the block size keeps compaction memory and disk headroom in check.
+        max_block_duration="24h",
+        head_chunks_write_queue_size=100000,
+        delayed_compaction=True,
+    ),
+}
+
+# Minimum (PVC capacity, memory limit) in GiB for a profile to be picked automatically.
+AUTO_THRESHOLDS = [
+    ("large", Decimal(500), Decimal(16)),
+    ("medium", Decimal(50), Decimal(4)),
+]
+
+
+def _to_gib(quantity: Optional[str]) -> Optional[Decimal]:
+    if not quantity:
+        return None
+    if (value := parse_quantity(quantity)) is None:
+        raise ValueError(f"Invalid quantity: {quantity}")
+    return value / GiB
+
+
+def select_profile(
+    profile: str, pvc_capacity: Optional[str] = None, memory_limit: Optional[str] = None
+) -> StorageProfile:
+    """Return the storage profile to use.
+
+    Args:
+        profile: the configured profile name; one of "auto", "small", "medium", "large".
+        pvc_capacity: the PVC capacity in K8s notation, e.g. "100Gi"; None if unknown.
+        memory_limit: the memory limit in K8s notation, e.g. "8Gi"; None if unlimited.
+
+    In "auto" mode, the profile is derived from the PVC capacity and the memory limit. An
+    unknown capacity falls back to the "small" profile; an unlimited memory is not a
+    constraint.
+
+    >>> select_profile("auto", "1Ti", "32Gi").name
+    'large'
+    >>> select_profile("auto", "100Gi").name
+    'medium'
+    >>> select_profile("auto", "1Ti", "2Gi").name
+    'small'
+
+    Raises:
+        ValueError, if the profile name or any of the quantities are invalid.
+    """
+    if profile != "auto":
+        if profile not in PROFILES:
+            raise ValueError(
+                f"Invalid storage profile: {profile}; "
+                f"must be one of auto/{'/'.join(PROFILES)}"
+            )
+        return PROFILES[profile]
+
+    capacity = _to_gib(pvc_capacity)
+    memory = _to_gib(memory_limit)
+    if capacity is None:
+        return PROFILES["small"]
+
+    for name, min_capacity, min_memory in AUTO_THRESHOLDS:
+        if capacity >= min_capacity and (memory is None or memory >= min_memory):
+            return PROFILES[name]
+
+    return PROFILES["small"]
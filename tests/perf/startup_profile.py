@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+"""Measure how long the charm takes to import and to reach its first event handler.
+
+Every hook, on every unit, pays for importing `src/charm.py` and constructing
+`PrometheusCharm` before any handler runs. This module breaks that cost down:
+
+- per imported module group (each `charms.*` lib, lightkube, cryptography, ops_tracing, ...),
+  measured with `python -X importtime` in a fresh interpreter;
+- per `PrometheusCharm.__init__` section (each relation object and helper), measured by
+  timing the constructors while dispatching an `update-status` hook with `ops.testing`.
+
+It runs offline. Use it directly to print a report:
+
+    PYTHONPATH=.:lib:src python tests/perf/startup_profile.py
+
+The budgets in `startup_budget.yaml` are enforced by `test_startup_budget.py`.
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+from unittest.mock import patch
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent.parent
+
+# Module prefixes whose (exclusive) import time is reported separately. Any `charms.*` lib is
+# reported under its own name; everything else is reported under "other".
+IMPORT_GROUPS = (
+    "charm",
+    "ops_tracing",
+    "opentelemetry",
+    "ops",
+    "lightkube",
+    "cryptography",
+    "pydantic",
+    "jsonschema",
+    "cosl",
+    "yaml",
+    "requests",
+    "httpx",
+)
+
+# Attributes of the `charm` module that are constructed in `PrometheusCharm.__init__`, or
+# methods of `PrometheusCharm` called from it.
+INIT_SECTIONS = (
+    "KubernetesComputeResourcesPatch",
+    "TLSCertificatesRequiresV4",
+    "CertificateTransferRequires",
+    "IngressPerUnitRequirer",
+    "JujuTopology.from_charm",
+    "GrafanaDashboardProvider",
+    "MetricsEndpointConsumer",
+    "AlertmanagerConsumer",
+    "MetricsEndpointProvider",
+    "PrometheusRemoteWriteProvider",
+    "GrafanaSourceProvider",
+    "CatalogueConsumer",
+    "ops_tracing.Tracing",
+    "TracingEndpointRequirer",
+    "LogForwarder",
+    "DatasourceExchange",
+    "PrometheusCharm._update_cert",
+    "socket.getfqdn",
+)
+
+
+def _group_of(module: str) -> str:
+    if module.startswith("charms."):
+        # Report each lib on its own, e.g. "charms.tls_certificates_interface.v4.tls_certificates",
+        # and the namespace packages in between as "charms".
+        parts = module.split(".")
+        return ".".join(parts[:4]) if len(parts) >= 4 else "charms"
+    for prefix in IMPORT_GROUPS:
+        if module == prefix or module.startswith(prefix + "."):
+            return prefix
+    return "other"
+
+
+def parse_importtime(stderr: str) -> Tuple[float, Dict[str, float]]:
+    """Parse the output of `python -X importtime`.
+
+    Returns:
+        A 2-tuple of the cumulative import time of `charm` (in ms), and a mapping from
+        module group to the self (exclusive) time spent importing its modules (in ms).
+        Self times do not overlap, so the groups add up to the total.
+    """
+    total = 0.0
+    groups: Dict[str, float] = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        module = name.strip()
+        groups[_group_of(module)] += int(self_us) / 1000
+        if module == "charm":
+            total = int(cumulative_us) / 1000
+    return total, dict(groups)
+
+
+def profile_imports(runs: int = 5) -> Tuple[float, Dict[str, float]]:
+    """Import the charm in fresh interpreters and return the median breakdown."""
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(str(PROJECT_DIR / p) for p in ("", "lib", "src")),
+    }
+    samples = []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import charm"],
+            capture_output=True,
+            text=True,
+            env=env,
+            cwd=PROJECT_DIR,
+            check=True,
+        )
+        samples.append(parse_importtime(proc.stderr))
+
+    median_total = statistics.median(total for total, _ in samples)
+    groups = {
+        group: statistics.median(sample.get(group, 0.0) for _, sample in samples)
+        for group in {group for _, sample in samples for group in sample}
+    }
+    return median_total, groups
+
+
+def _resolve(charm_module, dotted: str) -> Tuple[object, str]:
+    """Return the (owner, attribute) pair for a dotted name relative to the charm module."""
+    *path, attribute = dotted.split(".")
+    owner = charm_module
+    for part in path:
+        owner = getattr(owner, part)
+    return owner, attribute
+
+
+def _timed(func: Callable, timings: Dict[str, List[float]], section: str) -> Callable:
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings[section].append((time.perf_counter() - start) * 1000)
+
+    return wrapper
+
+
+def profile_dispatch(runs: int = 5) -> Tuple[float, float, Dict[str, float]]:
+    """Dispatch `update-status` with `ops.testing` and time the charm's construction.
+
+    Returns:
+        A 3-tuple of the median time (in ms) spent in `PrometheusCharm.__init__`, the median
+        time from the start of the dispatch until the first `PrometheusCharm` handler is
+        invoked, and a mapping from `__init__` section to its median time (in ms).
+    """
+    from ops import pebble
+    from scenario import Container, Context, Exec, State
+
+    import charm
+
+    init_timings: Dict[str, List[float]] = defaultdict(list)
+    first_handler: List[float] = []
+    dispatch_start = [0.0]
+
+    # ops looks handlers up by name, so the wrapper must keep the name of the original.
+    @wraps(charm.PrometheusCharm._update_status)
+    def on_update_status(self, event):
+        first_handler.append((time.perf_counter() - dispatch_start[0]) * 1000)
+
+    with ExitStack() as stack:
+        # The same patches as the unit tests, so that nothing reaches out to k8s or the workload.
+        stack.enter_context(patch("lightkube.core.client.GenericSyncClient"))
+        stack.enter_context(
+            patch.multiple(
+                "charm.KubernetesComputeResourcesPatch",
+                _namespace="test-namespace",
+                _patch=lambda *_, **__: True,
+                is_ready=lambda *_, **__: True,
+            )
+        )
+        stack.enter_context(patch("prometheus_client.Prometheus.reload_configuration"))
+        stack.enter_context(
+            patch.object(charm.PrometheusCharm, "_get_pvc_capacity", lambda _: "1Gi")
+        )
+        stack.enter_context(
+            patch.object(charm.PrometheusCharm, "_update_status", on_update_status)
+        )
+        stack.enter_context(patch("charm.subprocess.run"))
+
+        for section in INIT_SECTIONS:
+            owner, attribute = _resolve(charm, section)
+            original = getattr(owner, attribute)
+            if isinstance(original, type):
+                # Classes are timed through their constructor, to keep `isinstance` working.
+                owner, attribute = original, "__init__"
+                original = original.__init__
+            stack.enter_context(
+                patch.object(owner, attribute, _timed(original, init_timings, section))
+            )
+
+        charm_init = charm.PrometheusCharm.__init__
+        stack.enter_context(
+            patch.object(
+                charm.PrometheusCharm,
+                "__init__",
+                _timed(charm_init, init_timings, "PrometheusCharm.__init__"),
+            )
+        )
+
+        container = Container(
+            "prometheus",
+            can_connect=True,
+            layers={"prometheus": pebble.Layer({"services": {"prometheus": {}}})},
+            service_statuses={"prometheus": pebble.ServiceStatus.ACTIVE},
+            execs={Exec(["update-ca-certificates", "--fresh"], return_code=0, stdout="")},
+        )
+        state = State(containers=[container])
+        context = Context(charm.PrometheusCharm, juju_version="3.6.0")
+        # A first run to warm up caches that a real dispatch would not have either way, e.g.
+        # scenario's own setup.
+        context.run(context.on.update_status(), state)
+        init_timings.clear()
+        first_handler.clear()
+
+        for _ in range(runs):
+            dispatch_start[0] = time.perf_counter()
+            context.run(context.on.update_status(), state)
+
+    total_init = init_timings.pop("PrometheusCharm.__init__")
+    sections = {section: statistics.median(timings) for section, timings in init_timings.items()}
+    return statistics.median(total_init), statistics.median(first_handler), sections
+
+
+def main():
+    """Print the startup breakdown."""
+    import_total, import_groups = profile_imports()
+    init_total, first_handler, init_sections = profile_dispatch()
+
+    print(f"import charm: {import_total:.1f} ms (self time per module group)")
+    for group, ms in sorted(import_groups.items(), key=lambda kv: -kv[1]):
+        print(f"  {group:<60} {ms:8.1f} ms")
+    print(f"PrometheusCharm.__init__: {init_total:.1f} ms")
+    for section, ms in sorted(init_sections.items(), key=lambda kv: -kv[1]):
+        print(f"  {section:<60} {ms:8.1f} ms")
+    print(f"dispatch start to first handler: {first_handler:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
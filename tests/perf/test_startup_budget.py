@@ -0,0 +1,47 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+from pathlib import Path
+
+import pytest
+import yaml
+from startup_profile import profile_dispatch, profile_imports
+
+BUDGET = yaml.safe_load((Path(__file__).parent / "startup_budget.yaml").read_text())
+
+
+@pytest.fixture(scope="module")
+def imports():
+    return profile_imports()
+
+
+@pytest.fixture(scope="module")
+def dispatch():
+    return profile_dispatch()
+
+
+def test_import_time_is_within_budget(imports):
+    total, _ = imports
+    assert total <= BUDGET["import_ms"], f"import charm took {total:.1f}ms"
+
+
+@pytest.mark.parametrize("group", sorted(BUDGET["import_groups_ms"]))
+def test_import_time_per_module_group_is_within_budget(imports, group):
+    _, groups = imports
+    took = groups.get(group, 0.0)
+    assert took <= BUDGET["import_groups_ms"][group], f"importing {group} took {took:.1f}ms"
+
+
+def test_init_time_is_within_budget(dispatch):
+    init_total, _, sections = dispatch
+    breakdown = ", ".join(f"{k}={v:.1f}ms" for k, v in sorted(sections.items()))
+    assert init_total <= BUDGET["init_ms"], (
+        f"PrometheusCharm.__init__ took {init_total:.1f}ms ({breakdown})"
+    )
+
+
+def test_time_to_first_handler_is_within_budget(dispatch):
+    _, first_handler, _ = dispatch
+    assert first_handler <= BUDGET["first_handler_ms"], (
+        f"reaching the first handler took {first_handler:.1f}ms"
+    )
@@ -1,7 +1,9 @@
 import json
 import logging
+from unittest.mock import patch
 
 from charms.prometheus_k8s.v1.prometheus_remote_write import (
+    CosTool,
     PrometheusRemoteWriteConsumer,
 )
 from cosl.rules import HOST_METRICS_MISSING_RULE_NAME
@@ -123,3 +125,20 @@ def test_remote_write_no_alert_duplication_when_no_peers():
     # AND we should have in total two HostMetricsMissing rules:
     # one for the remote writer itself and one for the scraped charm.
     assert total_host_metrics_missing_rules == 2
+
+def test_remote_write_alert_duplication_cost_does_not_grow_with_units():
+    def label_matcher_injections(peers):
+        context = Context(charm_type=RemoteWriteConsumerCharm, meta=META)
+        remote_relation = Relation(endpoint="send-remote-write")
+        peer_relation = PeerRelation(endpoint="peers", peers_data={i: {} for i in range(1, peers + 1)})
+        state = State(relations={remote_relation, peer_relation}, leader=True)
+        with patch.object(
+            CosTool, "inject_label_matchers", autospec=True, side_effect=CosTool.inject_label_matchers
+        ) as inject_label_matchers:
+            context.run(context.on.relation_joined(remote_relation), state)
+        return inject_label_matchers.call_count
+
+    # GIVEN remote writers with one and with ten units
+    # WHEN their alert rules are duplicated per unit
+    # THEN label matchers are injected as many times for both
+    assert label_matcher_injections(0) == label_matcher_injections(9) > 0
@@ -0,0 +1,110 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import dataclasses
+import json
+from unittest.mock import patch
+
+import pytest
+from ops.pebble import ExecError
+from scenario import ActionFailed, Exec, Mount, State
+
+from charm import BACKFILL_DIR, TSDB_DIR, PrometheusCharm
+
+BLOCKS = ["01JBLOCK0000000000000000A1", "01JBLOCK0000000000000000B2"]
+
+
+@pytest.fixture
+def tsdb_dir(tmp_path):
+    (tmp_path / "metrics.om").write_text('up{job="app"} 1 1700000000\n# EOF\n')
+    return tmp_path
+
+
+@pytest.fixture
+def state(prometheus_container, tsdb_dir):
+    container = dataclasses.replace(
+        prometheus_container,
+        mounts={"tsdb": Mount(location=TSDB_DIR, source=tsdb_dir)},
+        execs={*prometheus_container.execs, Exec(["mv"])},
+    )
+    return State(containers={container})
+
+
+def _create_blocks(tsdb_dir):
+    def _create(source, output, max_block_duration):
+        for block in BLOCKS:
+            (tsdb_dir / "backfill" / "blocks" / block).mkdir(parents=True)
+
+    return patch.object(PrometheusCharm, "_create_blocks", side_effect=_create)
+
+
+def _moves(context):
+    return [e for e in context.exec_history.get("prometheus", []) if e.command[0] == "mv"]
+
+
+def test_backfill_moves_the_blocks_into_the_tsdb(context, state, tsdb_dir):
+    # WHEN an OpenMetrics file of the workload container is backfilled
+    params = {"path": f"{TSDB_DIR}/metrics.om", "max-block-duration": "24h"}
+    with _create_blocks(tsdb_dir) as create_blocks:
+        context.run(context.on.action("backfill", params=params), state)
+
+    # THEN the blocks are created in the staging directory
+    create_blocks.assert_called_once_with(
+        f"{TSDB_DIR}/metrics.om", f"{BACKFILL_DIR}/blocks", "24h"
+    )
+    # AND moved into the TSDB
+    assert context.action_results == {"blocks": json.dumps(BLOCKS), "count": 2}
+    (move,) = _moves(context)
+    assert move.command == ["mv", *(f"{BACKFILL_DIR}/blocks/{b}" for b in BLOCKS), TSDB_DIR]
+    # AND the staging directory is removed
+    assert not (tsdb_dir / "backfill").exists()
+
+
+def test_backfill_from_the_charm_container(context, state, tsdb_dir, tmp_path_factory):
+    # GIVEN an OpenMetrics file in the charm container
+    local = tmp_path_factory.mktemp("charm") / "metrics.om"
+    local.write_text("# EOF\n")
+
+    # WHEN it is backfilled
+    params = {"path": str(local), "location": "charm"}
+    with _create_blocks(tsdb_dir) as create_blocks:
+        context.run(context.on.action("backfill", params=params), state)
+
+    # THEN it is copied into the workload container first
+    create_blocks.assert_called_once_with(
+        f"{BACKFILL_DIR}/input.om", f"{BACKFILL_DIR}/blocks", "2h"
+    )
+    assert context.action_results is not None
+    assert context.action_results["count"] == 2
+    assert not (tsdb_dir / "backfill").exists()
+
+
+@pytest.mark.parametrize(
+    "params, message",
+    [
+        ({"path": f"{TSDB_DIR}/missing.om"}, "No such file"),
+        ({"path": f"{TSDB_DIR}/metrics.om", "max-block-duration": "1 day"}, "Invalid"),
+    ],
+)
+def test_backfill_fails_on_invalid_params(context, state, tsdb_dir, params, message):
+    # WHEN the file is missing, or the block duration invalid
+    # THEN the action fails without creating blocks
+    with _create_blocks(tsdb_dir) as create_blocks:
+        with pytest.raises(ActionFailed, match=message):
+            context.run(context.on.action("backfill", params=params), state)
+    create_blocks.assert_not_called()
+
+
+def test_backfill_fails_if_promtool_fails(context, state, tsdb_dir):
+    # WHEN promtool cannot parse the file
+    error = ExecError(["/usr/bin/promtool"], 1, "", "expected a valid start token")
+    with patch.object(PrometheusCharm, "_create_blocks", side_effect=error):
+        # THEN the action fails with the error
+        with pytest.raises(ActionFailed, match="expected a valid start token"):
+            context.run(
+                context.on.action("backfill", params={"path": f"{TSDB_DIR}/metrics.om"}), state
+            )
+
+    # AND nothing is moved, and the staging directory is removed
+    assert not _moves(context)
+    assert not (tsdb_dir / "backfill").exists()
@@ -139,6 +139,18 @@ class TestCharm(unittest.TestCase):
             "--storage.tsdb.wal-compression",
         )
 
+    def test_remote_write_receiver_accepts_v1_and_v2_messages(self):
+        plan = self.harness.get_container_pebble_plan("prometheus")
+        args = plan.to_dict()["services"]["prometheus"]["command"].split()
+        self.assertIn("--web.enable-remote-write-receiver", args)
+        self.assertIn(
+            "--web.remote-write-receiver.accepted-protobuf-messages=prometheus.WriteRequest", args
+        )
+        self.assertIn(
+            "--web.remote-write-receiver.accepted-protobuf-messages=io.prometheus.write.v2.Request",
+            args,
+        )
+
     @k8s_resource_multipatch
     @patch("lightkube.core.client.GenericSyncClient")
     def test_valid_metrics_retention_times_can_be_set(self, *unused):
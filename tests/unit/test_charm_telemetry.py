@@ -0,0 +1,202 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import struct
+import subprocess
+from typing import Dict, List, Tuple
+from unittest.mock import patch
+
+from scenario import State
+
+from charm import PrometheusCharm
+from charm_telemetry import CharmTelemetry, cos_tool_spawns, snappy_compress
+
+
+def _varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, pos
+
+
+def _fields(data: bytes) -> List[Tuple[int, object]]:
+    """Decode the (field number, value) pairs of a protobuf message."""
+    fields, pos = [], 0
+    while pos < len(data):
+        key, pos = _varint(data, pos)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = _varint(data, pos)
+        elif wire_type == 1:
+            value, pos = struct.unpack("<d", data[pos : pos + 8])[0], pos + 8
+        else:
+            length, pos = _varint(data, pos)
+            value, pos = data[pos : pos + length], pos + length
+        fields.append((field, value))
+    return fields
+
+
+def _snappy_decompress(data: bytes) -> bytes:
+    """Decode a snappy block made of literals only."""
+    length, pos = _varint(data, 0)
+    out = b""
+    while pos < len(data):
+        tag = data[pos]
+        assert tag & 3 == 0, "not a literal"
+        if tag >> 2 < 60:
+            size, pos = (tag >> 2) + 1, pos + 1
+        else:
+            extra = (tag >> 2) - 59
+            size = int.from_bytes(data[pos + 1 : pos + 1 + extra], "little") + 1
+            pos += 1 + extra
+        out, pos = out + data[pos : pos + size], pos + size
+    assert len(out) == length
+    return out
+
+
+def _decode_write_request(body: bytes) -> List[Tuple[Dict[str, str], float, int]]:
+    series = []
+    for _, timeseries in _fields(_snappy_decompress(body)):
+        labels, samples = {}, []
+        for field, value in _fields(timeseries):  # pyright: ignore
+            if field == 1:
+                name, label_value = (v.decode() for _, v in _fields(value))  # pyright: ignore
+                labels[name] = label_value
+            else:
+                samples.append(tuple(v for _, v in _fields(value)))  # pyright: ignore
+        ((sample_value, timestamp),) = samples
+        series.append((labels, sample_value, timestamp))
+    return series
+
+
+def test_snappy_compress_frames_large_payloads_in_literals():
+    data = bytes(range(256)) * 1000
+    assert _snappy_decompress(snappy_compress(data)) == data
+    assert _snappy_decompress(snappy_compress(b"")) == b""
+
+
+def test_write_request_has_a_series_per_sample():
+    # GIVEN a gauge, a timed block and a counter
+    telemetry = CharmTelemetry({"juju_unit": "prometheus/0"})
+    telemetry.set("charm_scrape_jobs", 3)
+    with telemetry.time("charm_configure_phase_duration_seconds", phase="render"):
+        pass
+    telemetry.inc("charm_pebble_pushes_total", 2)
+
+    # WHEN the counters are added to the totals of previous dispatches
+    totals = {"charm_pebble_pushes_total": 5.0}
+    telemetry.add_counters(totals)
+
+    # THEN the totals are updated
+    assert totals == {"charm_pebble_pushes_total": 7.0}
+
+    # AND the write request has all the samples, with the common labels
+    series = _decode_write_request(telemetry.write_request(1700000000000))
+    assert [labels for labels, _, _ in series] == [
+        {"__name__": "charm_scrape_jobs", "juju_unit": "prometheus/0"},
+        {
+            "__name__": "charm_configure_phase_duration_seconds",
+            "juju_unit": "prometheus/0",
+            "phase": "render",
+        },
+        {"__name__": "charm_pebble_pushes_total", "juju_unit": "prometheus/0"},
+    ]
+    assert [value for _, value, _ in series][::2] == [3.0, 7.0]
+    assert {timestamp for _, _, timestamp in series} == {1700000000000}
+
+
+def test_a_series_has_a_single_sample_per_dispatch():
+    # GIVEN a phase timed twice in a dispatch
+    telemetry = CharmTelemetry({"juju_unit": "prometheus/0"})
+    telemetry.set("charm_configure_phase_duration_seconds", 1, phase="render")
+    telemetry.set("charm_configure_phase_duration_seconds", 2, phase="render")
+    telemetry.set("charm_configure_phase_duration_seconds", 3, phase="reload")
+
+    # THEN the write request only has the last value of each series
+    series = _decode_write_request(telemetry.write_request(1700000000000))
+    assert [(labels["phase"], value) for labels, value, _ in series] == [
+        ("render", 2.0),
+        ("reload", 3.0),
+    ]
+
+
+def test_cos_tool_spawns_are_counted(tmp_path):
+    # GIVEN a cos-tool binary
+    cos_tool = tmp_path / "cos-tool-amd64"
+    cos_tool.write_text("#!/bin/sh\n")
+    cos_tool.chmod(0o755)
+    before = cos_tool_spawns()
+
+    # WHEN cos-tool and another process are run
+    subprocess.run([str(cos_tool), "transform"], check=True)
+    subprocess.run(["true"], check=True)
+
+    # THEN only cos-tool is counted
+    assert cos_tool_spawns() == before + 1
+
+
+def test_push_verifies_the_endpoint_with_the_given_ca():
+    telemetry = CharmTelemetry({"juju_unit": "prometheus/0"})
+    telemetry.set("charm_scrape_jobs", 3)
+
+    with patch("requests.post") as post:
+        post.return_value.status_code = 204
+        assert telemetry.push("https://prometheus:9090/api/v1/write", "/ca.crt")
+        assert telemetry.push("http://prometheus:9090/api/v1/write")
+
+    assert [call.kwargs["verify"] for call in post.call_args_list] == ["/ca.crt", True]
+
+
+def test_charm_telemetry_is_disabled_by_default(context, prometheus_container):
+    with (
+        patch.object(PrometheusCharm, "_get_pvc_capacity", return_value="1Gi"),
+        patch("charm_telemetry.CharmTelemetry.push") as push,
+        patch("charm.cos_tool_spawns") as spawns,
+    ):
+        context.run(context.on.update_status(), State(containers={prometheus_container}))
+
+    # THEN nothing is pushed, and the cos-tool spawns are not counted
+    push.assert_not_called()
+    spawns.assert_not_called()
+
+
+def test_charm_pushes_its_telemetry_at_the_end_of_each_dispatch(context, prometheus_container):
+    with (
+        patch.object(PrometheusCharm, "_get_pvc_capacity", return_value="1Gi"),
+        patch("charm_telemetry.CharmTelemetry.push") as push,
+    ):
+        # WHEN the charm handles two hooks, with its telemetry enabled
+        state = State(
+            containers={prometheus_container},
+            leader=True,
+            config={"enable_charm_telemetry": True},
+        )
+        with context(context.on.config_changed(), state) as manager:
+            state = manager.run()
+            first = dict(manager.charm._stored.telemetry_counters)
+            samples = {name for name, _ in manager.charm._telemetry._samples}
+        with context(context.on.update_status(), state) as manager:
+            manager.run()
+            second = dict(manager.charm._stored.telemetry_counters)
+
+    # THEN the telemetry is pushed to the remote-write endpoint of the workload each time
+    assert push.call_count == 2
+    assert push.call_args.args[0].endswith(":9090/api/v1/write")
+
+    # AND it includes the dispatch duration, the configuration size and the counters
+    assert {
+        "charm_dispatch_duration_seconds",
+        "charm_configure_phase_duration_seconds",
+        "charm_config_bytes",
+        "charm_scrape_jobs",
+        "charm_alert_rules",
+        "charm_pebble_pushes_total",
+    } <= samples
+
+    # AND counters accumulate across dispatches
+    assert first["charm_pebble_pushes_total"] > 0
+    assert second["charm_pebble_pushes_total"] >= first["charm_pebble_pushes_total"]
@@ -0,0 +1,31 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+from unittest.mock import patch
+
+from scenario import State
+
+from charm import PrometheusCharm
+
+
+def test_configure_phases_are_traced(context, prometheus_container):
+    # WHEN the charm reconfigures Prometheus
+    with patch.object(PrometheusCharm, "_get_pvc_capacity", return_value="1Gi"):
+        context.run(
+            context.on.config_changed(), State(containers={prometheus_container}, leader=True)
+        )
+
+    spans = {span.name: span for span in context.trace_data}
+
+    # THEN each phase has its own span
+    for phase in ["relations", "render", "layer", "promtool", "replan"]:
+        assert f"configure: {phase}" in spans
+
+    # AND the phases are broken down further, with counts attached
+    assert spans["metrics_consumer.jobs"].attributes["jobs"] == 0
+    assert spans["render prometheus.yml"].attributes["bytes"] > 0
+    assert spans["configure: render"].attributes["alert_rules"] >= 0
+    assert spans["pebble push"].attributes["path"]
+    assert spans["metrics_consumer.jobs"].parent.span_id == (
+        spans["configure: render"].context.span_id
+    )
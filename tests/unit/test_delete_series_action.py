@@ -0,0 +1,100 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+from unittest.mock import patch
+
+import pytest
+from scenario import ActionFailed, State
+
+MATCH = ['{__name__=~"http_requests_.*", job="app"}']
+
+
+@pytest.fixture
+def state(prometheus_container):
+    return State(containers={prometheus_container}, config={"enable_admin_api": True})
+
+
+@pytest.fixture
+def admin_api():
+    with (
+        patch(
+            "prometheus_client.Prometheus.series_count", return_value=(42, False)
+        ) as series_count,
+        patch("prometheus_client.Prometheus.delete_series", return_value=True) as delete_series,
+        patch(
+            "prometheus_client.Prometheus.clean_tombstones", return_value=True
+        ) as clean_tombstones,
+    ):
+        yield series_count, delete_series, clean_tombstones
+
+
+def test_delete_series_is_a_dry_run_by_default(context, state, admin_api):
+    series_count, delete_series, clean_tombstones = admin_api
+
+    # WHEN series deletion is requested
+    context.run(context.on.action("delete-series", params={"match": MATCH}), state)
+
+    # THEN the matching series are counted
+    assert context.action_results == {"series": 42, "truncated": False, "deleted": False}
+    series_count.assert_called_once_with(MATCH, None, None, 10000)
+    # AND nothing is deleted
+    delete_series.assert_not_called()
+    clean_tombstones.assert_not_called()
+
+
+def test_delete_series(context, state, admin_api):
+    series_count, delete_series, clean_tombstones = admin_api
+
+    # WHEN series deletion is requested over a time range, for real
+    params = {"match": MATCH, "start": "1700000000", "end": "1700003600", "dry-run": False}
+    context.run(context.on.action("delete-series", params=params), state)
+
+    # THEN the series of the time range are counted
+    series_count.assert_called_once_with(MATCH, "1700000000", "1700003600", 10000)
+    # AND deleted, and their data removed from disk
+    assert context.action_results == {"series": 42, "truncated": False, "deleted": True}
+    delete_series.assert_called_once_with(MATCH, "1700000000", "1700003600")
+    clean_tombstones.assert_called_once()
+
+
+def test_delete_series_without_cleaning_tombstones(context, state, admin_api):
+    _, delete_series, clean_tombstones = admin_api
+
+    # WHEN series deletion is requested, leaving the data to compactions
+    params = {"match": MATCH, "dry-run": False, "clean-tombstones": False}
+    context.run(context.on.action("delete-series", params=params), state)
+
+    # THEN the tombstones are not cleaned
+    delete_series.assert_called_once()
+    clean_tombstones.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "action, params",
+    [("delete-series", {"match": MATCH, "dry-run": False}), ("clean-tombstones", {})],
+)
+def test_admin_actions_require_the_admin_api(
+    context, prometheus_container, admin_api, action, params
+):
+    # GIVEN the admin API is not explicitly enabled
+    state = State(containers={prometheus_container})
+
+    # WHEN an admin action is requested
+    # THEN it fails without touching the TSDB
+    with pytest.raises(ActionFailed, match="enable_admin_api"):
+        context.run(context.on.action(action, params=params), state)
+    for method in admin_api:
+        method.assert_not_called()
+
+
+def test_delete_series_fails_if_series_lookup_fails(context, state, admin_api):
+    series_count, delete_series, _ = admin_api
+    series_count.return_value = None
+
+    # WHEN the matching series cannot be counted
+    # THEN the action fails, without deleting anything
+    with pytest.raises(ActionFailed):
+        context.run(
+            context.on.action("delete-series", params={"match": MATCH, "dry-run": False}), state
+        )
+    delete_series.assert_not_called()
@@ -7,10 +7,14 @@ import unittest
 import uuid
 from string import Template
 from typing import Optional
+from unittest.mock import PropertyMock, patch
 
 from charms.prometheus_k8s.v0.prometheus_scrape import (
     ALLOWED_KEYS,
+    PAYLOAD_ENCODING,
+    CosTool,
     MetricsEndpointConsumer,
+    _encode_payload,
 )
 from helpers import PROJECT_DIR
 from ops.charm import CharmBase
@@ -476,6 +480,167 @@ class TestEndpointConsumer(unittest.TestCase):
         self.assertIn(identifier, alerts.keys())
         self.assertEqual(UNLABELED_ALERT_RULES, alerts[identifier])
 
+    def test_consumer_only_reprocesses_changed_relations(self):
+        rel_ids = self.setup_charm_relations(multi=True)
+        consumer = self.harness.charm.prometheus_consumer
+        jobs = consumer.jobs()
+
+        with patch.object(
+            MetricsEndpointConsumer,
+            "_static_scrape_config",
+            autospec=True,
+            side_effect=MetricsEndpointConsumer._static_scrape_config,
+        ) as static_scrape_config:
+            # WHEN nothing changed
+            # THEN the cached jobs are returned without re-processing any relation
+            self.assertEqual(consumer.jobs(), jobs)
+            static_scrape_config.assert_not_called()
+
+            # WHEN a unit address changes in one relation
+            self.harness.update_relation_data(
+                rel_ids[0], "consumer/0", {"prometheus_scrape_unit_address": "3.3.3.3"}
+            )
+            new_jobs = consumer.jobs()
+
+            # THEN only that relation is re-processed
+            self.assertEqual(static_scrape_config.call_count, 1)
+            self.assertIn("3.3.3.3:", json.dumps(new_jobs))
+            self.assertEqual(len(new_jobs), len(jobs))
+
+    def test_consumer_reprocesses_all_relations_when_cos_tool_changes(self):
+        self.setup_charm_relations(multi=True)
+        consumer = self.harness.charm.prometheus_consumer
+        jobs = consumer.jobs()
+
+        # WHEN the cos-tool binary is replaced, e.g. by a charm upgrade
+        with (
+            patch.object(
+                CosTool, "fingerprint", new_callable=PropertyMock, return_value="cos-tool:2:2"
+            ),
+            patch.object(
+                MetricsEndpointConsumer,
+                "_static_scrape_config",
+                autospec=True,
+                side_effect=MetricsEndpointConsumer._static_scrape_config,
+            ) as static_scrape_config,
+        ):
+            # THEN every relation is re-processed
+            self.assertEqual(consumer.jobs(), jobs)
+            self.assertEqual(static_scrape_config.call_count, 2)
+
+    def test_consumer_cache_drops_removed_relations(self):
+        rel_ids = self.setup_charm_relations(multi=True)
+        consumer = self.harness.charm.prometheus_consumer
+        self.assertEqual(len(consumer.jobs()), 4)
+
+        self.harness.remove_relation(rel_ids[1])
+
+        self.assertEqual(len(consumer.jobs()), 3)
+        self.assertEqual(set(consumer._stored.scrape_jobs_cache.keys()), {str(rel_ids[0])})
+
+    def test_consumer_only_reprocesses_changed_alert_rules(self):
+        rel_ids = []
+        for app in ("consumer", "other-consumer"):
+            rel_id = self.harness.add_relation(RELATION_NAME, app)
+            self.harness.update_relation_data(
+                rel_id,
+                app,
+                {
+                    "scrape_metadata": json.dumps({**SCRAPE_METADATA, "application": app}),
+                    "alert_rules": json.dumps(UNLABELED_ALERT_RULES),
+                },
+            )
+            self.harness.add_relation_unit(rel_id, f"{app}/0")
+            rel_ids.append(rel_id)
+        consumer = self.harness.charm.prometheus_consumer
+        alerts = consumer.alerts
+
+        with patch.object(
+            MetricsEndpointConsumer,
+            "_inject_alert_expr_labels",
+            autospec=True,
+            side_effect=MetricsEndpointConsumer._inject_alert_expr_labels,
+        ) as inject_alert_expr_labels:
+            # WHEN nothing changed
+            # THEN the cached rules are returned without re-processing any relation
+            self.assertEqual(consumer.alerts, alerts)
+            inject_alert_expr_labels.assert_not_called()
+
+            # WHEN the alert rules of one relation change
+            self.harness.update_relation_data(
+                rel_ids[0], "consumer", {"alert_rules": json.dumps(ALERT_RULES)}
+            )
+            new_alerts = consumer.alerts
+
+            # THEN only that relation is re-processed
+            self.assertEqual(inject_alert_expr_labels.call_count, 1)
+            self.assertEqual(len(new_alerts), 2)
+            self.assertNotEqual(new_alerts, alerts)
+
+        # AND the rules of removed relations are dropped from the cache
+        self.harness.remove_relation(rel_ids[1])
+        self.assertEqual(len(consumer.alerts), 1)
+        self.assertEqual(set(consumer._stored.alert_rules_cache.keys()), {str(rel_ids[0])})
+
+    def test_consumer_advertises_accepted_encodings(self):
+        self.harness.set_leader(True)
+        rel_id = self.harness.add_relation(RELATION_NAME, "consumer")
+        self.harness.add_relation_unit(rel_id, "consumer/0")
+
+        data = self.harness.get_relation_data(rel_id, self.harness.charm.app.name)
+        self.assertEqual(json.loads(data["accepted_encodings"]), [PAYLOAD_ENCODING])
+
+    def test_consumer_decodes_encoded_payloads(self):
+        # GIVEN a relation with plain JSON payloads
+        rel_id = self.harness.add_relation(RELATION_NAME, "consumer")
+        self.harness.update_relation_data(
+            rel_id,
+            "consumer",
+            {
+                "scrape_metadata": json.dumps(SCRAPE_METADATA),
+                "scrape_jobs": json.dumps(SCRAPE_JOBS),
+                "alert_rules": json.dumps(ALERT_RULES),
+            },
+        )
+        self.harness.add_relation_unit(rel_id, "consumer/0")
+        self.harness.update_relation_data(
+            rel_id, "consumer/0", {"prometheus_scrape_unit_address": "1.1.1.1"}
+        )
+        consumer = self.harness.charm.prometheus_consumer
+        plain_jobs, plain_alerts = consumer.jobs(), consumer.alerts
+
+        # WHEN the provider switches to encoded payloads
+        self.harness.update_relation_data(
+            rel_id,
+            "consumer",
+            {
+                "scrape_jobs": _encode_payload(SCRAPE_JOBS),
+                "alert_rules": _encode_payload(ALERT_RULES),
+            },
+        )
+
+        # THEN the jobs and alert rules are the same
+        self.assertEqual(consumer.jobs(), plain_jobs)
+        self.assertEqual(consumer.alerts, plain_alerts)
+
+    def test_consumer_ignores_unsupported_payload_versions(self):
+        rel_id = self.harness.add_relation(RELATION_NAME, "consumer")
+        envelope = json.loads(_encode_payload(ALERT_RULES))
+        envelope["schema_version"] = 999
+        self.harness.update_relation_data(
+            rel_id,
+            "consumer",
+            {
+                "scrape_metadata": json.dumps(SCRAPE_METADATA),
+                "alert_rules": json.dumps(envelope),
+            },
+        )
+        self.harness.add_relation_unit(rel_id, "consumer/0")
+
+        with self.assertLogs(level="ERROR") as logger:
+            self.assertEqual(self.harness.charm.prometheus_consumer.alerts, {})
+        self.assertIn("Unsupported payload", logger.output[0])  # type: ignore
+
     def test_bad_scrape_job(self):
         self.harness.set_leader(True)
         bad_scrape_jobs = json.dumps(
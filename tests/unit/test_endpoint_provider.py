@@ -15,11 +15,13 @@ from unittest.mock import patch
 import yaml
 from charms.prometheus_k8s.v0.prometheus_scrape import (
     ALLOWED_KEYS,
+    PAYLOAD_ENCODING,
     CosTool,
     MetricsEndpointProvider,
     RelationInterfaceMismatchError,
     RelationNotFoundError,
     RelationRoleMismatchError,
+    _decode_payload,
 )
 from cosl import JujuTopology
 from cosl.rules import AlertRules, generic_alert_groups
@@ -27,6 +29,7 @@ from deepdiff import DeepDiff
 from helpers import PROJECT_DIR, UNITTEST_DIR
 from ops.charm import CharmBase
 from ops.framework import StoredState
+from ops.model import RelationDataContent
 from ops.testing import Harness
 
 RELATION_NAME = "metrics-endpoint"
@@ -133,6 +136,20 @@ class EndpointProviderCharmWithLookaside(CharmBase):
         ]
 
 
+class EndpointProviderCharmWithCompression(CharmBase):
+    _stored = StoredState()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args)
+
+        self.provider = MetricsEndpointProvider(
+            self,
+            jobs=JOBS,
+            alert_rules_path=str(UNITTEST_DIR / "prometheus_alert_rules"),
+            compress_payloads=True,
+        )
+
+
 class TestEndpointProvider(unittest.TestCase):
     def setUp(self):
         self.harness = Harness(EndpointProviderCharm, meta=PROVIDER_META)
@@ -321,6 +338,36 @@ class TestEndpointProvider(unittest.TestCase):
         names = [job["job_name"] for job in jobs]
         self.assertIn("dynamic-job", names)
 
+        # Lookaside jobs do not accumulate over calls
+        harness.charm.provider.set_scrape_job_spec()
+        data = harness.get_relation_data(rel_id, harness.charm.app.name)
+        self.assertEqual(json.loads(data["scrape_jobs"]), jobs)
+
+    def test_unchanged_relation_data_is_not_rewritten(self):
+        self.harness.add_network("10.1.157.116")
+        rel_id = self.harness.add_relation(RELATION_NAME, "provider")
+        self.harness.add_relation_unit(rel_id, "provider/0")
+        self.harness.charm.provider.set_scrape_job_spec()
+
+        with patch.object(RelationDataContent, "__setitem__") as setitem:
+            self.harness.charm.provider.set_scrape_job_spec()
+            self.harness.charm.on.update_status.emit()
+            setitem.assert_not_called()
+
+    def test_unit_address_is_resolved_once_per_bind_address(self):
+        self.harness.add_network("10.1.157.116")
+        rel_ids = [self.harness.add_relation(RELATION_NAME, f"consumer{i}") for i in range(3)]
+
+        with patch("socket.getfqdn", return_value="some.host") as getfqdn:
+            self.harness.charm.provider.set_scrape_job_spec()
+            self.harness.charm.provider._set_unit_ip()
+
+        self.assertEqual(getfqdn.call_count, 1)
+        for rel_id in rel_ids:
+            data = self.harness.get_relation_data(rel_id, self.harness.charm.unit.name)
+            self.assertEqual(data["prometheus_scrape_unit_address"], "10.1.157.116")
+            self.assertEqual(data["prometheus_scrape_unit_fqdn"], "some.host")
+
     @patch("socket.getfqdn", new=lambda *args: "some.host")
     @patch("ops.Network.bind_address", new="not-an-ip")
     def test_provider_unit_sets_fqdn_if_not_address_on_relation_joined(self):
@@ -497,6 +544,61 @@ class TestEndpointProvider(unittest.TestCase):
                 self.assertIn("juju_application", labels)
 
 
+class TestCompressedPayloads(unittest.TestCase):
+    def setUp(self):
+        self.harness = Harness(EndpointProviderCharmWithCompression, meta=PROVIDER_META)
+        self.harness.set_model_name("MyUUID")
+        self.addCleanup(self.harness.cleanup)
+        self.harness.set_leader(True)
+        self.harness.begin()
+
+    def test_plain_json_is_sent_to_consumers_not_accepting_encodings(self):
+        rel_id = self.harness.add_relation(RELATION_NAME, "consumer")
+        self.harness.add_relation_unit(rel_id, "consumer/0")
+        self.harness.charm.provider.set_scrape_job_spec()
+
+        data = self.harness.get_relation_data(rel_id, self.harness.model.app.name)
+        self.assertEqual(len(json.loads(data["scrape_jobs"])), len(JOBS))
+        self.assertIn("groups", json.loads(data["alert_rules"]))
+
+    def test_payloads_are_encoded_for_consumers_accepting_them(self):
+        # GIVEN a plain JSON payload
+        rel_id = self.harness.add_relation(RELATION_NAME, "consumer")
+        self.harness.add_relation_unit(rel_id, "consumer/0")
+        self.harness.charm.provider.set_scrape_job_spec()
+        plain = dict(self.harness.get_relation_data(rel_id, self.harness.model.app.name))
+
+        # WHEN the consumer advertises that it accepts encoded payloads
+        self.harness.update_relation_data(
+            rel_id, "consumer", {"accepted_encodings": json.dumps([PAYLOAD_ENCODING])}
+        )
+
+        # THEN the payloads are re-published, versioned and compressed
+        data = self.harness.get_relation_data(rel_id, self.harness.model.app.name)
+        for key in ("scrape_jobs", "alert_rules"):
+            envelope = json.loads(data[key])
+            self.assertEqual(envelope["schema_version"], 1)
+            self.assertEqual(envelope["encoding"], PAYLOAD_ENCODING)
+            self.assertIn("hash", envelope)
+            # AND they decode to the plain JSON payloads
+            self.assertEqual(_decode_payload(data[key]), json.loads(plain[key]))
+
+    def test_unchanged_payloads_are_decoded_once(self):
+        rel_id = self.harness.add_relation(RELATION_NAME, "consumer")
+        self.harness.update_relation_data(
+            rel_id, "consumer", {"accepted_encodings": json.dumps([PAYLOAD_ENCODING])}
+        )
+        self.harness.add_relation_unit(rel_id, "consumer/0")
+        self.harness.charm.provider.set_scrape_job_spec()
+        data = self.harness.get_relation_data(rel_id, self.harness.model.app.name)
+
+        cache = {}
+        first = _decode_payload(data["alert_rules"], cache)
+        with patch("charms.prometheus_k8s.v0.prometheus_scrape.LZMABase64.decompress") as mock:
+            self.assertEqual(_decode_payload(data["alert_rules"], cache), first)
+            mock.assert_not_called()
+
+
 class CustomizableEndpointProviderCharm(CharmBase):
     _stored = StoredState()
 
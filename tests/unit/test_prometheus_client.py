@@ -1,7 +1,9 @@
 # Copyright 2020 Canonical Ltd.
 # See LICENSE file for licensing details.
 
+import json
 import unittest
+from urllib.parse import parse_qs
 
 import responses
 
@@ -105,3 +107,160 @@ class TestServerPrefix(unittest.TestCase):
         )
 
         self.assertFalse(self.prometheus.reload_configuration())
+
+    @responses.activate
+    def test_prometheus_client_config_reload_successful(self):
+        self.prometheus = Prometheus("http://localhost:9090")
+
+        for success in [True, False]:
+            with self.subTest(success=success):
+                responses.upsert(
+                    responses.GET,
+                    "http://localhost:9090/api/v1/status/runtimeinfo",
+                    json={"status": "success", "data": {"reloadConfigSuccess": success}},
+                    status=200,
+                )
+
+                self.assertIs(self.prometheus.config_reload_successful(), success)
+
+    @responses.activate
+    def test_prometheus_client_config_reload_successful_unknown_on_error(self):
+        self.prometheus = Prometheus("http://localhost:9090")
+
+        responses.add(
+            responses.GET,
+            "http://localhost:9090/api/v1/status/runtimeinfo",
+            status=500,
+        )
+
+        self.assertIsNone(self.prometheus.config_reload_successful())
+
+    @responses.activate
+    def test_prometheus_client_query(self):
+        self.prometheus = Prometheus("http://localhost:9090")
+
+        responses.add(
+            responses.GET,
+            "http://localhost:9090/api/v1/query",
+            json={
+                "status": "success",
+                "data": {
+                    "resultType": "vector",
+                    "result": [{"metric": {}, "value": [1700000000, "4096"]}],
+                },
+            },
+            status=200,
+        )
+
+        self.assertEqual(self.prometheus.query("prometheus_tsdb_storage_blocks_bytes"), 4096.0)
+        self.assertEqual(
+            responses.calls[0].request.params["query"], "prometheus_tsdb_storage_blocks_bytes"
+        )
+
+    @responses.activate
+    def test_prometheus_client_query_empty_result(self):
+        self.prometheus = Prometheus("http://localhost:9090")
+
+        responses.add(
+            responses.GET,
+            "http://localhost:9090/api/v1/query",
+            json={"status": "success", "data": {"resultType": "vector", "result": []}},
+            status=200,
+        )
+
+        self.assertIsNone(self.prometheus.query("absent_metric"))
+
+    @responses.activate
+    def test_prometheus_client_snapshot(self):
+        self.prometheus = Prometheus("http://localhost:9090")
+
+        responses.add(
+            responses.POST,
+            "http://localhost:9090/api/v1/admin/tsdb/snapshot",
+            json={"status": "success", "data": {"name": "20250101T000000Z-2be650b6d019eb54"}},
+            status=200,
+        )
+
+        self.assertEqual(self.prometheus.snapshot(), "20250101T000000Z-2be650b6d019eb54")
+        self.assertEqual(responses.calls[0].request.params["skip_head"], "false")
+
+    @responses.activate
+    def test_prometheus_client_snapshot_fails_if_admin_api_disabled(self):
+        self.prometheus = Prometheus("http://localhost:9090")
+
+        responses.add(
+            responses.POST,
+            "http://localhost:9090/api/v1/admin/tsdb/snapshot",
+            json={"status": "error", "errorType": "unavailable", "error": "admin APIs disabled"},
+            status=503,
+        )
+
+        self.assertIsNone(self.prometheus.snapshot())
+
+    @responses.activate
+    def test_prometheus_client_series_count(self):
+        self.prometheus = Prometheus("http://localhost:9090")
+
+        # Series with samples from the first to the second timestamp
+        series = {
+            "stopped": ({"__name__": "up", "job": "x"}, 1000, 2000),
+            "running": ({"__name__": "up", "job": "y"}, 1000, 9000),
+            # Same labels as "running", under another name
+            "renamed": ({"__name__": "down", "job": "y"}, 1000, 9000),
+            "later": ({"__name__": "up", "job": "z"}, 8000, 9000),
+        }
+
+        def _series(request):
+            params = parse_qs(request.body)
+            start, end = float(params["start"][0]), float(params["end"][0])
+            data = [
+                labels for labels, first, last in series.values() if first <= end and last >= start
+            ]
+            limit = int(params["limit"][0])
+            return 200, {}, json.dumps({"status": "success", "data": data[:limit]})
+
+        responses.add_callback(
+            responses.POST, "http://localhost:9090/api/v1/series", callback=_series
+        )
+
+        # The series of the time range are counted, including the one that stopped before its
+        # end, and the ones with the same labels under different names.
+        self.assertEqual(
+            self.prometheus.series_count(["up", "down"], start="1500", end="5000"), (3, False)
+        )
+        params = parse_qs(responses.calls[0].request.body)
+        self.assertEqual(params["match[]"], ["up", "down"])
+        self.assertEqual(params["limit"], ["10001"])
+
+        # Beyond the limit, the count is truncated
+        self.assertEqual(
+            self.prometheus.series_count(["up", "down"], start="1500", end="5000", limit=2),
+            (2, True),
+        )
+
+    @responses.activate
+    def test_prometheus_client_delete_series_and_clean_tombstones(self):
+        self.prometheus = Prometheus("http://localhost:9090")
+
+        for endpoint in ["delete_series", "clean_tombstones"]:
+            responses.add(
+                responses.POST,
+                f"http://localhost:9090/api/v1/admin/tsdb/{endpoint}",
+                status=204,
+            )
+
+        self.assertTrue(self.prometheus.delete_series(["up"]))
+        self.assertTrue(self.prometheus.clean_tombstones())
+
+    @responses.activate
+    def test_prometheus_client_delete_series_fails_if_admin_api_disabled(self):
+        self.prometheus = Prometheus("http://localhost:9090")
+
+        responses.add(
+            responses.POST,
+            "http://localhost:9090/api/v1/admin/tsdb/delete_series",
+            json={"status": "error", "errorType": "unavailable", "error": "admin APIs disabled"},
+            status=503,
+        )
+
+        self.assertFalse(self.prometheus.delete_series(["up"]))
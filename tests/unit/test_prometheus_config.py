@@ -492,6 +492,238 @@ class TestWildcardExpansionWithPathPrefix(unittest.TestCase):
         )
 
 
+class TestCompactWildcardExpansion(unittest.TestCase):
+    """Similar to `TestWildcardExpansionWithTopology`, but with a single job for all units."""
+
+    def setUp(self):
+        self.topology = JujuTopology(
+            model="model",
+            model_uuid="ac2bcddf-4c37-42d4-8ac6-5e7f922c2437",
+            application="app",
+            charm_name="charm",
+        )
+
+    def test_mixed_targets_with_topology(self):
+        # GIVEN scrape_configs with mixed target types in the same list
+        jobs = jobs_factory(["*", "1.1.1.1"])
+        hosts = {
+            "unit/0": ("10.10.10.10", "", ""),
+            "unit/1": ("11.11.11.11", "", ""),
+        }
+
+        # WHEN the jobs are processed in compact mode
+        expanded = PrometheusConfig.expand_wildcard_targets_into_individual_jobs(
+            jobs, hosts, self.topology, compact=True
+        )
+
+        # THEN there is a single job with a static config per unit and the unmatched targets
+        # AND the instance label includes the unit only for the unit targets
+        self.assertEqual(
+            expanded,
+            [
+                {
+                    "job_name": "job",
+                    "metrics_path": "/metrics",
+                    "static_configs": [
+                        {
+                            "targets": ["10.10.10.10"],
+                            "labels": {**self.topology.label_matcher_dict, "juju_unit": "unit/0"},
+                        },
+                        {
+                            "targets": ["11.11.11.11"],
+                            "labels": {**self.topology.label_matcher_dict, "juju_unit": "unit/1"},
+                        },
+                        {
+                            "targets": ["1.1.1.1"],
+                            "labels": self.topology.label_matcher_dict,
+                        },
+                    ],
+                    "relabel_configs": [
+                        PrometheusConfig.topology_relabel_config,
+                        PrometheusConfig.topology_relabel_config_unit_only,
+                    ],
+                },
+            ],
+        )
+
+    def test_wildcard_targets_only(self):
+        # GIVEN scrape_configs with a wildcard target only
+        hosts = {
+            "unit/0": ("10.10.10.10", "", ""),
+            "unit/1": ("11.11.11.11", "", ""),
+        }
+
+        # WHEN the jobs are processed in compact mode
+        expanded = PrometheusConfig.expand_wildcard_targets_into_individual_jobs(
+            jobs_factory(["*:9100"]), hosts, self.topology, compact=True
+        )
+
+        # THEN the single job uses the same instance relabeling as per-unit jobs
+        self.assertEqual(len(expanded), 1)
+        self.assertEqual(
+            [static_config["targets"] for static_config in expanded[0]["static_configs"]],
+            [["10.10.10.10:9100"], ["11.11.11.11:9100"]],
+        )
+        self.assertEqual(
+            expanded[0]["relabel_configs"], [PrometheusConfig.topology_relabel_config_wildcard]
+        )
+
+    def test_unit_path_prefix_is_set_per_static_config(self):
+        # GIVEN scrape_configs with a custom metrics path and a per-unit path prefix
+        jobs = [
+            {
+                "job_name": "job",
+                "metrics_path": "/custom/path",
+                "static_configs": [{"targets": ["*"]}],
+            }
+        ]
+        hosts = {
+            "unit/0": ("10.10.10.10", "/model-unit-0", ""),
+            "unit/1": ("11.11.11.11", "", ""),
+        }
+
+        # WHEN the jobs are processed in compact mode, without topology
+        expanded = PrometheusConfig.expand_wildcard_targets_into_individual_jobs(
+            jobs, hosts, compact=True
+        )
+
+        # THEN the prefixed metrics path is set only for the unit that has one
+        self.assertEqual(
+            expanded,
+            [
+                {
+                    "job_name": "job",
+                    "metrics_path": "/custom/path",
+                    "static_configs": [
+                        {
+                            "targets": ["10.10.10.10"],
+                            "labels": {"__metrics_path__": "/model-unit-0/custom/path"},
+                        },
+                        {"targets": ["11.11.11.11"]},
+                    ],
+                },
+            ],
+        )
+
+
+class TestWildcardExpansionWithKubernetesSD(unittest.TestCase):
+    """Similar to `TestWildcardExpansionWithTopology`, but with Kubernetes service discovery."""
+
+    def setUp(self):
+        self.topology = JujuTopology(
+            model="model",
+            model_uuid="ac2bcddf-4c37-42d4-8ac6-5e7f922c2437",
+            application="app",
+            charm_name="charm",
+        )
+        self.hosts = {
+            "app/0": ("10.10.10.10", "", ""),
+            "app/1": ("11.11.11.11", "", ""),
+        }
+
+    def test_wildcard_targets_discover_the_pods_of_the_application(self):
+        # GIVEN scrape_configs with a wildcard and a fully-qualified target
+        jobs = [
+            {
+                "job_name": "job",
+                "static_configs": [{"targets": ["*:9100", "1.1.1.1"], "labels": {"a": "b"}}],
+            }
+        ]
+
+        # WHEN the jobs are processed with Kubernetes service discovery
+        expanded = PrometheusConfig.expand_wildcard_targets_into_individual_jobs(
+            jobs, self.hosts, self.topology, "kubernetes"
+        )
+
+        # THEN the wildcard target is a single job discovering the pods of the application
+        # AND the fully-qualified target is kept as is
+        self.assertEqual(len(expanded), 2)
+        sd_job, static_job = expanded
+        self.assertEqual(sd_job["job_name"], "job")
+        self.assertEqual(sd_job["metrics_path"], "/metrics")
+        self.assertNotIn("static_configs", sd_job)
+        self.assertEqual(
+            sd_job["kubernetes_sd_configs"],
+            [
+                {
+                    "role": "pod",
+                    "namespaces": {"names": ["model"]},
+                    "selectors": [{"role": "pod", "label": "app.kubernetes.io/name=app"}],
+                }
+            ],
+        )
+        self.assertEqual(static_job["static_configs"][0]["targets"], ["1.1.1.1"])
+
+        # AND the relabeling reproduces the address, juju_unit, topology and instance labels
+        relabel_configs = sd_job["relabel_configs"]
+        self.assertIn(
+            {
+                "source_labels": ["__meta_kubernetes_pod_ip"],
+                "regex": "([^:]+)",
+                "target_label": "__address__",
+                "replacement": "$1:9100",
+            },
+            relabel_configs,
+        )
+        self.assertIn(
+            {
+                "source_labels": ["__meta_kubernetes_pod_name"],
+                "regex": "(.*)-([0-9]+)",
+                "target_label": "juju_unit",
+                "replacement": "$1/$2",
+            },
+            relabel_configs,
+        )
+        for name, value in {**self.topology.label_matcher_dict, "a": "b"}.items():
+            self.assertIn({"target_label": name, "replacement": value}, relabel_configs)
+        self.assertEqual(relabel_configs[-1], PrometheusConfig.topology_relabel_config_wildcard)
+
+        # AND only running and ready pods are scraped, before any relabeling
+        keep = [relabel for relabel in relabel_configs if relabel.get("action") == "keep"]
+        self.assertEqual(relabel_configs[: len(keep)], keep)
+        self.assertIn(
+            {
+                "source_labels": ["__meta_kubernetes_pod_phase"],
+                "regex": "Running",
+                "action": "keep",
+            },
+            keep,
+        )
+        self.assertIn(
+            {"source_labels": ["__meta_kubernetes_pod_ready"], "regex": "true", "action": "keep"},
+            keep,
+        )
+
+    def test_multiple_wildcard_targets_get_a_job_each(self):
+        # GIVEN scrape_configs with two wildcard targets, one without port
+        jobs = jobs_factory(["*", "*:8080"])
+
+        # WHEN the jobs are processed with Kubernetes service discovery
+        expanded = PrometheusConfig.expand_wildcard_targets_into_individual_jobs(
+            jobs, self.hosts, self.topology, "kubernetes"
+        )
+
+        # THEN there is a job per target, told apart by its port
+        self.assertEqual([job["job_name"] for job in expanded], ["job-80", "job-8080"])
+        self.assertIn(
+            "$1:80", [relabel.get("replacement") for relabel in expanded[0]["relabel_configs"]]
+        )
+
+    def test_units_behind_ingress_are_expanded_into_per_unit_jobs(self):
+        # GIVEN units that are only reachable through a path prefix
+        hosts = {"app/0": ("10.10.10.10", "/model-app-0", "")}
+
+        # WHEN the jobs are processed with Kubernetes service discovery
+        expanded = PrometheusConfig.expand_wildcard_targets_into_individual_jobs(
+            jobs_factory(["*"]), hosts, self.topology, "kubernetes"
+        )
+
+        # THEN the wildcard targets are still resolved from the relation data
+        self.assertEqual(expanded[0]["job_name"], "job-0")
+        self.assertEqual(expanded[0]["static_configs"][0]["targets"], ["10.10.10.10"])
+        self.assertEqual(expanded[0]["metrics_path"], "/model-app-0/metrics")
+
+
 class TestAlertmanagerStaticConfigs(unittest.TestCase):
     def test_ip_address_only(self):
         # GIVEN a hostname only
@@ -0,0 +1,175 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import dataclasses
+from unittest.mock import patch
+
+import pytest
+from scenario import Container, Context, Exec, Relation, State
+
+from charm import PrometheusCharm
+
+
+@pytest.fixture
+def container():
+    return Container(
+        "prometheus",
+        can_connect=True,
+        execs={Exec(["update-ca-certificates", "--fresh"], return_code=0, stdout="")},
+    )
+
+
+@pytest.fixture
+def reconciles():
+    """Count the reconciles (config renders) done by the charm."""
+    original = PrometheusCharm._generate_prometheus_config
+    # An active unit, so that update-status only reconciles when there is something pending
+    with (
+        patch.object(PrometheusCharm, "_get_pvc_capacity", return_value="1Gi"),
+        patch.object(
+            PrometheusCharm, "_generate_prometheus_config", autospec=True, side_effect=original
+        ) as mock,
+    ):
+        yield mock
+
+
+def _run(context, event_factory, state, now):
+    with patch("charm.time.time", return_value=now):
+        return context.run(event_factory(), state)
+
+
+def _pending_since(state):
+    stored = state.get_stored_state("_stored", owner_path="PrometheusCharm")
+    return stored.content["reconcile_pending_since"]
+
+
+def test_relation_changes_are_applied_right_away_by_default(
+    context: Context, container, reconciles
+):
+    relation = Relation("metrics-endpoint")
+    state = State(leader=True, containers=[container], relations=[relation])
+
+    for now in (1000, 1001, 1002):
+        state = _run(
+            context,
+            lambda: context.on.relation_changed(state.get_relation(relation.id)),
+            state,
+            now,
+        )
+
+    assert reconciles.call_count == 3
+
+
+def test_relation_change_bursts_are_coalesced(context: Context, container, reconciles):
+    # GIVEN debouncing enabled
+    relation = Relation("metrics-endpoint")
+    state = State(
+        leader=True,
+        containers=[container],
+        relations=[relation],
+        config={"reconcile_debounce_window": 60},
+    )
+
+    # WHEN a burst of relation changes happens
+    for now in (1000, 1010, 1020, 1030):
+        state = _run(
+            context,
+            lambda: context.on.relation_changed(state.get_relation(relation.id)),
+            state,
+            now,
+        )
+
+    # THEN only the first one is applied right away
+    assert reconciles.call_count == 1
+
+    # AND WHEN update-status fires
+    state = _run(context, context.on.update_status, state, 1040)
+
+    # THEN the rest of the burst is applied at once
+    assert reconciles.call_count == 2
+
+    # AND there is nothing left to reconcile on the next update-status
+    state = _run(context, context.on.update_status, state, 1340)
+    assert reconciles.call_count == 2
+
+    # AND a relation change after a quiet window is applied right away
+    state = _run(
+        context, lambda: context.on.relation_changed(state.get_relation(relation.id)), state, 1400
+    )
+    assert reconciles.call_count == 3
+
+
+def test_reconcile_staleness_is_bounded(context: Context, container, reconciles):
+    # GIVEN debouncing enabled
+    relation = Relation("metrics-endpoint")
+    state = State(
+        leader=True,
+        containers=[container],
+        relations=[relation],
+        config={"reconcile_debounce_window": 60, "reconcile_max_staleness": 100},
+    )
+
+    # WHEN relation changes keep coming without a quiet window
+    for now in range(1000, 1160, 20):
+        state = _run(
+            context,
+            lambda: context.on.relation_changed(state.get_relation(relation.id)),
+            state,
+            now,
+        )
+
+    # THEN they are applied at the start of the burst, and after at most `max_staleness`
+    # (the deferred changes since 1020 are applied at 1120)
+    assert reconciles.call_count == 2
+
+    # AND a config change applies pending changes, too
+    state = _run(
+        context,
+        context.on.config_changed,
+        dataclasses.replace(state, config={"reconcile_debounce_window": 60}),
+        1170,
+    )
+    assert reconciles.call_count == 3
+    state = _run(context, context.on.update_status, state, 1180)
+    assert reconciles.call_count == 3
+
+
+def test_pending_reconcile_is_kept_until_it_succeeds(context: Context, container, reconciles):
+    # GIVEN relation changes waiting to be reconciled
+    relation = Relation("metrics-endpoint")
+    state = State(
+        leader=True,
+        containers=[container],
+        relations=[relation],
+        config={"reconcile_debounce_window": 60},
+    )
+    for now in (1000, 1010):
+        state = _run(
+            context,
+            lambda: context.on.relation_changed(state.get_relation(relation.id)),
+            state,
+            now,
+        )
+    assert reconciles.call_count == 1
+
+    # WHEN update-status fires while the workload is unreachable
+    state = _run(
+        context,
+        context.on.update_status,
+        dataclasses.replace(state, containers=[dataclasses.replace(container, can_connect=False)]),
+        1100,
+    )
+
+    # THEN the reconcile is still pending
+    assert reconciles.call_count == 1
+    assert _pending_since(state) == 1010
+
+    # AND it is done on the next update-status
+    state = _run(
+        context,
+        context.on.update_status,
+        dataclasses.replace(state, containers=[container]),
+        1400,
+    )
+    assert reconciles.call_count == 2
+    assert _pending_since(state) is None
@@ -0,0 +1,82 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import json
+import time
+from unittest.mock import patch
+
+import pytest
+from ops.model import ActiveStatus, BlockedStatus
+from scenario import State
+
+from charm import RELOAD_HISTORY_SIZE, PrometheusCharm
+
+
+@pytest.fixture
+def running_state(context, prometheus_container):
+    """A state in which Prometheus is running, so that the next reconcile reloads it."""
+    with patch.object(PrometheusCharm, "_get_pvc_capacity", return_value="1Gi"):
+        state = State(containers={prometheus_container}, leader=True)
+        yield context.run(context.on.config_changed(), state)
+
+
+def _reload(context, state, reload_successful, verification_seconds=0.0):
+    def _config_reload_successful():
+        time.sleep(verification_seconds)
+        return reload_successful
+
+    with (
+        patch.object(PrometheusCharm, "_get_pvc_capacity", return_value="1Gi"),
+        patch("prometheus_client.Prometheus.reload_configuration", return_value=True),
+        patch(
+            "prometheus_client.Prometheus.config_reload_successful",
+            side_effect=_config_reload_successful,
+        ),
+    ):
+        return context.run(context.on.config_changed(), state)
+
+
+def _reload_history(context, state):
+    context.run(context.on.action("validate-configuration"), state)
+    assert context.action_results is not None
+    return json.loads(context.action_results["reload-history"])
+
+
+@pytest.mark.parametrize("reload_successful", [True, None])
+def test_reload_is_recorded(context, running_state, reload_successful):
+    # WHEN the configuration is reloaded, and Prometheus confirms it (or cannot tell)
+    state = _reload(context, running_state, reload_successful)
+
+    # THEN the unit is active
+    assert isinstance(state.unit_status, ActiveStatus)
+
+    # AND the reload is in the history, along with the size of the configuration
+    (entry,) = _reload_history(context, state)
+    assert entry["result"] == "success"
+    assert entry["duration-seconds"] >= 0
+    assert entry["config-bytes"] > 0
+    assert entry["scrape-jobs"] == 1
+
+
+def test_unit_is_blocked_if_prometheus_reports_a_failed_reload(context, running_state):
+    # WHEN the reload request succeeds, but Prometheus reports the reload as failed
+    state = _reload(context, running_state, False, verification_seconds=0.2)
+
+    # THEN the unit is blocked
+    assert isinstance(state.unit_status, BlockedStatus)
+
+    # AND the failed reload is in the history, with the duration of the reload request only,
+    # like successful ones
+    (entry,) = _reload_history(context, state)
+    assert entry["result"] == "failed"
+    assert entry["duration-seconds"] < 0.2
+
+
+def test_reload_history_is_bounded(context, running_state):
+    # WHEN the configuration is reloaded more times than the history keeps
+    state = running_state
+    for _ in range(RELOAD_HISTORY_SIZE + 2):
+        state = _reload(context, state, True)
+
+    # THEN only the most recent reloads are kept
+    assert len(_reload_history(context, state)) == RELOAD_HISTORY_SIZE
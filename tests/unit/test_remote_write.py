@@ -9,10 +9,15 @@ from charms.prometheus_k8s.v1.prometheus_remote_write import (
     DEFAULT_RELATION_NAME as RELATION_NAME,
 )
 from charms.prometheus_k8s.v1.prometheus_remote_write import (
-    RELATION_INTERFACE_NAME as RELATION_INTERFACE,
+    PAYLOAD_ENCODING,
+    PROTOBUF_MESSAGE_V1,
+    PROTOBUF_MESSAGE_V2,
+    PrometheusRemoteWriteConsumer,
+    _decode_payload,
+    _encode_payload,
 )
 from charms.prometheus_k8s.v1.prometheus_remote_write import (
-    PrometheusRemoteWriteConsumer,
+    RELATION_INTERFACE_NAME as RELATION_INTERFACE,
 )
 from helpers import (
     UNITTEST_DIR,
@@ -90,7 +95,38 @@ ALERT_RULES = {
 }
 
 
+# Recommended by a Prometheus without resource limits.
+QUEUE_CONFIG = {
+    "capacity": 10000,
+    "min_shards": 1,
+    "max_shards": 50,
+    "max_samples_per_send": 2000,
+    "batch_send_deadline": "5s",
+    "min_backoff": "30ms",
+    "max_backoff": "5s",
+}
+METADATA_CONFIG = {"send": True, "send_interval": "1m", "max_samples_per_send": 500}
+
+
+def remote_write_data(url: str) -> dict:
+    """Relation data published by the Prometheus remote-write receiver."""
+    return {
+        "remote_write": json.dumps(
+            {
+                "url": url,
+                "protobuf_messages": [PROTOBUF_MESSAGE_V1, PROTOBUF_MESSAGE_V2],
+                "compression": "snappy",
+                "queue_config": QUEUE_CONFIG,
+                "metadata_config": METADATA_CONFIG,
+            }
+        )
+    }
+
+
 class RemoteWriteConsumerCharm(CharmBase):
+    protobuf_messages = None
+    compress_payloads = False
+
     @patch_cos_tool_path
     def __init__(self, *args, **kwargs):
         super().__init__(*args)
@@ -99,6 +135,8 @@ class RemoteWriteConsumerCharm(CharmBase):
             RELATION_NAME,
             alert_rules_path=str(UNITTEST_DIR / "prometheus_alert_rules"),
             peer_relation_name="peers",
+            protobuf_messages=self.protobuf_messages,
+            compress_payloads=self.compress_payloads,
         )
         self.framework.observe(
             self.remote_write_consumer.on.endpoints_changed,
@@ -109,6 +147,14 @@ class RemoteWriteConsumerCharm(CharmBase):
         pass
 
 
+class RemoteWriteV2ConsumerCharm(RemoteWriteConsumerCharm):
+    protobuf_messages = [PROTOBUF_MESSAGE_V2, PROTOBUF_MESSAGE_V1]
+
+
+class RemoteWriteCompressingConsumerCharm(RemoteWriteConsumerCharm):
+    compress_payloads = True
+
+
 class TestRemoteWriteConsumer(unittest.TestCase):
     def setUp(self):
         self.harness = Harness(RemoteWriteConsumerCharm, meta=METADATA)
@@ -176,6 +222,40 @@ class TestRemoteWriteConsumer(unittest.TestCase):
         self.harness.update_relation_data(rel_id, "provider/0", {})
         assert list(self.harness.charm.remote_write_consumer.endpoints) == []
 
+    def test_remote_write_v1_is_used_unless_requested(self):
+        rel_id = self.harness.add_relation(RELATION_NAME, "provider")
+        self.harness.add_relation_unit(rel_id, "provider/0")
+        self.harness.update_relation_data(
+            rel_id, "provider/0", remote_write_data("http://1.1.1.1:9090/api/v1/write")
+        )
+        assert list(self.harness.charm.remote_write_consumer.endpoints) == [
+            {
+                "url": "http://1.1.1.1:9090/api/v1/write",
+                "queue_config": QUEUE_CONFIG,
+                "metadata_config": METADATA_CONFIG,
+            }
+        ]
+
+    def test_only_known_recommended_fields_are_returned(self):
+        rel_id = self.harness.add_relation(RELATION_NAME, "provider")
+        self.harness.add_relation_unit(rel_id, "provider/0")
+        self.harness.update_relation_data(
+            rel_id,
+            "provider/0",
+            {
+                "remote_write": json.dumps(
+                    {
+                        "url": "http://1.1.1.1:9090/api/v1/write",
+                        "queue_config": {"max_shards": 5, "url": "http://elsewhere"},
+                        "metadata_config": "not a dict",
+                    }
+                )
+            },
+        )
+        assert list(self.harness.charm.remote_write_consumer.endpoints) == [
+            {"url": "http://1.1.1.1:9090/api/v1/write", "queue_config": {"max_shards": 5}}
+        ]
+
     def test_alert_rule_has_correct_labels(self):
         rel_id = self.harness.add_relation(RELATION_NAME, "provider")
         self.harness.add_relation_unit(rel_id, "provider/0")
@@ -233,6 +313,68 @@ class TestRemoteWriteConsumer(unittest.TestCase):
 
 
 @prom_multipatch
+class TestRemoteWriteV2Consumer(unittest.TestCase):
+    def setUp(self):
+        self.harness = Harness(RemoteWriteV2ConsumerCharm, meta=METADATA)
+        self.addCleanup(self.harness.cleanup)
+        self.harness.set_leader(True)
+        self.harness.set_model_name("test")
+        self.harness.begin_with_initial_hooks()
+
+    def test_remote_write_v2_is_negotiated(self):
+        rel_id = self.harness.add_relation(RELATION_NAME, "provider")
+        self.harness.add_relation_unit(rel_id, "provider/0")
+        self.harness.update_relation_data(
+            rel_id, "provider/0", remote_write_data("http://1.1.1.1:9090/api/v1/write")
+        )
+        assert list(self.harness.charm.remote_write_consumer.endpoints) == [
+            {
+                "url": "http://1.1.1.1:9090/api/v1/write",
+                "protobuf_message": PROTOBUF_MESSAGE_V2,
+                "queue_config": QUEUE_CONFIG,
+                "metadata_config": METADATA_CONFIG,
+            }
+        ]
+
+    def test_remote_write_v1_is_used_with_receivers_not_advertising_v2(self):
+        rel_id = self.harness.add_relation(RELATION_NAME, "provider")
+        self.harness.add_relation_unit(rel_id, "provider/0")
+        self.harness.update_relation_data(
+            rel_id,
+            "provider/0",
+            {"remote_write": json.dumps({"url": "http://1.1.1.1:9090/api/v1/write"})},
+        )
+        assert list(self.harness.charm.remote_write_consumer.endpoints) == [
+            {"url": "http://1.1.1.1:9090/api/v1/write"}
+        ]
+
+
+class TestRemoteWriteCompressingConsumer(unittest.TestCase):
+    def setUp(self):
+        self.harness = Harness(RemoteWriteCompressingConsumerCharm, meta=METADATA)
+        self.addCleanup(self.harness.cleanup)
+        self.harness.set_leader(True)
+        self.harness.set_model_name("test")
+        self.harness.begin_with_initial_hooks()
+
+    def test_alert_rules_are_encoded_for_providers_accepting_them(self):
+        # GIVEN plain JSON alert rules
+        rel_id = self.harness.add_relation(RELATION_NAME, "provider")
+        self.harness.add_relation_unit(rel_id, "provider/0")
+        plain = self.harness.get_relation_data(rel_id, self.harness.charm.app)["alert_rules"]
+        self.assertIn("groups", json.loads(plain))
+
+        # WHEN the provider advertises that it accepts encoded payloads
+        self.harness.update_relation_data(
+            rel_id, "provider", {"accepted_encodings": json.dumps([PAYLOAD_ENCODING])}
+        )
+
+        # THEN the alert rules are re-published, versioned and compressed
+        encoded = self.harness.get_relation_data(rel_id, self.harness.charm.app)["alert_rules"]
+        self.assertEqual(json.loads(encoded)["encoding"], PAYLOAD_ENCODING)
+        self.assertEqual(_decode_payload(encoded), json.loads(plain))
+
+
 class TestRemoteWriteProvider(unittest.TestCase):
     @prom_multipatch
     def setUp(self, *unused):
@@ -258,7 +400,7 @@ class TestRemoteWriteProvider(unittest.TestCase):
         self.harness.add_relation_unit(rel_id, "consumer/0")
         self.assertEqual(
             self.harness.get_relation_data(rel_id, self.harness.charm.unit.name),
-            {"remote_write": json.dumps({"url": "http://fqdn:9090/api/v1/write"})},
+            remote_write_data("http://fqdn:9090/api/v1/write"),
         )
         self.harness.evaluate_status()
         self.assertIsInstance(self.harness.charm.unit.status, ActiveStatus)
@@ -283,6 +425,24 @@ class TestRemoteWriteProvider(unittest.TestCase):
         self.assertEqual(len(alerts), 1)
         self.assertDictEqual(alerts, ALERT_RULES)
 
+    @k8s_resource_multipatch
+    @patch("lightkube.core.client.GenericSyncClient")
+    @patch.object(Prometheus, "reload_configuration", new=lambda _: True)
+    def test_encoded_alert_rules(self, *unused):
+        self.harness.set_leader(True)
+        self.harness.begin_with_initial_hooks()
+
+        rel_id = self.harness.add_relation(RELATION_NAME, "consumer")
+        self.harness.add_relation_unit(rel_id, "consumer/0")
+        data = self.harness.get_relation_data(rel_id, self.harness.charm.app.name)
+        self.assertEqual(json.loads(data["accepted_encodings"]), [PAYLOAD_ENCODING])
+
+        self.harness.update_relation_data(
+            rel_id, "consumer", {"alert_rules": _encode_payload(ALERT_RULES)}
+        )
+        alerts = list(self.harness.charm.remote_write_provider.alerts.values())[0]
+        self.assertDictEqual(alerts, ALERT_RULES)
+
     @k8s_resource_multipatch
     @patch("lightkube.core.client.GenericSyncClient")
     @patch.object(Prometheus, "reload_configuration", new=lambda _: True)
@@ -296,7 +456,7 @@ class TestRemoteWriteProvider(unittest.TestCase):
 
         self.assertEqual(
             self.harness.get_relation_data(rel_id, self.harness.charm.unit.name),
-            {"remote_write": json.dumps({"url": "http://fqdn.before:9090/api/v1/write"})},
+            remote_write_data("http://fqdn.before:9090/api/v1/write"),
         )
 
         with patch("socket.getfqdn", new=lambda *args: "fqdn.after"):
@@ -321,5 +481,5 @@ class TestRemoteWriteProvider(unittest.TestCase):
 
         self.assertEqual(
             self.harness.get_relation_data(rel_id, self.harness.charm.unit.name),
-            {"remote_write": json.dumps({"url": "http://fqdn.after:9090/api/v1/write"})},
+            remote_write_data("http://fqdn.after:9090/api/v1/write"),
         )
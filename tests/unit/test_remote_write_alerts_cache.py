@@ -0,0 +1,107 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import json
+import unittest
+from unittest.mock import PropertyMock, patch
+
+from charms.prometheus_k8s.v1.prometheus_remote_write import (
+    CosTool,
+    PrometheusRemoteWriteProvider,
+)
+from ops.charm import CharmBase
+from ops.testing import Harness
+
+METADATA = """
+name: provider-tester
+provides:
+  receive-remote-write:
+    interface: prometheus_remote_write
+"""
+
+SCRAPE_METADATA = {
+    "model": "lma",
+    "model_uuid": "12de4fae-06cc-4ceb-9089-567be09fec78",
+    "application": "consumer",
+    "charm_name": "consumer-charm",
+}
+
+
+def alert_rules(expr: str) -> dict:
+    return {"groups": [{"name": "consumer_alerts", "rules": [{"alert": "Up", "expr": expr}]}]}
+
+
+class RemoteWriteProviderCharm(CharmBase):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.provider = PrometheusRemoteWriteProvider(self)
+
+
+class TestRemoteWriteProviderAlertsCache(unittest.TestCase):
+    def setUp(self):
+        self.harness = Harness(RemoteWriteProviderCharm, meta=METADATA)
+        self.addCleanup(self.harness.cleanup)
+        self.harness.begin()
+
+        self.rel_ids = []
+        for app in ("consumer", "other"):
+            rel_id = self.harness.add_relation("receive-remote-write", app)
+            self.harness.add_relation_unit(rel_id, f"{app}/0")
+            self.harness.update_relation_data(
+                rel_id,
+                app,
+                {
+                    "alert_rules": json.dumps(alert_rules(f'up{{app="{app}"}} == 0')),
+                    "scrape_metadata": json.dumps({**SCRAPE_METADATA, "application": app}),
+                },
+            )
+            self.rel_ids.append(rel_id)
+
+    def validated_alert_rules(self):
+        return patch.object(
+            PrometheusRemoteWriteProvider,
+            "_validated_alert_rules",
+            autospec=True,
+            side_effect=PrometheusRemoteWriteProvider._validated_alert_rules,
+        )
+
+    def test_unchanged_relations_are_not_reprocessed(self):
+        alerts = self.harness.charm.provider.alerts
+        self.assertEqual(len(alerts), 2)
+
+        # WHEN the alert rules are fetched again, with no relation change
+        with self.validated_alert_rules() as validated_alert_rules:
+            # THEN the cached rules are returned without re-processing any relation
+            self.assertEqual(self.harness.charm.provider.alerts, alerts)
+            validated_alert_rules.assert_not_called()
+
+    def test_changed_alert_rules_are_reprocessed(self):
+        self.harness.charm.provider.alerts
+
+        # WHEN the alert rules of one relation change
+        self.harness.update_relation_data(
+            self.rel_ids[0],
+            "consumer",
+            {"alert_rules": json.dumps(alert_rules('up{app="consumer"} < 1'))},
+        )
+        with self.validated_alert_rules() as validated_alert_rules:
+            alerts = self.harness.charm.provider.alerts
+
+        # THEN only that relation is re-processed
+        self.assertEqual(validated_alert_rules.call_count, 1)
+        self.assertIn(alert_rules('up{app="consumer"} < 1'), alerts.values())
+        self.assertEqual(len(alerts), 2)
+
+    def test_all_relations_are_reprocessed_when_cos_tool_changes(self):
+        alerts = self.harness.charm.provider.alerts
+
+        # WHEN the cos-tool binary is replaced, e.g. by a charm upgrade
+        with (
+            patch.object(
+                CosTool, "fingerprint", new_callable=PropertyMock, return_value="cos-tool:2:2"
+            ),
+            self.validated_alert_rules() as validated_alert_rules,
+        ):
+            # THEN every relation is re-processed
+            self.assertEqual(self.harness.charm.provider.alerts, alerts)
+            self.assertEqual(validated_alert_rules.call_count, 2)
@@ -0,0 +1,72 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import json
+
+import pytest
+from scenario import Container, Context, Exec, Relation, State
+
+from remote_write_sizing import recommended_metadata_config, recommended_queue_config
+
+
+def test_unlimited_receiver_recommends_prometheus_defaults():
+    config = recommended_queue_config()
+    assert config["max_shards"] == 50
+    assert config["max_samples_per_send"] == 2000
+    assert config["capacity"] == 10000
+
+
+@pytest.mark.parametrize(
+    "cpu, expected_max_shards",
+    [("100m", 1), ("10m", 1), ("500m", 5), ("2", 20), ("8", 50)],
+)
+def test_max_shards_are_bound_by_cpu_limit(cpu, expected_max_shards):
+    assert recommended_queue_config(cpu_limit=cpu)["max_shards"] == expected_max_shards
+
+
+@pytest.mark.parametrize(
+    "cpu, memory, expected_max_samples_per_send",
+    [
+        (None, "200Mi", 409),  # 20Mi of in-flight samples over 50 shards
+        ("500m", "200Mi", 2000),  # the same budget over 5 shards
+        (None, "10Mi", 100),  # never below the minimum batch size
+        (None, "16Gi", 2000),  # never above the Prometheus default
+    ],
+)
+def test_batch_size_is_bound_by_memory_limit(cpu, memory, expected_max_samples_per_send):
+    config = recommended_queue_config(cpu_limit=cpu, memory_limit=memory)
+    assert config["max_samples_per_send"] == expected_max_samples_per_send
+    assert config["capacity"] == 5 * expected_max_samples_per_send
+
+
+def test_invalid_quantity_raises():
+    with pytest.raises(ValueError):
+        recommended_queue_config(cpu_limit="lots")
+
+
+def test_metadata_is_sent_at_the_scrape_interval():
+    assert recommended_metadata_config("30s")["send_interval"] == "30s"
+
+
+def test_recommendations_are_published_over_the_relation(context: Context):
+    # GIVEN a Prometheus with resource limits and a remote-write sender
+    container = Container(
+        "prometheus",
+        can_connect=True,
+        execs={Exec(["update-ca-certificates", "--fresh"], return_code=0, stdout="")},
+    )
+    relation = Relation("receive-remote-write", remote_app_name="agent")
+    state = State(
+        leader=True,
+        containers=[container],
+        relations=[relation],
+        config={"cpu": "1", "memory": "1Gi"},
+    )
+
+    # WHEN the charm is configured
+    state_out = context.run(context.on.config_changed(), state)
+
+    # THEN the recommended settings are published next to the url
+    remote_write = json.loads(state_out.get_relation(relation.id).local_unit_data["remote_write"])
+    assert remote_write["queue_config"] == recommended_queue_config("1", "1Gi")
+    assert remote_write["metadata_config"] == recommended_metadata_config("1m")
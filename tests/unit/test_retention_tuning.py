@@ -0,0 +1,181 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import dataclasses
+from unittest.mock import patch
+
+import pytest
+from ops.model import ActiveStatus
+from scenario import State
+
+from charm import PrometheusCharm
+from retention_tuning import TsdbUsage, forecast, timespec_to_seconds
+
+GB = 10**9
+
+# 100k samples/s, at 2 bytes per sample: the TSDB grows by 200kB/s (~17GB/day).
+BUSY_TSDB = TsdbUsage(blocks_bytes=40 * GB, wal_bytes=2 * GB, samples_per_second=100_000)
+
+
+@pytest.mark.parametrize(
+    "timespec, expected",
+    [("15d", 15 * 86400), ("1h30m", 5400), ("500ms", 0.5), ("", None), ("15", None), ("1x", None)],
+)
+def test_timespec_to_seconds(timespec, expected):
+    assert timespec_to_seconds(timespec) == expected
+
+
+def test_no_fill_forecast_when_retention_leaves_room_for_compaction():
+    # GIVEN a retention size leaving more free space than a compaction needs
+    result = forecast(100 * GB, BUSY_TSDB, retention_size_bytes=50 * GB)
+
+    # THEN the disk is not expected to fill up
+    assert result.time_to_full_seconds is None
+    # AND the recommended size is larger than the configured one
+    assert result.retention_size_bytes > 50 * GB
+
+
+def test_fill_forecast_when_compaction_does_not_fit():
+    # GIVEN a retention size leaving less free space than a compaction needs
+    result = forecast(100 * GB, BUSY_TSDB, retention_size_bytes=90 * GB)
+
+    # THEN the disk is expected to fill up
+    assert result.time_to_full_seconds is not None
+    # AND the recommended size avoids it
+    assert forecast(100 * GB, BUSY_TSDB, result.retention_size_bytes).time_to_full_seconds is None
+
+
+def test_short_retention_time_prevents_filling_the_disk():
+    # GIVEN no retention size, but a retention time holding ~17GB of blocks
+    result = forecast(100 * GB, BUSY_TSDB, retention_time_seconds=86400)
+
+    # THEN the disk is not expected to fill up
+    assert result.time_to_full_seconds is None
+
+
+def test_recommended_retention_size_has_a_floor():
+    # GIVEN an ingestion rate a compaction of which would not fit on the disk anyway
+    usage = dataclasses.replace(BUSY_TSDB, samples_per_second=10_000_000)
+
+    # THEN the recommended size does not drop to zero
+    assert forecast(100 * GB, usage).retention_size_bytes == 10 * GB
+
+
+@pytest.fixture
+def running_state(context, prometheus_container):
+    def _running_state(config):
+        with patch.object(PrometheusCharm, "_get_pvc_capacity", return_value="100Gi"):
+            state = State(containers={prometheus_container}, leader=True, config=config)
+            return context.run(context.on.config_changed(), state)
+
+    return _running_state
+
+
+def _update_status(context, state, usage):
+    with (
+        patch.object(PrometheusCharm, "_get_pvc_capacity", return_value="100Gi"),
+        patch.object(PrometheusCharm, "_tsdb_usage", return_value=usage),
+        # Forecast on every update-status
+        patch("charm.DISK_FORECAST_INTERVAL", 0),
+    ):
+        return context.run(context.on.update_status(), state)
+
+
+def _command(state):
+    return state.get_container("prometheus").plan.services["prometheus"].command.split()
+
+
+def test_disk_usage_is_not_forecast_with_a_fixed_retention_size(context, running_state):
+    # GIVEN a busy Prometheus, with the default retention size
+    state = running_state({})
+
+    # WHEN update-status fires
+    with (
+        patch.object(PrometheusCharm, "_tsdb_usage", return_value=BUSY_TSDB) as tsdb_usage,
+        patch("charm.DISK_FORECAST_INTERVAL", 0),
+    ):
+        state = context.run(context.on.update_status(), state)
+
+    # THEN the usage is not queried, and the retention size is left as configured
+    tsdb_usage.assert_not_called()
+    assert "--storage.tsdb.retention.size=80GB" in _command(state)
+    assert isinstance(state.unit_status, ActiveStatus)
+
+
+def test_warning_when_the_disk_is_forecast_to_fill(context, running_state, caplog):
+    # GIVEN a Prometheus with an automatic retention size
+    state = running_state({"maximum_retention_size": "auto"})
+
+    # WHEN the ingestion rate is too high for any retention size to avoid filling the disk
+    usage = dataclasses.replace(BUSY_TSDB, samples_per_second=10_000_000)
+    state = _update_status(context, state, usage)
+
+    # THEN a warning is logged, but the unit is not blocked
+    assert "Disk forecast to be full" in caplog.text
+    assert isinstance(state.unit_status, ActiveStatus)
+
+
+def test_auto_retention_size_follows_usage(context, running_state):
+    # GIVEN a Prometheus with an automatic retention size
+    state = running_state({"maximum_retention_size": "auto"})
+    assert "--storage.tsdb.retention.size=80GB" in _command(state)
+
+    # WHEN the disk usage is forecast
+    state = _update_status(context, state, BUSY_TSDB)
+
+    # THEN the retention size leaves enough room for compactions
+    assert "--storage.tsdb.retention.size=70.8GB" in _command(state)
+    assert isinstance(state.unit_status, ActiveStatus)
+
+    # AND WHEN the ingestion rate barely changes
+    state = _update_status(
+        context, state, dataclasses.replace(BUSY_TSDB, samples_per_second=101_000)
+    )
+
+    # THEN the retention size is left as is
+    assert "--storage.tsdb.retention.size=70.8GB" in _command(state)
+
+
+def test_nothing_is_tuned_without_usage_metrics(context, running_state):
+    # GIVEN a Prometheus with an automatic retention size
+    state = running_state({"maximum_retention_size": "auto"})
+
+    # WHEN Prometheus has not reported its usage yet
+    state = _update_status(context, state, None)
+
+    # THEN the initial retention size is kept
+    assert "--storage.tsdb.retention.size=80GB" in _command(state)
+    assert isinstance(state.unit_status, ActiveStatus)
+
+
+def test_enabling_auto_mode_keeps_the_retention_size_within_tolerance(context, running_state):
+    # GIVEN a Prometheus with an automatic retention size
+    state = running_state({"maximum_retention_size": "auto"})
+
+    # WHEN the recommended size is close to the default one (73.2% vs 80%)
+    state = _update_status(
+        context, state, dataclasses.replace(BUSY_TSDB, samples_per_second=90_000)
+    )
+
+    # THEN the retention size is left as is, so Prometheus is not restarted
+    assert "--storage.tsdb.retention.size=80GB" in _command(state)
+
+
+def test_disk_usage_is_forecast_at_most_hourly(context, running_state):
+    # GIVEN a Prometheus with an automatic retention size, close to the recommended one
+    state = running_state({"maximum_retention_size": "auto"})
+    usage = dataclasses.replace(BUSY_TSDB, samples_per_second=90_000)
+
+    # WHEN update-status fires twice in a row
+    with (
+        patch.object(PrometheusCharm, "_get_pvc_capacity") as get_pvc_capacity,
+        patch.object(PrometheusCharm, "_tsdb_usage", return_value=usage) as tsdb_usage,
+    ):
+        state = context.run(context.on.update_status(), state)
+        state = context.run(context.on.update_status(), state)
+
+    # THEN the usage is only queried once
+    tsdb_usage.assert_called_once()
+    # AND the PVC capacity fetched when configuring Prometheus is reused
+    get_pvc_capacity.assert_not_called()
+    assert isinstance(state.unit_status, ActiveStatus)
@@ -0,0 +1,143 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import json
+
+import yaml
+from scenario import Container, Context, Exec, Relation, State
+
+from rule_groups import split_rule_groups
+
+
+def _alert(name, expr="up == 0"):
+    return {"alert": name, "expr": expr}
+
+
+def _record(name, expr="up"):
+    return {"record": name, "expr": expr}
+
+
+def test_small_groups_are_left_alone():
+    rules = {"groups": [{"name": "g", "rules": [_alert("A"), _alert("B")]}]}
+    assert split_rule_groups(rules, 2) == rules
+    assert split_rule_groups(rules, 0) == rules
+
+
+def test_independent_rules_are_split():
+    rules = {"groups": [{"name": "g", "interval": "30s", "rules": [_alert(n) for n in "ABCDE"]}]}
+    groups = split_rule_groups(rules, 2)["groups"]
+    assert [g["name"] for g in groups] == ["g", "g_2", "g_3"]
+    assert [[r["alert"] for r in g["rules"]] for g in groups] == [["A", "B"], ["C", "D"], ["E"]]
+    # Group settings are kept on every part
+    assert all(g["interval"] == "30s" for g in groups)
+
+
+def test_dependent_rules_stay_together():
+    rules = {
+        "groups": [
+            {
+                "name": "g",
+                "rules": [
+                    _record("job:up:sum", "sum(up) by (job)"),
+                    _alert("A"),
+                    _alert("B"),
+                    _alert("JobDown", "job:up:sum == 0"),
+                    _alert("Alerting", 'ALERTS{alertname="A"} > 0'),
+                ],
+            }
+        ]
+    }
+    groups = split_rule_groups(rules, 1)["groups"]
+    names = [[r.get("alert", r.get("record")) for r in g["rules"]] for g in groups]
+    # The recording rule and its consumer are kept together, and so are all the alerting rules
+    # and the rule querying ALERTS.
+    assert names == [["job:up:sum", "A", "B", "JobDown", "Alerting"]]
+
+
+def test_rules_recording_the_same_metric_stay_with_its_consumers():
+    rules = {
+        "groups": [
+            {
+                "name": "g",
+                "rules": [
+                    _record("m", "sum(a)"),
+                    _alert("X"),
+                    _record("m", "sum(b)"),
+                    _alert("Y", "m > 1"),
+                ],
+            }
+        ]
+    }
+    groups = split_rule_groups(rules, 2)["groups"]
+    names = [[r.get("alert", r.get("record")) for r in g["rules"]] for g in groups]
+    # Y is evaluated after both the rules recording m
+    assert names == [["m", "m", "Y"], ["X"]]
+
+
+def test_split_names_do_not_clash():
+    rules = {
+        "groups": [
+            {"name": "g", "rules": [_alert("A"), _alert("B")]},
+            {"name": "g_2", "rules": [_alert("C")]},
+        ]
+    }
+    groups = split_rule_groups(rules, 1)["groups"]
+    assert [g["name"] for g in groups] == ["g", "g_3", "g_2"]
+
+
+def test_rule_groups_are_split_and_concurrent_evaluation_enabled(context: Context):
+    # GIVEN a related app with a large rule group
+    alert_rules = {"groups": [{"name": "big", "rules": [_alert(f"A{i}") for i in range(5)]}]}
+    relation = Relation(
+        "metrics-endpoint",
+        remote_app_name="remote-app",
+        remote_app_data={
+            "alert_rules": json.dumps(alert_rules),
+            "scrape_metadata": json.dumps(
+                {
+                    "model": "m",
+                    "model_uuid": "d07df316-6fc2-483a-bdee-69cbb9b1e7f2",
+                    "application": "remote-app",
+                }
+            ),
+            "scrape_jobs": json.dumps([]),
+        },
+    )
+    container = Container(
+        "prometheus",
+        can_connect=True,
+        execs={Exec(["update-ca-certificates", "--fresh"], return_code=0, stdout="")},
+    )
+    state = State(
+        leader=True,
+        containers=[container],
+        relations=[relation],
+        config={"max_rules_per_group": 2, "max_concurrent_rule_evals": 8},
+    )
+
+    # WHEN the charm is configured
+    state_out = context.run(context.on.config_changed(), state)
+
+    # THEN the group is split in the rules file
+    rules_dir = (
+        state_out.get_container("prometheus").get_filesystem(context) / "etc/prometheus/rules"
+    )
+    rules_file = yaml.safe_load(next(rules_dir.glob("juju_*.rules")).read_text())
+    assert [len(group["rules"]) for group in rules_file["groups"]] == [2, 2, 1]
+
+    # AND concurrent rule evaluation is enabled
+    command = state_out.get_container("prometheus").plan.services["prometheus"].command
+    assert "--enable-feature=concurrent-rule-eval" in command
+    assert "--rules.max-concurrent-evals=8" in command
+
+
+def test_concurrent_evaluation_is_disabled_by_default(context: Context):
+    container = Container(
+        "prometheus",
+        can_connect=True,
+        execs={Exec(["update-ca-certificates", "--fresh"], return_code=0, stdout="")},
+    )
+    state_out = context.run(context.on.config_changed(), State(containers=[container]))
+    command = state_out.get_container("prometheus").plan.services["prometheus"].command
+    assert "concurrent-rule-eval" not in command
+    assert "--rules.max-concurrent-evals" not in command
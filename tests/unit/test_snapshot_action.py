@@ -0,0 +1,97 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import dataclasses
+import json
+from unittest.mock import patch
+
+import pytest
+from scenario import ActionFailed, Mount, State
+
+from charm import SNAPSHOTS_DIR, PrometheusCharm
+
+NEW_SNAPSHOT = "20250301T000000Z-0000000000000003"
+
+
+@pytest.fixture
+def snapshots_dir(tmp_path):
+    # Two existing snapshots, of a block each
+    for name in ("20250101T000000Z-0000000000000001", "20250201T000000Z-0000000000000002"):
+        block = tmp_path / name / "01JBLOCK"
+        block.mkdir(parents=True)
+        (block / "index").write_bytes(b"x" * 100)
+    return tmp_path
+
+
+@pytest.fixture
+def state(prometheus_container, snapshots_dir):
+    container = dataclasses.replace(
+        prometheus_container,
+        mounts={"snapshots": Mount(location=SNAPSHOTS_DIR, source=snapshots_dir)},
+    )
+    return State(containers={container}, config={"enable_admin_api": True})
+
+
+def _snapshot(snapshots_dir):
+    def _create_snapshot(*_, **__):
+        block = snapshots_dir / NEW_SNAPSHOT / "01JBLOCK"
+        (block / "chunks").mkdir(parents=True)
+        (block / "index").write_bytes(b"x" * 100)
+        (block / "chunks" / "000001").write_bytes(b"x" * 1000)
+        return NEW_SNAPSHOT
+
+    return patch("prometheus_client.Prometheus.snapshot", side_effect=_create_snapshot)
+
+
+def test_snapshot_reports_path_and_size(context, state, snapshots_dir):
+    # WHEN a snapshot is requested
+    with _snapshot(snapshots_dir):
+        context.run(context.on.action("snapshot"), state)
+
+    # THEN its path and size are reported
+    assert context.action_results is not None
+    assert context.action_results["name"] == NEW_SNAPSHOT
+    assert context.action_results["path"] == f"{SNAPSHOTS_DIR}/{NEW_SNAPSHOT}"
+    assert context.action_results["size-bytes"] == 1100
+    # AND no snapshot is removed, as there are no more than the default 3
+    assert json.loads(context.action_results["removed"]) == []
+
+
+def test_snapshot_removes_old_snapshots(context, state, snapshots_dir):
+    # WHEN a snapshot is requested, keeping only 2 of them
+    with _snapshot(snapshots_dir):
+        context.run(context.on.action("snapshot", params={"keep": 2}), state)
+
+    # THEN the oldest snapshot is removed
+    assert context.action_results is not None
+    assert json.loads(context.action_results["removed"]) == ["20250101T000000Z-0000000000000001"]
+    assert sorted(p.name for p in snapshots_dir.iterdir()) == [
+        "20250201T000000Z-0000000000000002",
+        NEW_SNAPSHOT,
+    ]
+
+
+def test_snapshot_requires_the_admin_api(context, state):
+    # GIVEN the admin API is disabled
+    state = dataclasses.replace(state, config={})
+
+    # WHEN a snapshot is requested
+    # THEN the action fails, without calling Prometheus
+    with patch("prometheus_client.Prometheus.snapshot") as snapshot:
+        with pytest.raises(ActionFailed, match="enable_admin_api"):
+            context.run(context.on.action("snapshot"), state)
+    snapshot.assert_not_called()
+
+
+@pytest.mark.parametrize("enabled", [True, False])
+def test_admin_api_flag(context, prometheus_container, enabled):
+    # WHEN the charm is configured with or without the admin API
+    with patch.object(PrometheusCharm, "_get_pvc_capacity", return_value="1Gi"):
+        state_out = context.run(
+            context.on.config_changed(),
+            State(containers={prometheus_container}, config={"enable_admin_api": enabled}),
+        )
+
+    # THEN the admin API is enabled accordingly
+    command = state_out.get_container("prometheus").plan.services["prometheus"].command
+    assert ("--web.enable-admin-api" in command.split()) is enabled
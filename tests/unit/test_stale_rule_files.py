@@ -0,0 +1,25 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import dataclasses
+from unittest.mock import patch
+
+from scenario import Mount, State
+
+from charm import RULES_DIR, PrometheusCharm
+
+
+def test_stale_rule_files_are_removed(context, prometheus_container, tmp_path):
+    # GIVEN a rules file left over from a relation that is gone
+    stale = tmp_path / "juju_gone.rules"
+    stale.write_text("groups: []\n")
+    container = dataclasses.replace(
+        prometheus_container, mounts={"rules": Mount(location=RULES_DIR, source=tmp_path)}
+    )
+
+    # WHEN the charm reconciles
+    with patch.object(PrometheusCharm, "_get_pvc_capacity", return_value="1Gi"):
+        context.run(context.on.config_changed(), State(containers={container}, leader=True))
+
+    # THEN the stale file is removed
+    assert not stale.exists()
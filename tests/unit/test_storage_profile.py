@@ -0,0 +1,128 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import dataclasses
+from unittest.mock import patch
+
+import pytest
+from ops.model import ActiveStatus, BlockedStatus
+from scenario import Container, Context, Exec, State
+
+from charm import PrometheusCharm
+from storage_profile import PROFILES, select_profile
+
+
+@pytest.mark.parametrize(
+    "capacity, memory, expected",
+    [
+        (None, None, "small"),  # capacity could not be obtained
+        ("1Gi", None, "small"),
+        ("100Gi", None, "medium"),
+        ("100Gi", "2Gi", "small"),  # not enough memory for "medium"
+        ("100Gi", "4Gi", "medium"),
+        ("1Ti", None, "large"),
+        ("1Ti", "8Gi", "medium"),  # not enough memory for "large"
+        ("1Ti", "16Gi", "large"),
+    ],
+)
+def test_auto_profile_is_derived_from_capacity_and_memory(capacity, memory, expected):
+    assert select_profile("auto", capacity, memory).name == expected
+
+
+def test_explicit_profile_overrides_auto_selection():
+    assert select_profile("large", "1Gi", "200Mi") == PROFILES["large"]
+    assert select_profile("small", "1Ti", "64Gi") == PROFILES["small"]
+
+
+@pytest.mark.parametrize("profile", ["huge", ""])
+def test_invalid_profile_raises(profile):
+    with pytest.raises(ValueError):
+        select_profile(profile, "1Gi")
+
+
+def test_small_profile_keeps_prometheus_defaults():
+    assert PROFILES["small"].to_args() == []
+
+
+def test_large_profile_args():
+    args = PROFILES["large"].to_args()
+    assert "--storage.tsdb.wal-compression-type=zstd" in args
+    assert "--storage.tsdb.max-block-duration=24h" in args
+    assert "--enable-feature=delayed-compaction" in args
+
+
+@pytest.mark.parametrize(
+    "config, capacity, expected_args, unexpected_args",
+    [
+        # Small instances keep running with the defaults
+        ({}, "1Gi", [], ["--storage.tsdb.wal-compression-type=zstd"]),
+        # Large PVC, without opting in to the automatic selection
+        ({}, "1Ti", [], ["--storage.tsdb.wal-compression-type=zstd"]),
+        # Large PVC and no memory limit
+        (
+            {"storage_profile": "auto"},
+            "1Ti",
+            ["--storage.tsdb.wal-compression-type=zstd", "--storage.tsdb.max-block-duration=24h"],
+            [],
+        ),
+        # Explicit override
+        (
+            {"storage_profile": "medium"},
+            "1Gi",
+            ["--storage.tsdb.wal-compression-type=zstd"],
+            ["--storage.tsdb.max-block-duration=24h"],
+        ),
+    ],
+)
+def test_storage_profile_is_rendered_in_pebble_command(
+    context: Context, config, capacity, expected_args, unexpected_args
+):
+    # GIVEN a PVC of a given capacity
+    container = Container(
+        "prometheus",
+        can_connect=True,
+        execs={Exec(["update-ca-certificates", "--fresh"], return_code=0, stdout="")},
+    )
+    state = State(containers=[container], config=config)
+
+    # WHEN the charm is configured
+    with patch.object(PrometheusCharm, "_get_pvc_capacity", return_value=capacity):
+        state_out = context.run(context.on.config_changed(), state)
+
+    # THEN the pebble command contains the profile's flags
+    command = state_out.get_container("prometheus").plan.services["prometheus"].command.split()
+    for arg in expected_args:
+        assert arg in command
+    for arg in unexpected_args:
+        assert arg not in command
+
+    # AND the wal compression flag is never repeated
+    assert command.count("--storage.tsdb.wal-compression") <= 1
+
+
+def test_invalid_storage_profile_blocks(context: Context):
+    # GIVEN an invalid storage profile
+    container = Container(
+        "prometheus",
+        can_connect=True,
+        execs={Exec(["update-ca-certificates", "--fresh"], return_code=0, stdout="")},
+    )
+    state = State(containers=[container], config={"storage_profile": "huge"})
+
+    with patch.object(PrometheusCharm, "_get_pvc_capacity", return_value="1Ti"):
+        # WHEN the charm is configured
+        state_out = context.run(context.on.config_changed(), state)
+
+        # THEN the unit is blocked and no profile flags are rendered
+        assert isinstance(state_out.unit_status, BlockedStatus)
+        assert "storage profile" in state_out.unit_status.message
+        command = state_out.get_container("prometheus").plan.services["prometheus"].command
+        assert "--storage.tsdb.wal-compression-type" not in command
+
+        # AND WHEN the profile is corrected
+        state_out = context.run(
+            context.on.config_changed(), dataclasses.replace(state_out, config={})
+        )
+
+        # THEN the unit goes back to active
+        assert isinstance(state_out.unit_status, ActiveStatus)
@@ -9,6 +9,7 @@ from helpers import (
     prom_multipatch,
 )
 from ops.testing import Harness
+from scenario import Container, Context, Exec, State
 
 from charm import Prometheus, PrometheusCharm
 
@@ -60,3 +61,33 @@ class TestTls(unittest.TestCase):
         # AND certs become available (see decorators)
         # THEN the scheme of the internal URL is https
         self.assertTrue(self.harness.charm.internal_url.startswith("https://"))
+
+
+def test_certs_are_only_installed_when_changed(context: Context):
+    container = Container(
+        "prometheus",
+        can_connect=True,
+        execs={Exec(["update-ca-certificates", "--fresh"], return_code=0, stdout="")},
+    )
+    with patch("charm.subprocess.run") as local_update_ca_certs:
+        # GIVEN a charm that installed its (lack of) certs on pebble-ready
+        state = context.run(context.on.pebble_ready(container), State(containers=[container]))
+        assert context.exec_history["prometheus"]
+        context.exec_history.clear()
+        local_update_ca_certs.reset_mock()
+
+        # WHEN an unrelated event fires
+        state = context.run(context.on.update_status(), state)
+
+        # THEN the certs are not re-installed
+        assert not context.exec_history.get("prometheus")
+        local_update_ca_certs.assert_not_called()
+
+        # BUT WHEN the workload container restarts
+        state = context.run(
+            context.on.pebble_ready(state.get_container("prometheus")), state
+        )
+
+        # THEN the certs are re-installed
+        assert context.exec_history["prometheus"]
+        local_update_ca_certs.assert_called()
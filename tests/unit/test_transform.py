@@ -3,10 +3,14 @@
 
 import subprocess
 import unittest
-from pathlib import PosixPath
+from pathlib import Path, PosixPath
 from unittest import mock
 
-from charms.prometheus_k8s.v0.prometheus_scrape import CosTool
+import yaml
+from charms.prometheus_k8s.v0.prometheus_scrape import (
+    CosTool,
+    _inject_label_matchers_inprocess,
+)
 from ops.charm import CharmBase
 from ops.testing import Harness
 
@@ -144,6 +148,123 @@ class TestTransform(unittest.TestCase):
         )
 
 
+TOPOLOGY = {
+    "juju_model": "some_juju_model",
+    "juju_model_uuid": "123ABC",
+    "juju_application": "some_application",
+}
+
+# Expressions the in-process injector is expected to handle without cos-tool
+INPROCESS_CORPUS = [
+    "up",
+    "up > 1",
+    "up{} == 0",
+    'up{job="foo"} != 1',
+    "absent(up{})",
+    "rate(http_requests_total[5m]) > 0.1",
+    'sum(rate(http_requests_total{code=~"5.."}[5m])) by (job)',
+    "sum by (job) (rate(http_requests_total[5m])) / on(job) group_left sum(up) by (job)",
+    "sum without (instance) (up) unless on() vector(1)",
+    'histogram_quantile(0.99, sum(rate(x_bucket{le!="+Inf"}[5m])) by (le))',
+    "max_over_time(up[1h:5m]) offset -5m",
+    'label_replace(up, "dst", "$1", "src", "(.*)")',
+    "topk(5, job:request_latency_seconds:mean5m) and bool up",
+    '{__name__="up", job!~"a|b"}',
+    "up{job='single quoted',}",
+    'up{job="with \\"escapes\\""}',
+    'count_values("version", build_info) > 1',
+]
+
+
+def _repo_rule_expressions():
+    """All the alert rule expressions shipped in this repo."""
+    project_dir = Path(__file__).resolve().parent.parent.parent
+    for path in [
+        *project_dir.glob("src/prometheus_alert_rules/**/*.rule"),
+        *project_dir.glob("tests/unit/prometheus_alert_rules/**/*.rule"),
+    ]:
+        rules = yaml.safe_load(path.read_text())
+        for group in rules.get("groups", [rules]):
+            for rule in group.get("rules", [group]):
+                if "expr" in rule:
+                    yield rule["expr"].replace("%%juju_topology%%", "").strip()
+
+
+class TestInProcessTransform(unittest.TestCase):
+    """Test the in-process label matcher injector."""
+
+    def test_injects_into_every_vector_selector(self):
+        output = _inject_label_matchers_inprocess(
+            'sum(rate(up{job="x"}[5m])) by (job) / on(job) group_left count(up)',
+            {"juju_model": "m"},
+        )
+        self.assertEqual(
+            output,
+            'sum(rate(up{job="x",juju_model="m"}[5m])) by (job)'
+            ' / on(job) group_left count(up{juju_model="m"})',
+        )
+
+    def test_matchers_are_sorted_like_cos_tool(self):
+        output = _inject_label_matchers_inprocess("up > 1", {**TOPOLOGY, "juju_unit": "a/1"})
+        self.assertEqual(
+            output,
+            'up{juju_application="some_application",juju_model="some_juju_model"'
+            ',juju_model_uuid="123ABC",juju_unit="a/1"} > 1',
+        )
+
+    def test_defers_to_cos_tool_on_unsupported_constructs(self):
+        for expression in [
+            "up @ start()",
+            'up{juju_model="other"}',
+            "sum(up",
+            "up{$var}",
+            'up{"quoted.name"="x"}',
+        ]:
+            with self.subTest(expression=expression):
+                self.assertIsNone(_inject_label_matchers_inprocess(expression, TOPOLOGY))
+
+    def test_handles_the_corpus(self):
+        for expression in INPROCESS_CORPUS:
+            with self.subTest(expression=expression):
+                self.assertIsNotNone(_inject_label_matchers_inprocess(expression, TOPOLOGY))
+
+    @mock.patch("subprocess.run")
+    def test_does_not_spawn_cos_tool_for_supported_expressions(self, mocked_run):
+        tool = CosTool(None)
+        tool._path = "cos-tool"
+        output = tool.inject_label_matchers("up > 1", {"juju_model": "m"})
+        self.assertEqual(output, 'up{juju_model="m"} > 1')
+        mocked_run.assert_not_called()
+
+
+class TestInProcessTransformAgainstCosTool(unittest.TestCase):
+    """Differential test of the in-process label matcher injector against cos-tool."""
+
+    def setUp(self):
+        self.tool = CosTool(None)
+        if not self.tool.path:
+            self.skipTest("cos-tool is not available")
+
+    def _cos_tool(self, expression, topology):
+        args = [str(self.tool.path), "transform"]
+        args.extend("--label-matcher={}={}".format(k, v) for k, v in topology.items())
+        return self.tool._exec([*args, expression])
+
+    def test_same_result_as_cos_tool(self):
+        for expression in [*INPROCESS_CORPUS, *_repo_rule_expressions()]:
+            output = _inject_label_matchers_inprocess(expression, TOPOLOGY)
+            if output is None:
+                continue
+            with self.subTest(expression=expression):
+                # Only the matchers are rendered the cos-tool way; to compare the rest of the
+                # expressions, have both printed by cos-tool.
+                canonical = {"juju_diff": "x"}
+                self.assertEqual(
+                    self._cos_tool(output, canonical),
+                    self._cos_tool(self._cos_tool(expression, TOPOLOGY), canonical),
+                )
+
+
 class TestValidateAlerts(unittest.TestCase):
     """Test that the cos-tool validation works."""
 